@@ -2,13 +2,39 @@ import logging
 import os
 
 import vtk
+from vtk.util import numpy_support
 
 import slicer
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
 import qt
 import numpy as np
-import math
+import json
+import time
+
+from RobotTrajectoryGeneratorLib import (
+    EventCoalescer,
+    JobRunner,
+    LocalPoseArrayPublisher,
+    MultiFrameRecorder,
+    PoseBuffer,
+    PositionIndex,
+    Profiler,
+    ReplaySource,
+    SamplingSchedule,
+    TrajectoryRecordingWriter,
+    TrajectoryStreamer,
+    TransformCollectionPacker,
+    benchmarkSendPoseArray,
+    decimatePoses,
+    helixTrajectory,
+    loadTrajectory,
+    postProcessTrajectory,
+    replayCapture,
+    resampleTrajectory,
+    saveTrajectory,
+    snapshotPoses,
+)
 #
 # RobotTrajectoryGenerator
 #
@@ -89,6 +115,88 @@ def registerSampleData():
     )
 
 
+#
+# Helpers
+#
+
+def copyVTKMatrixToArray(matrix, array):
+    """
+    Copy a vtkMatrix4x4 into an existing 4x4 array without allocating a new one.
+    """
+    for row in range(4):
+        for column in range(4):
+            array[row, column] = matrix.GetElement(row, column)
+
+
+#
+# TrajectorySampler
+#
+
+class TrajectorySampler(SamplingSchedule):
+    """
+    Calls a callback at a fixed rate for a given duration using a single recurring timer.
+    The ticks follow a SamplingSchedule: deadlines do not drift and late ticks drop the deadlines they missed.
+    """
+
+    def __init__(self, callback, finishedCallback=None):
+        SamplingSchedule.__init__(self)
+        self.callback = callback
+        self.finishedCallback = finishedCallback
+        self._timer = qt.QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(qt.Qt.PreciseTimer)
+        self._timer.connect('timeout()', self._onTimeout)
+
+    def start(self, rateHz=None, durationMs=None):
+        """
+        Start (or restart) sampling. Starting while already running restarts the schedule,
+        it never adds a second sampling loop.
+        """
+        self._timer.stop()
+        SamplingSchedule.start(self, rateHz, durationMs)
+        self._onTimeout()
+
+    def stop(self):
+        """
+        Stop sampling. The counters are kept so they can be inspected after the trace.
+        """
+        self._timer.stop()
+        if SamplingSchedule.stop(self) and self.finishedCallback:
+            self.finishedCallback()
+
+    def pause(self):
+        if SamplingSchedule.pause(self):
+            self._timer.stop()
+
+    def resume(self):
+        if SamplingSchedule.resume(self):
+            self._scheduleNextTick()
+
+    def setRate(self, rateHz):
+        SamplingSchedule.setRate(self, rateHz)
+        self._timer.stop()
+        self._scheduleNextTick()
+
+    def _onTimeout(self):
+        if not self.isRunning or self.isPaused:
+            return
+        if not self.tick():
+            self.stop()
+            return
+        try:
+            self.callback()
+        except Exception:
+            # Never leave the sampler running without a scheduled tick
+            self.stop()
+            raise
+        self._scheduleNextTick()
+
+    def _scheduleNextTick(self):
+        delay = self.delayToNextTick()
+        if delay is not None:
+            self._timer.start(int(round(delay * 1000.0)))
+
+
 #
 # RobotTrajectoryGeneratorWidget
 #
@@ -98,6 +206,9 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
     https://github.com/Slicer/Slicer/blob/main/Base/Python/slicer/ScriptedLoadableModule.py
     """
 
+    # Rate of the sampler ticks in event-driven capture, where they only update streaming and status
+    EVENT_CAPTURE_HOUSEKEEPING_RATE = 10.0
+
     def __init__(self, parent=None):
         """
         Called when the user opens the module the first time and the widget is initialized.
@@ -129,6 +240,22 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
         # in batch mode, without a graphical user interface.
         self.logic = RobotTrajectoryGeneratorLogic()
 
+        # Single sampling loop used for tracing (restarted, never duplicated, when 'Trace path' is pressed again)
+        self.sampler = TrajectorySampler(self.onSamplerTick, self.onSamplerFinished)
+        self._lastStatusUpdateTime = 0.0
+        self._eventDriven = False  # capture mode of the current trace
+
+        # Visualization is decoupled from capture: the scene is updated from the pose buffer at a low rate
+        self.visualizationTimer = qt.QTimer()
+        self.visualizationTimer.setInterval(100)
+        self.visualizationTimer.connect('timeout()', self.logic.updateVisualization)
+
+        # The performance panel is refreshed once per second while profiling
+        self.performanceTimer = qt.QTimer()
+        self.performanceTimer.setInterval(1000)
+        self.performanceTimer.connect('timeout()', self.updatePerformancePanel)
+        self.ui.performanceTextEdit.font = qt.QFontDatabase.systemFont(qt.QFontDatabase.FixedFont)
+
         # Connections
 
         # These connections ensure that we update parameter node when scene is closed
@@ -137,10 +264,64 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
 
         # These connections ensure that whenever user changes some settings on the GUI, that is saved in the MRML scene
         # (in the selected parameter node).
+        # Parameter name, widget, widget property, change signal and, for combo boxes, the parameter value of each item
+        self._parameterWidgets = [
+            ("CaptureMode", self.ui.captureModeComboBox, "currentIndex", "currentIndexChanged(int)", ["fixed", "events"]),
+            ("SamplingRate", self.ui.samplingRateSpinBox, "value", "valueChanged(double)", None),
+            ("MaxEventRate", self.ui.maxEventRateSpinBox, "value", "valueChanged(double)", None),
+            ("CoalescingWindow", self.ui.coalescingWindowSpinBox, "value", "valueChanged(double)", None),
+            ("TraceDuration", self.ui.traceDurationSpinBox, "value", "valueChanged(double)", None),
+            ("DistanceThreshold", self.ui.distanceThresholdSpinBox, "value", "valueChanged(double)", None),
+            ("ShowTrajectory", self.ui.showTrajectoryCheckBox, "checked", "toggled(bool)", None),
+            ("PathDisplay", self.ui.pathDisplayComboBox, "currentIndex", "currentIndexChanged(int)",
+             ["fiducials", "polyline"]),
+            ("GlyphStride", self.ui.glyphStrideSpinBox, "value", "valueChanged(int)", None),
+            ("RecordAllSamples", self.ui.recordAllSamplesCheckBox, "checked", "toggled(bool)", None),
+            ("DecimationMethod", self.ui.decimationMethodComboBox, "currentIndex", "currentIndexChanged(int)",
+             ["threshold", "rdp"]),
+            ("TranslationTolerance", self.ui.translationToleranceSpinBox, "value", "valueChanged(double)", None),
+            ("RotationTolerance", self.ui.rotationToleranceSpinBox, "value", "valueChanged(double)", None),
+            ("MinTimeGap", self.ui.minTimeGapSpinBox, "value", "valueChanged(double)", None),
+            ("MaxTimeGap", self.ui.maxTimeGapSpinBox, "value", "valueChanged(double)", None),
+            ("ResamplingMode", self.ui.resamplingModeComboBox, "currentIndex", "currentIndexChanged(int)",
+             ["arclength", "time"]),
+            ("ResamplingSpacing", self.ui.resamplingSpacingSpinBox, "value", "valueChanged(double)", None),
+            ("Smoothing", self.ui.smoothingComboBox, "currentIndex", "currentIndexChanged(int)",
+             ["none", "cubic", "bspline"]),
+            ("MaxVelocity", self.ui.maxVelocitySpinBox, "value", "valueChanged(double)", None),
+            ("MaxAcceleration", self.ui.maxAccelerationSpinBox, "value", "valueChanged(double)", None),
+            ("StreamTrajectory", self.ui.streamTrajectoryCheckBox, "checked", "toggled(bool)", None),
+            ("ChunkSize", self.ui.chunkSizeSpinBox, "value", "valueChanged(int)", None),
+            ("ChunkInterval", self.ui.chunkIntervalSpinBox, "value", "valueChanged(int)", None),
+            ("PoseArrayTopic", self.ui.poseArrayTopicLineEdit, "text", "editingFinished()", None),
+            ("RecordingPath", self.ui.recordingPathLineEdit, "currentPath", "currentPathChanged(QString)", None),
+            ("RecordWhileTracing", self.ui.recordWhileTracingCheckBox, "checked", "toggled(bool)", None),
+            ("Replay", self.ui.replayCheckBox, "checked", "toggled(bool)", None),
+            ("ReplaySpeed", self.ui.replaySpeedSpinBox, "value", "valueChanged(double)", None),
+        ]
+        self._guiParameterValues = {}  # parameter values shown in the GUI, to update only the widgets that changed
+        for _, widget, _, signal, _ in self._parameterWidgets:
+            widget.connect(signal, self.updateParameterNodeFromGUI)
+        self.ui.lookupSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI)
+
         self.ui.lookupSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateObservedLookup)
+        self.ui.captureModeComboBox.connect("currentIndexChanged(int)", self.onCaptureModeChanged)
         self.ui.tracePathButton.connect("clicked(bool)", self.onTracePathButton)
+        self.ui.pauseTraceButton.connect("toggled(bool)", self.onPauseTraceButton)
+        self.ui.stopTraceButton.connect("clicked(bool)", self.onStopTraceButton)
+        self.ui.decimateButton.connect("clicked(bool)", self.onDecimateButton)
+        self.ui.resamplingModeComboBox.connect("currentIndexChanged(int)", self.onResamplingModeChanged)
+        self.ui.resampleButton.connect("clicked(bool)", self.onResampleButton)
+        self.ui.saveTrajectoryButton.connect("clicked(bool)", self.onSaveTrajectoryButton)
+        self.ui.loadTrajectoryButton.connect("clicked(bool)", self.onLoadTrajectoryButton)
+        self.ui.profilingCheckBox.connect("toggled(bool)", self.onProfilingToggled)
+        self.ui.resetProfilingButton.connect("clicked(bool)", self.onResetProfilingButton)
+        self.ui.exportProfilingButton.connect("clicked(bool)", self.onExportProfilingButton)
         self.ui.clearPathButton.connect("clicked(bool)", self.onClearPathButton)
         self.ui.sendPoseArrayButton.connect("clicked(bool)", self.onSendPoseArrayButton)
+        self.ui.cancelProcessingButton.connect("clicked(bool)", self.onCancelProcessingButton)
+
+        self.onCaptureModeChanged(self.ui.captureModeComboBox.currentIndex)
 
         # Make sure parameter node is initialized (needed for module reload)
         self.initializeParameterNode()
@@ -149,6 +330,13 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
         """
         Called when the application closes and the module widget is destroyed.
         """
+        self.sampler.stop()
+        self.visualizationTimer.stop()
+        self.performanceTimer.stop()
+        self.logic.stopEventCapture()
+        self.logic.stopRecording()
+        self.logic.shutdownBackgroundJobs()
+        self.logic.removeObservers()
         self.removeObservers()
 
     def enter(self):
@@ -189,12 +377,6 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
 
         self.setParameterNode(self.logic.getParameterNode())
 
-        # Select default input nodes if nothing is selected yet to save a few clicks for the user
-        if not self._parameterNode.GetNodeReference("InputVolume"):
-            firstVolumeNode = slicer.mrmlScene.GetFirstNodeByClass("vtkMRMLScalarVolumeNode")
-            if firstVolumeNode:
-                self._parameterNode.SetNodeReferenceID("InputVolume", firstVolumeNode.GetID())
-
     def setParameterNode(self, inputParameterNode):
         """
         Set and observe parameter node.
@@ -213,7 +395,8 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
         if self._parameterNode is not None:
             self.addObserver(self._parameterNode, vtk.vtkCommand.ModifiedEvent, self.updateGUIFromParameterNode)
 
-        # Initial GUI update
+        # Initial GUI update, all the widgets are set from the new parameter node
+        self._guiParameterValues = {}
         self.updateGUIFromParameterNode()
 
     def updateGUIFromParameterNode(self, caller=None, event=None):
@@ -228,9 +411,27 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
         # Make sure GUI changes do not call updateParameterNodeFromGUI (it could cause infinite loop)
         self._updatingGUIFromParameterNode = True
 
+        # Only the widgets of the parameters that changed since the last update are set
+        changedNames = []
+        for name, widget, property, _, choices in self._parameterWidgets:
+            value = self._parameterNode.GetParameter(name)
+            if self._guiParameterValues.get(name) == value:
+                continue
+            self._guiParameterValues[name] = value
+            changedNames.append(name)
+            self.setWidgetParameterValue(widget, property, choices, value)
+        lookup = self._parameterNode.GetNodeReference("ObservedLookup")
+        if self.ui.lookupSelector.currentNode() != lookup:
+            self.ui.lookupSelector.setCurrentNode(lookup)
+
         # All the GUI updates are done
         self._updatingGUIFromParameterNode = False
 
+        # New values are used from the next sample on, nothing is rebuilt
+        if changedNames:
+            self.logic.updateFromParameterNode(self._parameterNode, changedNames)
+            self.updateSamplerFromParameterNode(changedNames)
+
     def updateParameterNodeFromGUI(self, caller=None, event=None):
         """
         This method is called when the user makes any change in the GUI.
@@ -242,9 +443,54 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
 
         wasModified = self._parameterNode.StartModify()  # Modify all properties in a single batch
 
+        for name, widget, property, _, choices in self._parameterWidgets:
+            value = self.widgetParameterValue(widget, property, choices)
+            if self._parameterNode.GetParameter(name) != value:
+                self._parameterNode.SetParameter(name, value)
+        self._parameterNode.SetNodeReferenceID("ObservedLookup", self.ui.lookupSelector.currentNodeID)
 
         self._parameterNode.EndModify(wasModified)
 
+    @staticmethod
+    def widgetParameterValue(widget, property, choices):
+        """
+        Value of a widget as a parameter node string.
+        """
+        value = getattr(widget, property)
+        if choices:
+            return choices[value]
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        return str(value)
+
+    @staticmethod
+    def setWidgetParameterValue(widget, property, choices, value):
+        """
+        Show a parameter node string in a widget. A number that cannot be parsed leaves the widget as it is.
+        """
+        if choices:
+            value = choices.index(value) if value in choices else 0
+        else:
+            current = getattr(widget, property)
+            try:
+                if isinstance(current, bool):
+                    value = value == "true"
+                elif isinstance(current, int):
+                    value = int(float(value))
+                elif isinstance(current, float):
+                    value = float(value)
+            except ValueError:
+                return
+        setattr(widget, property, value)
+
+    def updateSamplerFromParameterNode(self, names):
+        """
+        A change of the sampling rate or capture window applies to a trace in progress from its next tick.
+        """
+        if "SamplingRate" in names and not (self.sampler.isRunning and self._eventDriven):
+            self.sampler.setRate(self.logic.numericParameter(self._parameterNode, "SamplingRate", positive=True))
+        if "TraceDuration" in names:
+            self.sampler.durationMs = int(self.logic.numericParameter(self._parameterNode, "TraceDuration") * 1000)
 
     def updateObservedLookup(self):
         """
@@ -256,10 +502,282 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
         """
         This function is called when a user selects the 'Trace path' button.
         """
+        if self.logic.streamingEnabled:
+            # Fail now rather than at the first chunk, in the middle of the trace
+            streamingReady = False
+            with slicer.util.tryWithErrorDisplay("Cannot stream the trajectory, tracing was not started."):
+                self.logic.getStreamingPublishers()
+                streamingReady = True
+            if not streamingReady:
+                return
         print("Tracing started")
-        for j in range(0, 5000, 20): # the upper bound here can be changed depending on how long you want to trace
-            timer = qt.QTimer()
-            timer.singleShot(j, lambda: self.logic.AddToTrajectory())
+        # The trajectory file cannot be replayed and recorded at the same time
+        if self.ui.recordWhileTracingCheckBox.checked and not self.ui.replayCheckBox.checked:
+            with slicer.util.tryWithErrorDisplay("Failed to open the recording file."):
+                self.logic.startRecording(self.ui.recordingPathLineEdit.currentPath)
+        if self.ui.replayCheckBox.checked and not self.startReplay():
+            self.logic.stopRecording()
+            return
+        # Replayed poses do not fire transform events, they are always sampled at a fixed rate
+        self._eventDriven = self.ui.captureModeComboBox.currentIndex == 1 and self.logic.poseSource is None
+        durationMs = int(self.ui.traceDurationSpinBox.value * 1000)
+        if self._eventDriven:
+            # Samples come from the lookup updates, the sampler only keeps the capture window, streaming and status going
+            self.logic.startEventCapture(self.ui.maxEventRateSpinBox.value or None,
+                                         self.ui.coalescingWindowSpinBox.value / 1000.0)
+            self.sampler.start(self.EVENT_CAPTURE_HOUSEKEEPING_RATE, durationMs)
+        else:
+            self.logic.stopEventCapture()
+            self.sampler.start(self.ui.samplingRateSpinBox.value, durationMs)
+        if self.sampler.isRunning:
+            self.visualizationTimer.start()
+        self.updateTraceButtonStates()
+
+    def startReplay(self):
+        """
+        Replay the trajectory file instead of sampling the lookup. At real time or N times real time the sampler reads
+        the replayed poses like it reads the lookup, as fast as possible the whole file is replayed at once.
+        Returns True if the sampler has to be started.
+        """
+        with slicer.util.tryWithErrorDisplay("Failed to replay the trajectory file.", waitCursor=True):
+            poseSource = ReplaySource.fromFile(self.ui.recordingPathLineEdit.currentPath,
+                                               speed=self.ui.replaySpeedSpinBox.value)
+            if poseSource.speed:
+                self.logic.setPoseSource(poseSource)
+                return True
+            startTime = time.perf_counter()
+            count = self.logic.replayAsFastAsPossible(poseSource, self.ui.samplingRateSpinBox.value)
+            print(f"Replayed {len(poseSource.timestamps)} recorded poses in {time.perf_counter() - startTime:.2f} s, "
+                  f"{count} poses stored")
+            self.logic.finishStreaming()
+        return False
+
+    def onPauseTraceButton(self, paused):
+        """
+        This function is called when the user toggles the 'Pause' button.
+        """
+        if paused:
+            self.sampler.pause()
+        else:
+            self.sampler.resume()
+        if self.logic.poseSource is not None:
+            if paused:
+                self.logic.poseSource.pause()
+            else:
+                self.logic.poseSource.resume()
+        self.logic.eventCapturePaused = paused
+        self.updateSamplerStatus()
+
+    def onStopTraceButton(self):
+        """
+        This function is called when the user presses the 'Stop' button.
+        """
+        self.sampler.stop()
+
+    def onSamplerTick(self):
+        """
+        Called by the sampler at every tick while tracing.
+        """
+        if not self._eventDriven:
+            self.logic.AddToTrajectory()
+        if self.logic.streamingEnabled:
+            with slicer.util.tryWithErrorDisplay("Streaming the trajectory failed, it was turned off. Tracing goes on."):
+                self.logic.updateStreaming()
+            if not self.logic.streamingEnabled and self._parameterNode is not None:
+                self._parameterNode.SetParameter("StreamTrajectory", "false")
+        if self.logic.poseSource is not None and self.logic.poseSource.isFinished:
+            self.sampler.stop()
+            return
+        # Refreshing the label at every tick would cost more than the sample itself
+        if time.perf_counter() - self._lastStatusUpdateTime > 0.5:
+            self.updateSamplerStatus()
+
+    def onSamplerFinished(self):
+        """
+        Called when tracing is stopped or the capture window has elapsed.
+        """
+        print("Tracing stopped")
+        self.logic.stopEventCapture()
+        self.logic.stopRecording()
+        self.logic.setPoseSource(None)
+        self.visualizationTimer.stop()
+        self.logic.updateVisualization()
+        with slicer.util.tryWithErrorDisplay("Failed to publish the end of the trajectory."):
+            self.logic.finishStreaming()
+        self.updateTraceButtonStates()
+        self.updateSamplerStatus()
+
+    def updateTraceButtonStates(self):
+        running = self.sampler.isRunning
+        self.ui.pauseTraceButton.enabled = running
+        self.ui.stopTraceButton.enabled = running
+        if not running:
+            wasBlocked = self.ui.pauseTraceButton.blockSignals(True)
+            self.ui.pauseTraceButton.checked = False
+            self.ui.pauseTraceButton.blockSignals(wasBlocked)
+
+    def updateSamplerStatus(self):
+        self._lastStatusUpdateTime = time.perf_counter()
+        if self.sampler.isRunning:
+            state = "Paused" if self.sampler.isPaused else "Tracing"
+        else:
+            state = "Idle"
+        if self._eventDriven:
+            coalescer = self.logic.eventCoalescer
+            elapsed = self.sampler.elapsedTime()
+            sampleRate = coalescer.sampleCount / elapsed if elapsed > 0 else 0.0
+            self.ui.samplerStatusLabel.text = (f"{state}: {coalescer.sampleCount} samples from {coalescer.eventCount} "
+                f"updates ({coalescer.coalescedCount} coalesced), {sampleRate:.1f} Hz")
+            return
+        self.ui.samplerStatusLabel.text = (f"{state}: {self.sampler.tickCount} samples, "
+            f"{self.sampler.achievedHz():.1f} Hz achieved, {self.sampler.missedTicks} missed ticks")
+
+    def onCaptureModeChanged(self, index):
+        """
+        The sampling rate only applies to fixed rate capture, the update rate cap and coalescing window to event-driven capture.
+        """
+        eventDriven = index == 1
+        self.ui.samplingRateSpinBox.enabled = not eventDriven
+        self.ui.maxEventRateSpinBox.enabled = eventDriven
+        self.ui.coalescingWindowSpinBox.enabled = eventDriven
+
+    def onDecimateButton(self):
+        """
+        This function is called when the user presses the 'Decimate' button.
+        """
+        # Zero disables a criterion
+        translationTolerance = self.ui.translationToleranceSpinBox.value or None
+        rotationTolerance = self.ui.rotationToleranceSpinBox.value or None
+        minTimeGap = self.ui.minTimeGapSpinBox.value or None
+        maxTimeGap = self.ui.maxTimeGapSpinBox.value or None
+        method = "rdp" if self.ui.decimationMethodComboBox.currentIndex == 1 else "threshold"
+        decimation = {"translationTolerance": translationTolerance, "rotationTolerance": rotationTolerance,
+                      "minTimeGap": minTimeGap, "maxTimeGap": maxTimeGap, "method": method}
+        # Traced lookups are decimated in the same job, with their own settings
+        self.startProcessing(self.logic.postProcessTrajectoryInBackground(
+            decimation=decimation, tracedLookupDecimation={}, onProgress=self.updateProcessingProgress,
+            onFinished=self.onDecimationFinished))
+
+    def onDecimationFinished(self, job):
+        """
+        Called on the main thread when the decimation started by the 'Decimate' button is done.
+        """
+        self.onProcessingFinished(job)
+        if not job.applied:
+            return
+        print(f"Trajectory decimated from {job.inputCount} to {len(self.logic.poseBuffer)} poses")
+        if not self.sampler.isRunning:
+            # Send the changed tail of an already streamed trajectory
+            with slicer.util.tryWithErrorDisplay("Failed to publish the decimated trajectory."):
+                self.logic.finishStreaming()
+
+    def onResamplingModeChanged(self, index):
+        """
+        Spacing is a distance along the path or a time interval depending on the resampling mode.
+        """
+        self.ui.resamplingSpacingSpinBox.suffix = " s" if index == 1 else " mm"
+
+    def onResampleButton(self):
+        """
+        This function is called when the user presses the 'Resample' button.
+        """
+        mode = "time" if self.ui.resamplingModeComboBox.currentIndex == 1 else "arclength"
+        smoothing = [None, "cubic", "bspline"][self.ui.smoothingComboBox.currentIndex]
+        maxVelocity = self.ui.maxVelocitySpinBox.value or None
+        maxAcceleration = self.ui.maxAccelerationSpinBox.value or None
+        resampling = {"spacing": self.ui.resamplingSpacingSpinBox.value, "mode": mode, "smoothing": smoothing,
+                      "maxVelocity": maxVelocity, "maxAcceleration": maxAcceleration}
+        self.startProcessing(self.logic.postProcessTrajectoryInBackground(
+            resampling=resampling, onProgress=self.updateProcessingProgress, onFinished=self.onResamplingFinished))
+
+    def onResamplingFinished(self, job):
+        """
+        Called on the main thread when the resampling started by the 'Resample' button is done.
+        """
+        self.onProcessingFinished(job)
+        if not job.applied:
+            return
+        print(f"Trajectory resampled from {job.inputCount} to {len(self.logic.poseBuffer)} poses")
+        if not self.sampler.isRunning:
+            with slicer.util.tryWithErrorDisplay("Failed to publish the resampled trajectory."):
+                self.logic.finishStreaming()
+
+    def startProcessing(self, job):
+        self.ui.cancelProcessingButton.enabled = True
+        self.updateProcessingProgress(job)
+
+    def updateProcessingProgress(self, job):
+        self.ui.processingProgressBar.value = int(round(100 * job.progress))
+        self.ui.processingProgressBar.format = f"{job.message or job.name}: %p%"
+
+    def onCancelProcessingButton(self):
+        self.logic.cancelBackgroundJobs()
+
+    def onProcessingFinished(self, job):
+        """
+        Show the outcome of a background job, errors are displayed like the errors of the other actions.
+        """
+        self.ui.cancelProcessingButton.enabled = bool(self.logic.jobRunner.activeJobs)
+        self.ui.processingProgressBar.value = 100 if job.status == "finished" else 0
+        self.ui.processingProgressBar.format = f"{job.name}: {job.message if job.status == 'finished' else job.status}"
+        if job.status == "failed":
+            slicer.util.errorDisplay(f"Failed to {job.name}.", detailedText=str(job.error))
+
+    def onSaveTrajectoryButton(self):
+        """
+        This function is called when the user presses the 'Save trajectory' button.
+        """
+        path = self.ui.recordingPathLineEdit.currentPath
+        with slicer.util.tryWithErrorDisplay("Failed to save the trajectory.", waitCursor=True):
+            self.logic.saveTrajectory(path)
+            self.ui.recordingPathLineEdit.addCurrentPathToHistory()
+            print(f"Trajectory saved to {path}")
+
+    def onLoadTrajectoryButton(self):
+        """
+        This function is called when the user presses the 'Load trajectory' button.
+        """
+        path = self.ui.recordingPathLineEdit.currentPath
+        with slicer.util.tryWithErrorDisplay("Failed to load the trajectory.", waitCursor=True):
+            count = self.logic.loadTrajectory(path)
+            self.ui.recordingPathLineEdit.addCurrentPathToHistory()
+            print(f"Loaded {count} poses from {path}")
+
+    def onProfilingToggled(self, enabled):
+        """
+        This function is called when the user toggles the 'Enable profiling' checkbox.
+        """
+        self.logic.profiler.enabled = enabled
+        if enabled:
+            self.performanceTimer.start()
+        else:
+            self.performanceTimer.stop()
+        self.updatePerformancePanel()
+
+    def updatePerformancePanel(self):
+        profiler = self.logic.profiler
+        if not profiler.enabled:
+            self.ui.performanceStatusLabel.text = "Profiling disabled"
+            return
+        captureP99 = profiler.summary().get("capture.read", {}).get("p99", 0.0)
+        self.ui.performanceStatusLabel.text = (f"Tick rate: {profiler.rate('capture.read'):.1f} Hz, "
+            f"capture p99: {captureP99 * 1000:.3f} ms, buffer: {len(self.logic.poseBuffer)} poses")
+        self.ui.performanceTextEdit.plainText = profiler.formatSummary()
+
+    def onResetProfilingButton(self):
+        self.logic.profiler.reset()
+        self.updatePerformancePanel()
+
+    def onExportProfilingButton(self):
+        """
+        This function is called when the user presses the 'Export...' button of the performance panel.
+        """
+        path = qt.QFileDialog.getSaveFileName(self.parent, "Export profiling data", "RobotTrajectoryGenerator.trace.json",
+                                              "Chrome trace (*.trace.json);;Stage statistics (*.json)")
+        if not path:
+            return
+        with slicer.util.tryWithErrorDisplay("Failed to export the profiling data."):
+            self.logic.profiler.save(path)
 
     def onClearPathButton(self):
         """
@@ -271,7 +789,9 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
         """
         This function is called when the user presses 'Send trajectory' button.
         """
-        self.logic.SendPoseArray()
+        with slicer.util.tryWithErrorDisplay("Failed to publish the trajectory."):
+            self.startProcessing(self.logic.SendPoseArrayInBackground(onProgress=self.updateProcessingProgress,
+                                                                      onFinished=self.onProcessingFinished))
 
 
 
@@ -279,7 +799,7 @@ class RobotTrajectoryGeneratorWidget(ScriptedLoadableModuleWidget, VTKObservatio
 # RobotTrajectoryGeneratorLogic
 #
 
-class RobotTrajectoryGeneratorLogic(ScriptedLoadableModuleLogic):
+class RobotTrajectoryGeneratorLogic(ScriptedLoadableModuleLogic, VTKObservationMixin):
     """This class should implement all the actual
     computation done by your module.  The interface
     should be such that other python code can import
@@ -289,134 +809,961 @@ class RobotTrajectoryGeneratorLogic(ScriptedLoadableModuleLogic):
     https://github.com/Slicer/Slicer/blob/main/Base/Python/slicer/ScriptedLoadableModule.py
     """
 
+    # Attribute set on every node created by this logic, so that they can be told apart from the user's nodes
+    OWNER_ATTRIBUTE_NAME = "RobotTrajectoryGenerator.Owner"
+
+    # Settings stored in the parameter node, with their default values (parameter node values are strings)
+    DEFAULT_PARAMETERS = {
+        "CaptureMode": "fixed",  # "fixed": sample at SamplingRate, "events": sample on transform updates
+        "SamplingRate": "50.0",  # Hz
+        "MaxEventRate": "0.0",  # Hz, 0 = unlimited
+        "CoalescingWindow": "16.0",  # ms
+        "TraceDuration": "5.0",  # s, 0 = until stopped
+        "DistanceThreshold": "5.0",  # mm
+        "ShowTrajectory": "true",
+        "PathDisplay": "fiducials",
+        "GlyphStride": "1",
+        "RecordAllSamples": "false",
+        "DecimationMethod": "threshold",
+        "TranslationTolerance": "5.0",  # mm
+        "RotationTolerance": "5.0",  # degrees
+        "MinTimeGap": "0.0",  # s
+        "MaxTimeGap": "0.0",  # s
+        "ResamplingMode": "arclength",
+        "ResamplingSpacing": "5.0",  # mm or s
+        "Smoothing": "none",
+        "MaxVelocity": "0.0",  # mm/s
+        "MaxAcceleration": "0.0",  # mm/s^2
+        "StreamTrajectory": "false",
+        "ChunkSize": "50",  # poses
+        "ChunkInterval": "500",  # ms
+        "PoseArrayTopic": "/slicer_posearray",
+        "RecordingPath": "",
+        "RecordWhileTracing": "false",
+        "Replay": "false",
+        "ReplaySpeed": "1.0",  # 0 = as fast as possible
+    }
+
     def __init__(self):
         """
         Called when the logic class is instantiated. Can be used for initializing member variables.
         """
         ScriptedLoadableModuleLogic.__init__(self)
-        self.trajectoryPoints = slicer.mrmlScene.GetFirstNodeByName("Trajectory") # will be None if this doesn't work
-        self.trCollection = vtk.vtkTransformCollection()
+        VTKObservationMixin.__init__(self)  # needed for observing the lookup in event-driven capture
+        self._ownedNodes = []  # nodes created by this logic, removed in a single batch by RemoveTransforms
+        self.trajectoryPoints = self.adoptOwnedNode("Trajectory")  # None if this module did not create one yet
+        self.observedLookup = None
+        self.poseSource = None  # replay source read instead of the observed lookup when set (see ReplaySource)
+        self.poseArrayTopic = "/slicer_posearray"
+        self.streamingEnabled = False  # publish the trajectory in chunks while tracing
+        self.distanceThreshold = 5.0  # mm the lookup has to move before a new point is kept
+        self.recordAllSamples = False  # keep every sample and decimate after tracing instead of using distanceThreshold
+        self.visualizationEnabled = True
+        self.glyphStride = 1  # only every k-th pose is drawn as an axis triad
+        self.glyphScale = 10.0  # length of the drawn axes in mm
+        self.pathDisplayMode = "fiducials"  # "fiducials": a labelled fiducial per point, "polyline": a single line model
+
+        # Captured poses, written by AddToTrajectory and read by the visualization and publishing code
+        self.poseBuffer = PoseBuffer()
+        self._visualizedCount = 0
+
+        # Timing spans around the stages of capture, visualization, clearing and publishing (disabled by default)
+        self.profiler = Profiler()
+
+        # Spatial index over the captured positions, brought up to date with the pose buffer when it is queried
+        self.positionIndex = PositionIndex(cellSize=10.0)
+
+        # Every traced lookup is a frame of the recorder, they are all read in the same pass and share the timestamps.
+        # The first frame is the observed lookup, stored in poseBuffer, the other ones are added by addTracedLookup.
+        self.frameRecorder = MultiFrameRecorder()
+        self.frameRecorder.addFrame("observed", buffer=self.poseBuffer)
+        self._tracedLookups = []  # lookups of the other frames, in frame order
+        self._tracedPoints = {}  # frame name -> fiducial list showing the frame's trajectory
+        self._tracedVisualizedCounts = {}
+
+        # In polyline mode the path is a single model node, its points and line are set from NumPy arrays that grow with
+        # the path: only the positions captured since the last update are copied into them
+        self.pathNode = None
+        self._pathPositions = np.zeros((0, 3))
+        self._pathPointIds = np.zeros(0, dtype=np.int64)
+        self._pathCount = 0
+        self._pathPoints = vtk.vtkPoints()
+        self._pathLines = vtk.vtkCellArray()
+        self._pathPolyData = vtk.vtkPolyData()
+        self._pathPolyData.SetPoints(self._pathPoints)
+        self._pathPolyData.SetLines(self._pathLines)
+
+        # All the poses are drawn by a single tensor glyph filter into a single model node
+        self.poseGlyphsNode = None
+        self._glyphPoints = vtk.vtkPoints()
+        self._glyphOrientations = vtk.vtkDoubleArray()
+        self._glyphOrientations.SetName("Orientation")
+        self._glyphOrientations.SetNumberOfComponents(9)
+        self._glyphInput = vtk.vtkPolyData()
+        self._glyphInput.SetPoints(self._glyphPoints)
+        self._glyphInput.GetPointData().SetTensors(self._glyphOrientations)
+        self._glyphSource = vtk.vtkAxes()
+        self._glyphSource.SymmetricOff()
+        self._glyphFilter = vtk.vtkTensorGlyph()
+        self._glyphFilter.SetInputData(self._glyphInput)
+        self._glyphFilter.SetSourceConnection(self._glyphSource.GetOutputPort())
+        self._glyphFilter.ExtractEigenvaluesOff()  # use the tensor columns (the rotation axes) as glyph axes
+        self._glyphFilter.ColorGlyphsOff()
+        self._glyphFilter.SetScaleFactor(self.glyphScale)
+        self._glyphedCount = 0
+
+        # Preallocated so that sampling the lookups does not allocate
+        self._lookupMatrix = vtk.vtkMatrix4x4()
+        self._framePoses = np.eye(4)[np.newaxis].copy()  # one pose per frame of the recorder
+
+        # Publishing reuses the same transforms and publisher nodes from one send to the next
+        self._transformPacker = TransformCollectionPacker()
+        self._backgroundPackers = []  # packers of SendPoseArrayInBackground that are not in use
+        self._publishers = {}
+        self.trajectoryStreamer = TrajectoryStreamer(self.publishTrajectoryChunk)
+        self.trajectoryWriter = None  # recording file the stored poses are appended to while tracing
+
+        # Long post-processing runs in a worker thread on copies of the pose buffer, the results are applied to the
+        # scene on the main thread, from _jobTimer
+        self.jobRunner = JobRunner()
+        self._jobTimer = qt.QTimer()
+        self._jobTimer.setInterval(50)
+        self._jobTimer.connect('timeout()', self.processBackgroundJobs)
+
+        # Event-driven capture: the lookup is sampled when its transform changes, bursts of changes become one sample
+        self.eventCoalescer = EventCoalescer()
+        self.eventCapturePaused = False
+        self._eventCaptureLookup = None  # lookup observed while event-driven capture is active
+        self._lastEventTime = None
+        self._eventSampleTimer = qt.QTimer()
+        self._eventSampleTimer.setSingleShot(True)
+        self._eventSampleTimer.setTimerType(qt.Qt.PreciseTimer)
+        self._eventSampleTimer.connect('timeout()', self.onEventSampleTimeout)
 
     def setDefaultParameters(self, parameterNode):
         """
-        Initialize parameter node with default settings.
+        Initialize parameter node with default settings. Parameters that are already set (for example restored with the
+        scene) are kept.
+        """
+        wasModified = parameterNode.StartModify()
+        for name, value in self.DEFAULT_PARAMETERS.items():
+            if not parameterNode.GetParameter(name) and value:
+                parameterNode.SetParameter(name, value)
+        parameterNode.EndModify(wasModified)
+
+    def numericParameter(self, parameterNode, name, minimum=0.0, positive=False):
+        """
+        Value of a numeric parameter. Values come from hand-edited or older scenes too: a value that cannot be parsed, or
+        that is not positive if positive is set, is replaced by the default value, and a value below minimum is clamped.
+        """
+        text = parameterNode.GetParameter(name)
+        try:
+            value = float(text)
+        except ValueError:
+            value = float("nan")
+        if not np.isfinite(value) or (positive and value <= 0):
+            value = float(self.DEFAULT_PARAMETERS[name])
+            print(f"Invalid {name} parameter {text!r}, using {value}")
+            return value
+        return max(value, minimum)
+
+    def updateFromParameterNode(self, parameterNode, names=None):
         """
-        print('Not using parameter node.')
+        Use the settings of the parameter node (only the parameters in names if given). This is cheap enough to be called
+        whenever a parameter changes, while tracing too: the values are used from the next sample on, the buffers and
+        the publishers are kept. Settings that are only read when tracing starts (sampling rate, capture mode, ...)
+        are passed to the methods that start it.
+        """
+        def changed(name):
+            return names is None or name in names
+
+        def value(name):
+            return parameterNode.GetParameter(name)
+
+        def number(name, minimum=0.0, positive=False):
+            return self.numericParameter(parameterNode, name, minimum, positive)
+
+        if changed("DistanceThreshold"):
+            self.distanceThreshold = number("DistanceThreshold")
+        if changed("RecordAllSamples"):
+            self.recordAllSamples = value("RecordAllSamples") == "true"
+        if changed("MaxEventRate"):
+            self.eventCoalescer.maxRate = number("MaxEventRate") or None
+        if changed("CoalescingWindow"):
+            self.eventCoalescer.coalesceInterval = number("CoalescingWindow") / 1000.0
+        if changed("StreamTrajectory"):
+            self.streamingEnabled = value("StreamTrajectory") == "true"
+        if changed("ChunkSize"):
+            self.trajectoryStreamer.chunkSize = int(number("ChunkSize", minimum=1.0, positive=True))
+        if changed("ChunkInterval"):
+            self.trajectoryStreamer.chunkInterval = number("ChunkInterval") / 1000.0
+        if changed("PoseArrayTopic"):
+            self.poseArrayTopic = value("PoseArrayTopic")
+        if changed("GlyphStride"):
+            glyphStride = int(number("GlyphStride", minimum=1.0, positive=True))
+            if glyphStride != self.glyphStride:
+                self.setGlyphStride(glyphStride)
+        if changed("PathDisplay") and value("PathDisplay") != self.pathDisplayMode:
+            self.setPathDisplayMode(value("PathDisplay"))
+        if changed("ShowTrajectory") and (value("ShowTrajectory") == "true") != self.visualizationEnabled:
+            self.visualizationEnabled = value("ShowTrajectory") == "true"
+            self.updateVisualization()
 
     def setObservedLookup(self, observedLookup):
 
         self.observedLookup = observedLookup
         self.createTrajectoryFiducials()
+        if self.isEventCaptureActive and observedLookup is not self._eventCaptureLookup:
+            # Keep capturing, from the new lookup
+            self.removeObserver(self._eventCaptureLookup, slicer.vtkMRMLTransformNode.TransformModifiedEvent,
+                                self.onObservedLookupModified)
+            self._eventCaptureLookup = None
+            self._observeLookupEvents()
 
     def createTrajectoryFiducials(self):
 
-        if slicer.mrmlScene.GetFirstNodeByName('Trajectory') is None:
+        if self.trajectoryPoints is not None and slicer.mrmlScene.IsNodePresent(self.trajectoryPoints):
+            return
+        self.trajectoryPoints = self.adoptOwnedNode('Trajectory')
+        if self.trajectoryPoints is None:
             self.trajectoryPoints = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLMarkupsFiducialNode')
             self.trajectoryPoints.SetName('Trajectory')
+            self.registerOwnedNode(self.trajectoryPoints)
 
-    def AddToTrajectory(self):
+    def registerOwnedNode(self, node):
+        """
+        Tag a node created by this logic (and its display nodes) so that RemoveTransforms can remove it later.
+        """
+        nodes = [node]
+        if node.IsA("vtkMRMLDisplayableNode"):
+            nodes += [node.GetNthDisplayNode(index) for index in range(node.GetNumberOfDisplayNodes())]
+        for ownedNode in nodes:
+            ownedNode.SetAttribute(self.OWNER_ATTRIBUTE_NAME, self.moduleName)
+            if ownedNode not in self._ownedNodes:
+                self._ownedNodes.append(ownedNode)
+
+    def isOwnedNode(self, node):
+        return node is not None and node.GetAttribute(self.OWNER_ATTRIBUTE_NAME) == self.moduleName
+
+    def adoptOwnedNode(self, name):
+        """
+        Find a node with this name that was created by this module (by an earlier logic, or loaded with the scene) and
+        register it, so that it is cleared and removed like the nodes this logic creates. Nodes of the same name that
+        belong to others are left alone. Returns None if there is none.
+        """
+        nodes = slicer.mrmlScene.GetNodesByName(name)
+        for index in range(nodes.GetNumberOfItems()):
+            node = nodes.GetItemAsObject(index)
+            if self.isOwnedNode(node):
+                self.registerOwnedNode(node)
+                return node
+        return None
+
+    def AddToTrajectory(self, timestamp=None):
         """
-        This function gets the x, y, z coordinate of the observed lookup and adds it as a fiducial for visualization.
-        It also takes the entire pose (from the lookup) and saves it to a transform collection for publishing later.
+        This function samples the pose of the observed lookup and stores it in the pose buffer if the lookup has moved
+        far enough since the last stored pose (or always if recordAllSamples is set). The traced lookups added by
+        addTracedLookup are sampled in the same pass, with the same timestamp, each against its own threshold, also when
+        there is no observed lookup.
+        It does not touch the scene, the stored poses are shown by updateVisualization.
+        Returns True if the pose of the observed lookup was stored.
         """
+        firstFrame = 0
+        with self.profiler.span("capture.read"):
+            if self.poseSource is not None:
+                # Replayed poses are stamped with their recording time
+                self.poseSource.update()
+                self._framePoses[0] = self.poseSource.currentPose()
+                if timestamp is None:
+                    timestamp = self.poseSource.currentTime
+            elif self.observedLookup is None:
+                if not self._tracedLookups:
+                    return False
+                firstFrame = 1  # only the traced lookups are sampled
+            else:
+                self.observedLookup.GetMatrixTransformToWorld(self._lookupMatrix)
+                copyVTKMatrixToArray(self._lookupMatrix, self._framePoses[0])
+            if timestamp is None:
+                timestamp = time.time()
+
+            for index, lookup in enumerate(self._tracedLookups, 1):
+                lookup.GetMatrixTransformToWorld(self._lookupMatrix)
+                copyVTKMatrixToArray(self._lookupMatrix, self._framePoses[index])
+
+        with self.profiler.span("capture.store"):
+            # The first point of the trajectory is always kept, the next ones only if the lookup has moved a certain distance
+            self.frameRecorder.frames[0].distanceThreshold = None if self.recordAllSamples else self.distanceThreshold
+            stored = bool(self.frameRecorder.append(self._framePoses, timestamp, firstFrame)[0])
+            if stored and self.trajectoryWriter is not None:
+                self.trajectoryWriter.append(self._framePoses[0], timestamp)
+        return stored
+
+    def getObservedPosition(self):
+        """
+        Current position of the observed lookup (or of the replay source), None if there is nothing to observe.
+        """
+        if self.poseSource is not None:
+            self.poseSource.update()
+            return self.poseSource.currentPose()[:3, 3].copy()
+        if self.observedLookup is None:
+            return None
+        self.observedLookup.GetMatrixTransformToWorld(self._lookupMatrix)
+        return np.array([self._lookupMatrix.GetElement(row, 3) for row in range(3)])
+
+    def getPositionIndex(self):
+        """
+        Spatial index over the positions of the captured poses (the index of a position is the index of its pose).
+        Poses captured since the last query are added to it, it is rebuilt after the poses were replaced.
+        """
+        indexedCount = len(self.positionIndex)
+        count = len(self.poseBuffer)
+        if count < indexedCount:
+            self.positionIndex.clear()
+            indexedCount = 0
+        if count > indexedCount:
+            self.positionIndex.extend(self.poseBuffer.poses()[indexedCount:, :3, 3])
+        return self.positionIndex
+
+    def findNearestWaypoints(self, position=None, k=1):
+        """
+        Indices and distances of the k captured poses nearest to position (by default the observed lookup),
+        for example to resume a trajectory from the waypoint closest to the tool.
+        """
+        if position is None:
+            position = self.getObservedPosition()
+        if position is None:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        return self.getPositionIndex().nearest(position, k)
 
-        # Check if the fiducial list exists already
-        if self.trajectoryPoints is None:
+    def findWaypointsWithinRadius(self, radius, position=None):
+        """
+        Indices and distances of the captured poses within radius (mm) of position (by default the observed lookup).
+        """
+        if position is None:
+            position = self.getObservedPosition()
+        if position is None:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        return self.getPositionIndex().radius(position, radius)
+
+    def findRetracedWaypoints(self, position=None, radius=None, ignoreLast=10):
+        """
+        Indices of the captured poses that position (by default the observed lookup) comes back to: the poses within
+        radius (by default the distance threshold) except the last ignoreLast ones, which are the segment being traced.
+        An empty result means the lookup is not retracing the trajectory.
+        """
+        indices, _ = self.findWaypointsWithinRadius(self.distanceThreshold if radius is None else radius, position)
+        return indices[indices < len(self.poseBuffer) - ignoreLast]
+
+    def startRecording(self, path, append=True):
+        """
+        Append the poses stored by AddToTrajectory to a recording file (.rtg) until stopRecording is called.
+        """
+        self.stopRecording()
+        self.trajectoryWriter = TrajectoryRecordingWriter(path, append)
+
+    def stopRecording(self):
+        if self.trajectoryWriter is not None:
+            self.trajectoryWriter.close()
+            self.trajectoryWriter = None
+
+    def saveTrajectory(self, path):
+        """
+        Save the captured poses and their timestamps (see saveTrajectory for the supported file formats).
+        """
+        saveTrajectory(path, self.poseBuffer.poses(), self.poseBuffer.timestamps())
+
+    def loadTrajectory(self, path):
+        """
+        Replace the captured poses by the content of a trajectory file and update the visualization.
+        Returns the number of loaded poses.
+        """
+        poses, timestamps = loadTrajectory(path)
+        self.poseBuffer.assign(poses, timestamps)
+        self.onPosesReplaced()
+        return len(poses)
+
+    def setPoseSource(self, poseSource):
+        """
+        Trace the poses of a replay source instead of the observed lookup (None to go back to the lookup).
+        The source is started, it follows the wall clock at its replay speed.
+        """
+        self.poseSource = poseSource
+        if poseSource is not None:
+            poseSource.start()
             self.createTrajectoryFiducials()
 
-        # Check how many fiducials are already in the traced path
-        numControlPts = self.trajectoryPoints.GetNumberOfControlPoints()
-
-        # Get the x, y, z position from the observed lookup
-        mat = vtk.vtkMatrix4x4()
-        self.observedLookup.GetMatrixTransformToWorld(mat)
-        transform = slicer.vtkMRMLLinearTransformNode()
-        transform.SetMatrixTransformToParent(mat)
-        pos_new = [mat.GetElement(0,3), mat.GetElement(1,3), mat.GetElement(2,3)]
-
-        # Store the matrix as a transform (so we can save the full lookup later)
-        tr = vtk.vtkTransform()
-        tr.SetMatrix(mat)
-
-        # If it's the first point in the trajectory - we always add it to the list
-        if numControlPts == 0:
-            self.trajectoryPoints.InsertControlPointWorld(0, pos_new)
-
-            # FOR VISUALIZATION - not necessary for functions
-            transformNode = slicer.mrmlScene.AddNode(transform)
-            slicer.modules.createmodels.widgetRepresentation().OnCreateCoordinateClicked() # dependency on SlicerIGT
-            coordinateModels = slicer.mrmlScene.GetNodesByName("CoordinateModel")
-            mostRecentCoordinateModel = coordinateModels.GetItemAsObject(coordinateModels.GetNumberOfItems() - 1)
-            mostRecentCoordinateModel.SetDisplayVisibility(False)
-            mostRecentCoordinateModel.SetAndObserveTransformNodeID(transformNode.GetID())
-
-            # Save to a transform collection list for publishing later on
-            self.trCollection.AddItem(tr)
+    def replayAsFastAsPossible(self, poseSource, rateHz=None):
+        """
+        Feed a whole replay source through AddToTrajectory, sampled at rateHz (every recorded pose if None),
+        without timers and with the scene updated only once at the end. Returns the number of stored poses.
+        """
+        previousPoseSource, visualizationEnabled = self.poseSource, self.visualizationEnabled
+        self.poseSource = poseSource
+        self.visualizationEnabled = False
+        countBefore = len(self.poseBuffer)
+        try:
+            for sampleTime in poseSource.sampleTimes(rateHz):
+                poseSource.seek(sampleTime)
+                self.AddToTrajectory()
+        finally:
+            self.poseSource = previousPoseSource
+            self.visualizationEnabled = visualizationEnabled
+        self.createTrajectoryFiducials()
+        self.updateVisualization()
+        return len(self.poseBuffer) - countBefore
+
+    def addTracedLookup(self, lookup, distanceThreshold=5.0, decimation=None):
+        """
+        Trace another lookup at the same time as the observed one. It gets its own pose buffer, distance threshold
+        (None stores every sample) and decimation settings (keyword arguments of decimatePoses).
+        Returns the frame of the recorder holding its poses.
+        """
+        frame = self.frameRecorder.addFrame(lookup.GetID(), distanceThreshold=distanceThreshold, decimation=decimation)
+        self._tracedLookups.append(lookup)
+        self._framePoses = np.tile(np.eye(4), (len(self.frameRecorder), 1, 1))
+        return frame
+
+    def removeTracedLookup(self, lookup):
+        name = lookup.GetID()
+        index = self.frameRecorder.frameNames().index(name)
+        self.frameRecorder.removeFrame(name)
+        del self._tracedLookups[index - 1]
+        self._framePoses = np.tile(np.eye(4), (len(self.frameRecorder), 1, 1))
+        points = self._tracedPoints.pop(name, None)
+        self._tracedVisualizedCounts.pop(name, None)
+        if points is not None and self.isOwnedNode(points) and slicer.mrmlScene.IsNodePresent(points):
+            slicer.mrmlScene.RemoveNode(points)
+
+    def getTracedLookupBuffer(self, lookup):
+        return self.frameRecorder.frame(lookup.GetID()).buffer
+
+    def decimateTracedLookups(self, **settings):
+        """
+        Decimate the poses of every traced lookup with its own decimation settings (overridden by settings).
+        Returns a dictionary from lookup node ID to the indices of the kept poses.
+        """
+        keptIndices = {}
+        for frame in self.frameRecorder.frames[1:]:
+            keptIndices[frame.name] = self.frameRecorder.decimate(frame.name, **settings)
+            self.resetTracedLookupVisualization(frame.name)
+        self.updateVisualization()
+        return keptIndices
+
+    @property
+    def isEventCaptureActive(self):
+        return self._eventCaptureLookup is not None
+
+    def startEventCapture(self, maxRate=None, coalesceInterval=None):
+        """
+        Sample the observed lookup whenever its transform is modified instead of at a fixed rate.
+        Modifications received within coalesceInterval seconds of each other are merged into a single sample
+        and, if maxRate is set, samples are at least 1 / maxRate seconds apart.
+        """
+        self.stopEventCapture(flush=False)
+        self.eventCoalescer.maxRate = maxRate
+        if coalesceInterval is not None:
+            self.eventCoalescer.coalesceInterval = coalesceInterval
+        self.eventCoalescer.reset()
+        self.eventCapturePaused = False
+        self._observeLookupEvents()
+
+    def stopEventCapture(self, flush=True):
+        """
+        Stop observing the lookup. A sample still waiting for its coalescing window is taken right away if flush is set.
+        """
+        if not self.isEventCaptureActive:
             return
+        self.removeObserver(self._eventCaptureLookup, slicer.vtkMRMLTransformNode.TransformModifiedEvent,
+                            self.onObservedLookupModified)
+        self._eventCaptureLookup = None
+        if self.eventCoalescer.isPending:
+            self._eventSampleTimer.stop()
+            if flush:
+                self.onEventSampleTimeout()
+            else:
+                self.eventCoalescer.onSampled(time.perf_counter())
+
+    def _observeLookupEvents(self):
+        if self.observedLookup is None:
+            return
+        self._eventCaptureLookup = self.observedLookup
+        self.addObserver(self._eventCaptureLookup, slicer.vtkMRMLTransformNode.TransformModifiedEvent,
+                         self.onObservedLookupModified)
 
-        # If it's not the first point in the trajectory - check how much the lookup has moved (only add to the list if it's moved a certain distance)
+    def onObservedLookupModified(self, caller, event):
+        """
+        Called for every modification of the observed lookup while event-driven capture is active.
+        Only schedules a sample, the lookup is read once when the coalescing window has elapsed.
+        """
+        if self.eventCapturePaused:
+            return
+        self._lastEventTime = time.time()
+        delay = self.eventCoalescer.onEvent(time.perf_counter())
+        if delay is not None:
+            self._eventSampleTimer.start(int(round(delay * 1000.0)))
 
-        # Get the last point in the trajectory list
-        pos = [0, 0, 0, 0]
-        self.trajectoryPoints.GetNthFiducialWorldCoordinates(numControlPts - 1, pos)
-        pos_prev = pos[0:3]
+    def onEventSampleTimeout(self):
+        """
+        Take the sample of a burst of lookup modifications, stamped with the time of the last modification.
+        """
+        if not self.eventCoalescer.isPending:
+            return
+        self.eventCoalescer.onSampled(time.perf_counter())
+        self.AddToTrajectory(self._lastEventTime)
 
-        # Calculate the distance between new and previous point
-        euclidean_distance = math.dist(pos_prev, pos_new)
+    def updateStreaming(self, now=None):
+        """
+        Publish the chunks of the trajectory that are ready, if streaming is enabled. Called at every sampling tick.
+        """
+        if self.streamingEnabled:
+            with self.profiler.span("streaming.update"):
+                try:
+                    self.trajectoryStreamer.update(self.poseBuffer.poses(), now)
+                except Exception:
+                    # Streaming is turned off so that the failure is reported once, not at every tick
+                    self.streamingEnabled = False
+                    raise
+
+    def finishStreaming(self):
+        """
+        Publish what is left of the trajectory and the 'complete' chunk, if streaming is enabled.
+        """
+        if self.streamingEnabled:
+            self.trajectoryStreamer.rewind(self.poseBuffer.poses())
+            self.trajectoryStreamer.finish(self.poseBuffer.poses())
 
-        if euclidean_distance > 5.0:
-            # Append to the list if the distance threshold is achieved
-            self.trajectoryPoints.InsertControlPointWorld(numControlPts, pos_new)
+    def updateVisualization(self):
+        """
+        Add the poses captured since the last call to the scene: the points (as fiducials or as a polyline, see
+        pathDisplayMode) and an axis triad per pose. All the poses captured in between are added in a single batch,
+        this is meant to be called at a much lower rate than the sampling rate.
+        """
+        if not self.visualizationEnabled:
+            return
+        self.updateTracedLookupsVisualization()
+        count = len(self.poseBuffer)
+        if self._visualizedCount >= count:
+            return
+
+        with self.profiler.span("visualization.markups"):
+            if self.pathDisplayMode == "polyline":
+                self.updateTrajectoryPath()
+            else:
+                self.updateTrajectoryFiducials()
+            self._visualizedCount = count
+
+        with self.profiler.span("visualization.glyphs"):
+            self.updatePoseGlyphs()
+
+    @staticmethod
+    def appendMarkupsPositions(points, positions):
+        """
+        Append control points to a markups node from an N x 3 array of world positions, in a single
+        StartModify/EndModify block so that the node is modified and its display updated once per batch, not once per
+        point. The points already in the node are not touched.
+        """
+        if len(positions) == 0:
+            return
+        wasModifying = points.StartModify()
+        try:
+            point = vtk.vtkVector3d()
+            for x, y, z in np.asarray(positions, dtype=float).tolist():
+                point.Set(x, y, z)
+                points.AddControlPointWorld(point)
+        finally:
+            points.EndModify(wasModifying)
+
+    def updateTrajectoryFiducials(self):
+        """
+        Add the points captured since the last update to the fiducial list, in one batch (see appendMarkupsPositions).
+        """
+        # Check if the fiducial list exists already
+        self.createTrajectoryFiducials()
+        self.appendMarkupsPositions(self.trajectoryPoints, self.poseBuffer.poses()[self._visualizedCount:, :3, 3])
+
+    def getTrajectoryPathNode(self):
+        """
+        Get the model node showing the path as a polyline, create it if needed.
+        """
+        if self.pathNode is None or not slicer.mrmlScene.IsNodePresent(self.pathNode):
+            self.pathNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode", "TrajectoryPath")
+            self.pathNode.SetAndObservePolyData(self._pathPolyData)
+            self.pathNode.CreateDefaultDisplayNodes()
+            self.pathNode.GetDisplayNode().SetColor(1.0, 0.5, 0.0)
+            self.pathNode.GetDisplayNode().SetLineWidth(2.0)
+            self.registerOwnedNode(self.pathNode)
+        return self.pathNode
+
+    def updateTrajectoryPath(self):
+        """
+        Draw the captured positions as a single polyline. The positions captured since the last update are appended to
+        the arrays holding the points and the line connectivity, which VTK uses without copying them (no call per point),
+        and the model is modified once.
+        """
+        self.getTrajectoryPathNode()
+        positions = self.poseBuffer.poses()[:, :3, 3]
+        count = len(positions)
+        if count > len(self._pathPositions):
+            # Grow by doubling, the point ids of the line are the same for every path and only computed when growing
+            capacity = max(2 * len(self._pathPositions), count, 1024)
+            storage = np.zeros((capacity, 3))
+            storage[:self._pathCount] = self._pathPositions[:self._pathCount]
+            self._pathPositions = storage
+            self._pathPointIds = np.arange(capacity, dtype=np.int64)
+        self._pathPositions[self._pathCount:count] = positions[self._pathCount:]
+        self._pathCount = count
+        self._pathPoints.SetData(numpy_support.numpy_to_vtk(self._pathPositions[:count], deep=False))
+        self._pathLines.SetData(numpy_support.numpy_to_vtkIdTypeArray(np.array([0, count], dtype=np.int64), deep=True),
+                                numpy_support.numpy_to_vtkIdTypeArray(self._pathPointIds[:count], deep=False))
+        self._pathPolyData.Modified()
+
+    def resetTrajectoryPath(self):
+        self._pathCount = 0
+        self._pathPoints.Reset()
+        self._pathLines.Reset()
+        self._pathPolyData.Modified()
+
+    def setPathDisplayMode(self, mode):
+        """
+        Show the path as fiducials ("fiducials") or as a single polyline ("polyline"). The scene is redrawn.
+        """
+        if mode not in ("fiducials", "polyline"):
+            raise ValueError(f"Unknown path display mode: {mode}")
+        self.pathDisplayMode = mode
+        if self.pathNode is not None and slicer.mrmlScene.IsNodePresent(self.pathNode):
+            self.pathNode.SetDisplayVisibility(mode == "polyline")
+        self.resetVisualization()
+        self.updateVisualization()
+
+    def updateTracedLookupsVisualization(self):
+        """
+        Add the poses captured since the last call for the traced lookups, each to a fiducial list of its own, in one
+        batch per list (see appendMarkupsPositions).
+        """
+        for lookup, frame in zip(self._tracedLookups, self.frameRecorder.frames[1:]):
+            count = len(frame.buffer)
+            if self._tracedVisualizedCounts.get(frame.name, 0) >= count:
+                continue
+            points = self._tracedPoints.get(frame.name)
+            if points is None or not slicer.mrmlScene.IsNodePresent(points):
+                points = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLMarkupsFiducialNode', f"{lookup.GetName()} trajectory")
+                self.registerOwnedNode(points)
+                self._tracedPoints[frame.name] = points
+                self._tracedVisualizedCounts[frame.name] = 0
+            visualizedCount = self._tracedVisualizedCounts[frame.name]
+            self.appendMarkupsPositions(points, frame.buffer.poses()[visualizedCount:, :3, 3])
+            self._tracedVisualizedCounts[frame.name] = count
+
+    def resetTracedLookupVisualization(self, name):
+        points = self._tracedPoints.get(name)
+        if points is not None and slicer.mrmlScene.IsNodePresent(points):
+            points.RemoveAllControlPoints()
+        self._tracedVisualizedCounts[name] = 0
+
+    def getPoseGlyphsNode(self):
+        """
+        Get the model node showing the axis triads of the poses, create it if needed.
+        """
+        if self.poseGlyphsNode is None or not slicer.mrmlScene.IsNodePresent(self.poseGlyphsNode):
+            self.poseGlyphsNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode", "TrajectoryPoses")
+            self.poseGlyphsNode.SetPolyDataConnection(self._glyphFilter.GetOutputPort())
+            self.poseGlyphsNode.CreateDefaultDisplayNodes()
+            self.poseGlyphsNode.SetDisplayVisibility(False)
+            self.registerOwnedNode(self.poseGlyphsNode)
+        return self.poseGlyphsNode
+
+    def updatePoseGlyphs(self):
+        """
+        Append the poses that are not drawn yet (only every glyphStride-th one) to the glyph input.
+        Only the new points are added, the glyph filter is then updated once for the whole batch.
+        """
+        self.getPoseGlyphsNode()
+        count = len(self.poseBuffer)
+        if self._glyphedCount >= count:
+            return
 
-            # FOR VISUALIZATION - not necessary for functions
-            transformNode = slicer.mrmlScene.AddNode(transform)  # This is just for visualization
-            slicer.modules.createmodels.widgetRepresentation().OnCreateCoordinateClicked()
-            coordinateModels = slicer.mrmlScene.GetNodesByName("CoordinateModel")
-            mostRecentCoordinateModel = coordinateModels.GetItemAsObject(coordinateModels.GetNumberOfItems() - 1)
-            mostRecentCoordinateModel.SetDisplayVisibility(False)
-            mostRecentCoordinateModel.SetAndObserveTransformNodeID(transformNode.GetID())
+        poses = self.poseBuffer.poses()
+        # First index at or after the last processed one that falls on the stride
+        firstIndex = -(-self._glyphedCount // self.glyphStride) * self.glyphStride
+        for index in range(firstIndex, count, self.glyphStride):
+            pose = poses[index]
+            self._glyphPoints.InsertNextPoint(pose[:3, 3])
+            # vtkTensorGlyph reads the tensor column by column
+            self._glyphOrientations.InsertNextTuple(pose[:3, :3].T.ravel())
+        self._glyphedCount = count
+
+        self._glyphFilter.SetScaleFactor(self.glyphScale)
+        self._glyphPoints.Modified()
+        self._glyphOrientations.Modified()
+        self._glyphInput.Modified()
+
+    def setGlyphStride(self, stride):
+        """
+        Draw only every `stride`-th pose. Existing glyphs are rebuilt from the pose buffer.
+        """
+        self.glyphStride = max(1, int(stride))
+        self.resetPoseGlyphs()
+        self.updatePoseGlyphs()
+
+    def resetPoseGlyphs(self):
+        self._glyphPoints.Reset()
+        self._glyphOrientations.Reset()
+        self._glyphPoints.Modified()
+        self._glyphOrientations.Modified()
+        self._glyphInput.Modified()
+        self._glyphedCount = 0
+
+    def getTransformCollection(self):
+        """
+        Get a transform collection with one transform per captured pose. The collection is reused by the next call.
+        """
+        return self._transformPacker.pack(self.poseBuffer.poses())
 
-            # Save to a transform collection list for publishing later on
-            self.trCollection.AddItem(tr)
+    def decimateTrajectory(self, translationTolerance=5.0, rotationTolerance=None, minTimeGap=None, maxTimeGap=None,
+                           method="threshold"):
+        """
+        Decimate the captured poses in place (see decimatePoses for the parameters) and update the visualization.
+        Returns the indices of the kept poses in the trajectory before decimation.
+        """
+        indices = decimatePoses(self.poseBuffer.poses(), self.poseBuffer.timestamps(), translationTolerance,
+                                rotationTolerance, minTimeGap, maxTimeGap, method)
+        self.poseBuffer.keep(indices)
+        self.onPosesReplaced()
+        return indices
+
+    def resampleTrajectory(self, spacing, mode="arclength", smoothing=None, smoothingIterations=1,
+                           maxVelocity=None, maxAcceleration=None):
+        """
+        Replace the captured poses by evenly spaced waypoints (see resampleTrajectory for the parameters)
+        and update the visualization. Returns the number of waypoints.
+        """
+        poses, timestamps = resampleTrajectory(self.poseBuffer.poses(), self.poseBuffer.timestamps(), spacing, mode,
+                                               smoothing, smoothingIterations, maxVelocity, maxAcceleration)
+        self.poseBuffer.assign(poses, timestamps)
+        self.onPosesReplaced()
+        return len(poses)
 
+    def runInBackground(self, name, function, *args, onProgress=None, onFinished=None, **kwargs):
+        """
+        Run function(job, *args, **kwargs) in a worker thread (see JobRunner). The callbacks are called on the main
+        thread, from processBackgroundJobs. Returns the job.
+        """
+        job = self.jobRunner.submit(name, function, *args, onProgress=onProgress, onFinished=onFinished, **kwargs)
+        self._jobTimer.start()
+        return job
+
+    def processBackgroundJobs(self):
+        """
+        Deliver the progress and results of the background jobs. Called by a timer while jobs are running.
+        """
+        self.jobRunner.processEvents()
+        if not self.jobRunner.activeJobs:
+            self._jobTimer.stop()
+
+    def cancelBackgroundJobs(self):
+        self.jobRunner.cancelAll()
+
+    def shutdownBackgroundJobs(self):
+        self._jobTimer.stop()
+        self.jobRunner.shutdown()
+
+    def postProcessTrajectoryInBackground(self, decimation=None, resampling=None, tracedLookupDecimation=None,
+                                          onProgress=None, onFinished=None):
+        """
+        Decimate (keyword arguments of decimatePoses) and/or resample (keyword arguments of resampleTrajectory) the
+        captured poses in a worker thread. The result replaces the captured poses when the job is done, unless poses were
+        captured or modified in the meantime: job.applied tells if it was used. onFinished(job) is called after that.
+        If tracedLookupDecimation is not None, the traced lookups are decimated in the same job with their own decimation
+        settings overridden by tracedLookupDecimation (see decimateTracedLookups), each unless its poses changed meanwhile.
+        """
+        poses, timestamps = snapshotPoses(self.poseBuffer)
+        frames = {}
+        frameVersions = {}
+        if tracedLookupDecimation is not None:
+            for frame in self.frameRecorder.frames[1:]:
+                if len(frame.buffer) > 0:
+                    frames[frame.name] = (*snapshotPoses(frame.buffer), {**frame.decimation, **tracedLookupDecimation})
+                    frameVersions[frame.name] = frame.buffer.version
+
+        def applyResult(job):
+            job.applied = False
+            if job.status == "finished":
+                for name, indices in job.result[3].items():
+                    # Traced lookups that were removed or captured more poses meanwhile are left as they are
+                    if name not in self.frameRecorder.frameNames():
+                        continue
+                    buffer = self.frameRecorder.frame(name).buffer
+                    if buffer.version == frameVersions[name]:
+                        buffer.keep(indices)
+                        self.resetTracedLookupVisualization(name)
+                if self.isPoseBufferSnapshot(timestamps):
+                    self.poseBuffer.assign(*job.result[:2])
+                    self.onPosesReplaced()
+                    job.applied = True
+                else:
+                    job.message = "trajectory changed while processing, result discarded"
+                    print(f"Trajectory changed while processing, {job.name} result discarded")
+                    self.updateVisualization()
+            if onFinished is not None:
+                onFinished(job)
+
+        job = self.runInBackground("process trajectory", postProcessTrajectory, poses, timestamps, decimation=decimation,
+                                   resampling=resampling, frames=frames, onProgress=onProgress, onFinished=applyResult)
+        job.inputCount = len(poses)
+        job.applied = False
+        return job
+
+    def isPoseBufferSnapshot(self, timestamps):
+        """
+        True if the pose buffer still holds the poses a snapshot with these timestamps was taken from.
+        Poses are only appended or replaced as a whole, so the count and the last timestamp are enough to tell.
+        """
+        count = len(self.poseBuffer)
+        return count == len(timestamps) and (count == 0 or self.poseBuffer.timestamps()[-1] == timestamps[-1])
+
+    def SendPoseArrayInBackground(self, publisher=None, onProgress=None, onFinished=None):
+        """
+        Publish the captured poses as a pose array. The transform collection is filled in a worker thread and published
+        on the main thread when the job is done. Background sends reuse packers of their own (not the streaming one, so
+        that streaming can go on meanwhile): a packer is taken from _backgroundPackers when the job is submitted and
+        given back once its collection was published, so a collection waiting to be published is never overwritten.
+        """
+        if publisher is None:
+            publisher = self.getPoseArrayPublisher()
+        poses, _ = snapshotPoses(self.poseBuffer)
+        packer = self._backgroundPackers.pop() if self._backgroundPackers else TransformCollectionPacker()
+
+        def pack(job, poses):
+            job.reportProgress(0.0, f"Packing {len(poses)} poses")
+            return packer.pack(poses)
+
+        def publish(job):
+            try:
+                if job.status == "finished":
+                    with self.profiler.span("publish.send"):
+                        publisher.Publish(job.result)
+                    job.message = f"{len(poses)} poses published"
+                    print('Pose array published')
+            finally:
+                self._backgroundPackers.append(packer)
+            if onFinished is not None:
+                onFinished(job)
+
+        return self.runInBackground("publish trajectory", pack, poses, onProgress=onProgress, onFinished=publish)
+
+    def onPosesReplaced(self):
+        """
+        Called after the content of the pose buffer was modified in place.
+        """
+        self.positionIndex.clear()
+        if self.streamingEnabled:
+            # Only the poses from the first one that changed are streamed again
+            self.trajectoryStreamer.rewind(self.poseBuffer.poses())
+        self.resetVisualization()
+        self.updateVisualization()
+
+    def resetVisualization(self):
+        """
+        Remove the drawn points and poses, so that updateVisualization draws the whole pose buffer again.
+        """
+        if self.trajectoryPoints is not None:
+            self.trajectoryPoints.RemoveAllControlPoints()
+        self.resetTrajectoryPath()
+        self._visualizedCount = 0
+        self.resetPoseGlyphs()
 
     def clearTrajectory(self):
         """
-        Clear the fiducial list, the nodes that have been added for visualization and the transform collection so the
+        Clear the fiducial list, the nodes that have been added for visualization and the pose buffer so the
         user can trace a new path.
         """
-        if self.trajectoryPoints is not None:
-            self.trajectoryPoints.RemoveAllMarkups()
-        self.RemoveTransforms()
-        self.trCollection = vtk.vtkTransformCollection()
+        with self.profiler.span("clear.removeNodes"):
+            # The fiducial list is removed with the other nodes created by this module, unless it was provided by the user
+            if self.trajectoryPoints is not None and not self.isOwnedNode(self.trajectoryPoints):
+                self.trajectoryPoints.RemoveAllMarkups()
+            self.RemoveTransforms()
+        with self.profiler.span("clear.buffers"):
+            self.frameRecorder.clear()  # the shared timestamps and the poses of all the traced lookups
+            self.positionIndex.clear()
+            self._tracedVisualizedCounts = {}
+            self.trajectoryStreamer.reset()
+            self._visualizedCount = 0
+            self.resetTrajectoryPath()
+            self.resetPoseGlyphs()
         print('Trajectory has been cleared')
 
-    def SendPoseArray(self):
+    def getPublisher(self, className, topic):
         """
-        Take the transform collection and publish the trajectory as a pose array.
+        Get the publisher node for a topic, create it if needed. The nodes are cached between calls.
         """
-        ros2Node = slicer.mrmlScene.GetFirstNodeByName("ros2:node:slicer")
-        publisher = slicer.mrmlScene.GetFirstNodeByName('ros2:pub:/slicer_posearray')
+        publisher = self._publishers.get(topic)
+        if publisher is not None and slicer.mrmlScene.IsNodePresent(publisher):
+            return publisher
+        publisher = slicer.mrmlScene.GetFirstNodeByName(f"ros2:pub:{topic}")
         if publisher is None:
-            publisher = ros2Node.CreateAndAddPublisherNode("vtkMRMLROS2PublisherPoseArrayNode", "/slicer_posearray")
-        publisher.Publish(self.trCollection) # Publishes a pose array that consists of each matrix in the path
+            ros2Node = slicer.mrmlScene.GetFirstNodeByName("ros2:node:slicer")
+            if ros2Node is None:
+                raise RuntimeError("ROS 2 node 'ros2:node:slicer' not found, cannot publish the trajectory")
+            publisher = ros2Node.CreateAndAddPublisherNode(className, topic)
+        self._publishers[topic] = publisher
+        return publisher
+
+    def getPoseArrayPublisher(self):
+        return self.getPublisher("vtkMRMLROS2PublisherPoseArrayNode", self.poseArrayTopic)
+
+    def publishTrajectoryChunk(self, poses, sequenceNumber, startIndex, complete):
+        """
+        Publish a chunk of a streamed trajectory. The poses go to <poseArrayTopic>/chunks as a pose array, preceded by
+        a JSON string on <poseArrayTopic>/chunks/info telling where they belong in the trajectory.
+        """
+        info = {"sequence": sequenceNumber, "start": startIndex, "count": len(poses), "complete": complete}
+        infoPublisher, chunkPublisher = self.getStreamingPublishers()
+        infoPublisher.Publish(json.dumps(info))
+        chunkPublisher.Publish(self._transformPacker.pack(poses))
+
+    def getStreamingPublishers(self):
+        """
+        Get the publishers of the streamed chunks (info and poses), create them if needed.
+        Raises RuntimeError if the ROS 2 node is missing.
+        """
+        return (self.getPublisher("vtkMRMLROS2PublisherStringNode", f"{self.poseArrayTopic}/chunks/info"),
+                self.getPublisher("vtkMRMLROS2PublisherPoseArrayNode", f"{self.poseArrayTopic}/chunks"))
+
+    def SendPoseArray(self, poses=None, publisher=None):
+        """
+        Publish the trajectory as a pose array. By default the captured poses are published, any N x 4 x 4 array
+        (for example a view into the pose buffer) can be given instead.
+        """
+        if poses is None:
+            poses = self.poseBuffer.poses()
+        if publisher is None:
+            publisher = self.getPoseArrayPublisher()
+        with self.profiler.span("publish.pack"):
+            transforms = self._transformPacker.pack(poses)
+        with self.profiler.span("publish.send"):
+            publisher.Publish(transforms) # Publishes a pose array that consists of each matrix in the path
         print('Pose array published')
 
     def RemoveTransforms(self):
         """
-        Remove the transform & model nodes from the scene for visualization.
+        Remove the nodes that this module has added to the scene for visualization.
+        Only the nodes registered by registerOwnedNode are removed, in a single batch so that observers are notified once.
         """
-        transforms = slicer.mrmlScene.GetNodesByClass("vtkMRMLLinearTransformNode")
-        for j in range(0, transforms.GetNumberOfItems()):
-            transform = transforms.GetItemAsObject(j)
-            transformName = transform.GetName()
-            if ("LinearTransform" in transformName):
-                slicer.mrmlScene.RemoveNode(transform)
-
-        models = slicer.mrmlScene.GetNodesByName("CoordinateModel")
-        for j in range(0, models.GetNumberOfItems()):
-            model = models.GetItemAsObject(j)
-            slicer.mrmlScene.RemoveNode(model)
+        if not self._ownedNodes:
+            return
+        slicer.mrmlScene.StartState(slicer.vtkMRMLScene.BatchProcessState)
+        try:
+            for node in self._ownedNodes:
+                if slicer.mrmlScene.IsNodePresent(node):
+                    slicer.mrmlScene.RemoveNode(node)
+        finally:
+            slicer.mrmlScene.EndState(slicer.vtkMRMLScene.BatchProcessState)
+        self._ownedNodes = []
+        if self.trajectoryPoints is not None and not slicer.mrmlScene.IsNodePresent(self.trajectoryPoints):
+            self.trajectoryPoints = None
+        self.poseGlyphsNode = None
+        self.pathNode = None
+        self._tracedPoints = {}
 
 
 
@@ -441,6 +1788,30 @@ class RobotTrajectoryGeneratorTest(ScriptedLoadableModuleTest):
         """
         self.setUp()
         self.test_RobotTrajectoryGenerator1()
+        self.setUp()
+        self.test_EventCapture()
+        self.setUp()
+        self.test_MultiLookupTracing()
+        self.setUp()
+        self.test_Recording()
+        self.setUp()
+        self.test_Replay()
+        self.setUp()
+        self.test_WaypointQueries()
+        self.setUp()
+        self.test_Profiling()
+        self.setUp()
+        self.test_PathDisplay()
+        self.setUp()
+        self.test_ClearTrajectory()
+        self.setUp()
+        self.test_BackgroundProcessing()
+        self.setUp()
+        self.test_SendPoseArray()
+        self.setUp()
+        self.test_ParameterNode()
+        self.setUp()
+        self.test_StreamingFailure()
 
     def test_RobotTrajectoryGenerator1(self):
         """ Ideally you should have several levels of tests.  At the lowest level
@@ -452,38 +1823,477 @@ class RobotTrajectoryGeneratorTest(ScriptedLoadableModuleTest):
         developers when their changes will have an impact on the behavior of your
         module.  For example, if a developer removes a feature that you depend on,
         your test should break so they know that the feature is needed.
+        The trajectory processing itself is tested without Slicer by the tests in Testing/Python.
         """
 
         self.delayDisplay("Starting the test")
 
-        # Get/create input data
+        # A linear transform stands in for the ROS 2 lookup, moved by 1 mm per sample along x
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+
+        def moveLookupTo(x):
+            matrix = np.eye(4)
+            matrix[0, 3] = x
+            lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(matrix))
+
+        # Test tracing with the distance threshold
+        for index in range(31):
+            moveLookupTo(index)
+            logic.AddToTrajectory(timestamp=0.01 * index)
+        np.testing.assert_allclose(logic.poseBuffer.poses()[:, 0, 3], [0, 6, 12, 18, 24, 30])
+        logic.updateVisualization()
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), 6)
+
+        # Test recording all samples and decimating afterwards
+        logic.clearTrajectory()
+        logic.recordAllSamples = True
+        for index in range(31):
+            moveLookupTo(index)
+            logic.AddToTrajectory(timestamp=0.01 * index)
+        self.assertEqual(len(logic.poseBuffer), 31)
+        logic.decimateTrajectory(translationTolerance=10.0)
+        np.testing.assert_allclose(logic.poseBuffer.poses()[:, 0, 3], [0, 11, 22])
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), 3)
+
+        self.delayDisplay('Test passed')
+
+    def test_EventCapture(self):
+        """
+        A burst of lookup updates inside the coalescing window is recorded as a single sample.
+        """
+        self.delayDisplay("Starting the event capture test")
+
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+        logic.recordAllSamples = True
+        logic.startEventCapture(coalesceInterval=0.05)
+
+        matrix = np.eye(4)
+        for x in range(5):
+            matrix[0, 3] = x
+            lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(matrix))
+        self.delayDisplay("Waiting for the coalescing window", 200)
+        self.assertEqual(len(logic.poseBuffer), 1)
+        self.assertEqual(logic.poseBuffer.lastPose()[0, 3], 4)
+        self.assertEqual(logic.eventCoalescer.coalescedCount, 4)
+
+        # Nothing is recorded while the lookup does not move, and after capture is stopped
+        self.delayDisplay("Waiting without updates", 100)
+        logic.stopEventCapture()
+        lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(np.eye(4)))
+        self.delayDisplay("Waiting after stop", 100)
+        self.assertEqual(len(logic.poseBuffer), 1)
+
+        self.delayDisplay('Test passed')
+
+    def test_MultiLookupTracing(self):
+        """
+        Lookups traced together are sampled in the same pass, each with its own threshold.
+        """
+        self.delayDisplay("Starting the multi-lookup tracing test")
+
+        tip = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Tip")
+        wrist = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Wrist")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(tip)
+        logic.recordAllSamples = True
+        logic.addTracedLookup(wrist, distanceThreshold=2.5, decimation={"translationTolerance": 5.0})
+
+        for index in range(11):
+            for lookup, x in ((tip, index), (wrist, 10 * index)):
+                matrix = np.eye(4)
+                matrix[0, 3] = x
+                lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(matrix))
+            logic.AddToTrajectory(timestamp=0.01 * index)
+        wristBuffer = logic.getTracedLookupBuffer(wrist)
+        self.assertEqual(len(logic.poseBuffer), 11)
+        self.assertEqual(len(wristBuffer), 11)
+        np.testing.assert_allclose(wristBuffer.timestamps(), logic.poseBuffer.timestamps())
+        np.testing.assert_allclose(logic.frameRecorder.timestamps(), logic.poseBuffer.timestamps())
+
+        logic.updateVisualization()
+        self.assertEqual(slicer.util.getNode("Wrist trajectory").GetNumberOfControlPoints(), 11)
+
+        # Only the traced lookup is decimated by its own settings
+        logic.decimateTracedLookups()
+        self.assertEqual(len(logic.poseBuffer), 11)
+        np.testing.assert_allclose(wristBuffer.poses()[:, 0, 3], np.arange(0, 101, 10))
+        logic.decimateTracedLookups(translationTolerance=25.0)
+        np.testing.assert_allclose(wristBuffer.poses()[:, 0, 3], [0, 30, 60, 90])
+        wristPoints = slicer.util.getNode("Wrist trajectory")
+        np.testing.assert_allclose(slicer.util.arrayFromMarkupsControlPoints(wristPoints, world=True)[:, 0], [0, 30, 60, 90])
+        for index in range(11, 14):
+            matrix = np.eye(4)
+            matrix[0, 3] = 10 * index
+            wrist.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(matrix))
+            logic.AddToTrajectory(timestamp=0.01 * index)
+        logic.updateVisualization()
+        np.testing.assert_allclose(slicer.util.arrayFromMarkupsControlPoints(wristPoints, world=True)[:, 0],
+                                   [0, 30, 60, 90, 110, 120, 130])
+
+        logic.clearTrajectory()
+        self.assertEqual(len(wristBuffer), 0)
+        self.assertEqual(logic.frameRecorder.tickCount, 0)
+
+        # Traced lookups are sampled without an observed lookup too
+        logic.setObservedLookup(None)
+        self.assertFalse(logic.AddToTrajectory())
+        self.assertEqual(len(wristBuffer), 1)
+        self.assertEqual(len(logic.poseBuffer), 0)
+
+        self.delayDisplay('Test passed')
+
+    def test_Recording(self):
+        """
+        Poses recorded while tracing can be loaded back, with their orientation, after the trajectory was cleared.
+        """
+        self.delayDisplay("Starting the recording test")
+
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+        recordingPath = os.path.join(slicer.app.temporaryPath, "RobotTrajectoryGeneratorTest.rtg")
+        logic.startRecording(recordingPath, append=False)
+        for index in range(10):
+            transform = vtk.vtkTransform()
+            transform.Translate(10 * index, 0, 0)
+            transform.RotateZ(9 * index)
+            lookup.SetMatrixTransformToParent(transform.GetMatrix())
+            logic.AddToTrajectory(timestamp=0.1 * index)
+        logic.stopRecording()
+        recordedPoses = logic.poseBuffer.poses().copy()
+
+        logic.clearTrajectory()
+        self.assertEqual(logic.loadTrajectory(recordingPath), 10)
+        np.testing.assert_allclose(logic.poseBuffer.poses(), recordedPoses)
+        np.testing.assert_allclose(logic.poseBuffer.timestamps(), 0.1 * np.arange(10))
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), 10)
+        os.remove(recordingPath)
+
+        self.delayDisplay('Test passed')
+
+    def test_Replay(self):
+        """
+        A replayed trajectory goes through the same capture as the lookup, without a robot or ROS 2.
+        """
+        self.delayDisplay("Starting the replay test")
+
+        logic = RobotTrajectoryGeneratorLogic()
+        poseSource = ReplaySource.fromGenerator("helix", 2000, rate=100)
+        count = logic.replayAsFastAsPossible(poseSource, rateHz=50)
+        expectedBuffer, _ = replayCapture(poseSource, rateHz=50, distanceThreshold=logic.distanceThreshold)
+        self.assertEqual(count, len(expectedBuffer))
+        np.testing.assert_allclose(logic.poseBuffer.poses(), expectedBuffer.poses())
+        np.testing.assert_allclose(logic.poseBuffer.timestamps(), expectedBuffer.timestamps())
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), count)
+
+        # At real time the pose follows the clock
+        logic.clearTrajectory()
+        logic.setPoseSource(poseSource)
+        logic.AddToTrajectory()
+        self.assertEqual(len(logic.poseBuffer), 1)
+        np.testing.assert_allclose(logic.poseBuffer.poses()[0], poseSource.currentPose())
+        logic.setPoseSource(None)
+
+        self.delayDisplay('Test passed')
+
+    def test_WaypointQueries(self):
+        """
+        Nearest waypoint and retrace queries follow the captured poses as they are appended, decimated and cleared.
+        """
+        self.delayDisplay("Starting the waypoint query test")
+
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+
+        def moveLookupTo(x, y=0.0):
+            matrix = np.eye(4)
+            matrix[0, 3] = x
+            matrix[1, 3] = y
+            lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(matrix))
+
+        # Out along x, then back 2 mm to the side
+        for x in range(0, 101, 10):
+            moveLookupTo(x)
+            logic.AddToTrajectory()
+        indices, distances = logic.findNearestWaypoints(k=2)
+        np.testing.assert_array_equal(indices, [10, 9])
+        self.assertEqual(len(logic.findRetracedWaypoints(ignoreLast=2)), 0)
+        for x in range(95, 40, -10):
+            moveLookupTo(x, 2.0)
+            logic.AddToTrajectory()
+        retraced = logic.findRetracedWaypoints(radius=6.0, ignoreLast=2)
+        np.testing.assert_array_equal(np.sort(retraced), [4, 5])
+        np.testing.assert_array_equal(logic.findWaypointsWithinRadius(1.0, [30.0, 0.0, 0.0])[0], [3])
+
+        logic.decimateTrajectory(translationTolerance=15.0)
+        self.assertEqual(len(logic.getPositionIndex()), len(logic.poseBuffer))
+        logic.clearTrajectory()
+        self.assertEqual(len(logic.findNearestWaypoints()[0]), 0)
+
+        self.delayDisplay('Test passed')
+
+    def test_Profiling(self):
+        """
+        The stages are timed only while the profiler is enabled.
+        """
+        self.delayDisplay("Starting the profiling test")
+
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+        logic.AddToTrajectory()
+        self.assertEqual(logic.profiler.summary(), {})
+
+        logic.profiler.enabled = True
+        for index in range(20):
+            logic.AddToTrajectory()
+        logic.updateVisualization()
+        logic.SendPoseArray(publisher=LocalPoseArrayPublisher())
+        logic.clearTrajectory()
+        summary = logic.profiler.summary()
+        for stage in ("capture.read", "capture.store", "visualization.markups", "visualization.glyphs",
+                      "publish.pack", "publish.send", "clear.removeNodes", "clear.buffers"):
+            self.assertIn(stage, summary)
+        self.assertEqual(summary["capture.read"]["count"], 20)
+        self.assertEqual(len(logic.profiler.traceEvents()), sum(stage["count"] for stage in summary.values()))
+
+        self.delayDisplay('Test passed')
 
-        import SampleData
-        registerSampleData()
-        inputVolume = SampleData.downloadSample('RobotTrajectoryGenerator1')
-        self.delayDisplay('Loaded test data set')
+    def test_PathDisplay(self):
+        """
+        Captured points are added in batches, to the fiducial list or to the polyline model.
+        """
+        self.delayDisplay("Starting the path display test")
 
-        inputScalarRange = inputVolume.GetImageData().GetScalarRange()
-        self.assertEqual(inputScalarRange[0], 0)
-        self.assertEqual(inputScalarRange[1], 695)
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+
+        def addPoses(start, stop):
+            for index in range(start, stop):
+                lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(np.array(
+                    [[1, 0, 0, 10 * index], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=float)))
+                logic.AddToTrajectory()
+
+        addPoses(0, 30)
+        logic.updateVisualization()
+        addPoses(30, 40)
+        logic.updateVisualization()
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), 40)
+        np.testing.assert_allclose(slicer.util.arrayFromMarkupsControlPoints(logic.trajectoryPoints, world=True)[:, 0],
+                                   10 * np.arange(40))
+
+        logic.setPathDisplayMode("polyline")
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), 0)
+        pathPolyData = logic.pathNode.GetPolyData()
+        self.assertEqual(pathPolyData.GetNumberOfPoints(), 40)
+        self.assertEqual(pathPolyData.GetNumberOfLines(), 1)
+        addPoses(40, 45)
+        logic.updateVisualization()
+        self.assertEqual(pathPolyData.GetNumberOfPoints(), 45)
+        self.assertEqual(pathPolyData.GetCell(0).GetNumberOfPoints(), 45)
+
+        logic.setPathDisplayMode("fiducials")
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), 45)
+        self.assertFalse(logic.pathNode.GetDisplayVisibility())
+        with self.assertRaises(ValueError):
+            logic.setPathDisplayMode("spline")
+
+        self.delayDisplay('Test passed')
 
-        outputVolume = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
-        threshold = 100
+    def test_ClearTrajectory(self):
+        """ Clearing the trajectory removes the nodes created by the logic and leaves the other nodes alone.
+        """
+        userTransform = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "LinearTransform")
+        userModel = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode", "CoordinateModel")
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
 
-        # Test the module logic
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+        for index in range(20):
+            lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(np.array(
+                [[1, 0, 0, 10 * index], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=float)))
+            logic.AddToTrajectory()
+        logic.updateVisualization()
+        self.assertEqual(len(logic.poseBuffer), 20)
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), 20)
+        ownedNodes = list(logic._ownedNodes)
+        self.assertTrue(ownedNodes)
+
+        logic.clearTrajectory()
+        self.assertEqual(len(logic.poseBuffer), 0)
+        for node in ownedNodes:
+            self.assertFalse(slicer.mrmlScene.IsNodePresent(node))
+        for node in [userTransform, userModel, lookup]:
+            self.assertTrue(slicer.mrmlScene.IsNodePresent(node))
+
+        # A "Trajectory" node of another module is not written into, one left by an earlier logic is adopted and removed
+        userPoints = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsFiducialNode", "Trajectory")
+        earlierLogic = RobotTrajectoryGeneratorLogic()
+        earlierLogic.createTrajectoryFiducials()
+        earlierPoints = earlierLogic.trajectoryPoints
+        self.assertIsNot(earlierPoints, userPoints)
+        logic = RobotTrajectoryGeneratorLogic()
+        self.assertIs(logic.trajectoryPoints, earlierPoints)
+        self.assertIn(earlierPoints, logic._ownedNodes)
+        logic.clearTrajectory()
+        self.assertFalse(slicer.mrmlScene.IsNodePresent(earlierPoints))
+        self.assertTrue(slicer.mrmlScene.IsNodePresent(userPoints))
+        self.assertEqual(userPoints.GetNumberOfControlPoints(), 0)
+
+    def test_BackgroundProcessing(self):
+        """
+        Post-processing and publishing jobs run on a snapshot of the poses, their results are applied on the main thread.
+        """
+        self.delayDisplay("Starting the background processing test")
 
         logic = RobotTrajectoryGeneratorLogic()
+        poses, timestamps = helixTrajectory(20000)
+        logic.poseBuffer.assign(poses, timestamps)
+        wrist = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Wrist")
+        logic.addTracedLookup(wrist, decimation={"translationTolerance": 10.0})
+        wristBuffer = logic.getTracedLookupBuffer(wrist)
+        wristBuffer.assign(poses, timestamps)
+
+        def waitFor(job):
+            self.assertTrue(job.wait(60.0))
+            logic.processBackgroundJobs()
+
+        # The traced lookup is decimated in the same job, with its own settings
+        finished = []
+        job = logic.postProcessTrajectoryInBackground(decimation={"translationTolerance": 2.0},
+                                                      resampling={"spacing": 5.0}, tracedLookupDecimation={},
+                                                      onFinished=finished.append)
+        waitFor(job)
+        self.assertEqual(finished, [job])
+        self.assertTrue(job.applied)
+        self.assertEqual(len(logic.poseBuffer), len(job.result[0]))
+        self.assertEqual(logic.trajectoryPoints.GetNumberOfControlPoints(), len(logic.poseBuffer))
+        np.testing.assert_allclose(wristBuffer.poses(), poses[decimatePoses(poses, timestamps, translationTolerance=10.0)])
+        self.assertEqual(slicer.util.getNode("Wrist trajectory").GetNumberOfControlPoints(), len(wristBuffer))
+
+        # A result computed on poses that changed meanwhile is not used
+        count = len(logic.poseBuffer)
+        job = logic.postProcessTrajectoryInBackground(decimation={"translationTolerance": 50.0})
+        logic.poseBuffer.append(np.eye(4), timestamps[-1] + 1.0)
+        waitFor(job)
+        self.assertFalse(job.applied)
+        self.assertEqual(len(logic.poseBuffer), count + 1)
+
+        # Two sends in flight pack into two packers, which are reused by the following sends
+        publisher = LocalPoseArrayPublisher()
+        jobs = [logic.SendPoseArrayInBackground(publisher=publisher) for _ in range(2)]
+        for job in jobs:
+            self.assertTrue(job.wait(60.0))
+        self.assertIsNot(jobs[0].result, jobs[1].result)
+        logic.processBackgroundJobs()
+        self.assertEqual(publisher.publishedPoseCount, 2 * (count + 1))
+        packers = list(logic._backgroundPackers)
+        self.assertEqual(len(packers), 2)
+        job = logic.SendPoseArrayInBackground(publisher=publisher)
+        waitFor(job)
+        self.assertIn(job.result, [packer.collection for packer in packers])
+        self.assertEqual(len(logic._backgroundPackers), 2)
+        self.assertEqual(logic.jobRunner.activeJobs, [])
 
-        # Test algorithm with non-inverted threshold
-        logic.process(inputVolume, outputVolume, threshold, True)
-        outputScalarRange = outputVolume.GetImageData().GetScalarRange()
-        self.assertEqual(outputScalarRange[0], inputScalarRange[0])
-        self.assertEqual(outputScalarRange[1], threshold)
-
-        # Test algorithm with inverted threshold
-        logic.process(inputVolume, outputVolume, threshold, False)
-        outputScalarRange = outputVolume.GetImageData().GetScalarRange()
-        self.assertEqual(outputScalarRange[0], inputScalarRange[0])
-        self.assertEqual(outputScalarRange[1], inputScalarRange[1])
+        self.delayDisplay('Test passed')
+
+    def test_SendPoseArray(self):
+        """ The packed transform collection matches the poses, also when it is reused for a shorter path.
+        """
+        poses = np.tile(np.eye(4), (50, 1, 1))
+        poses[:, :3, 3] = np.arange(150).reshape(50, 3)
+
+        logic = RobotTrajectoryGeneratorLogic()
+        publisher = LocalPoseArrayPublisher()
+        logic.SendPoseArray(poses, publisher)
+        self.assertEqual(publisher.lastMessage.GetNumberOfItems(), 50)
+        matrix = vtk.vtkMatrix4x4()
+        publisher.lastMessage.GetItemAsObject(49).GetMatrix(matrix)
+        np.testing.assert_allclose(slicer.util.arrayFromVTKMatrix(matrix), poses[49])
+
+        logic.SendPoseArray(poses[:10], publisher)
+        self.assertEqual(publisher.lastMessage.GetNumberOfItems(), 10)
+        self.assertEqual(publisher.publishedPoseCount, 60)
+
+        results = benchmarkSendPoseArray(sizes=(100, 1000), repeats=2)
+        self.assertEqual([result["poses"] for result in results], [100, 1000])
+
+    def test_ParameterNode(self):
+        """
+        Settings are stored in the parameter node and a changed threshold is used from the next sample on.
+        """
+        self.delayDisplay("Starting the parameter node test")
+
+        logic = RobotTrajectoryGeneratorLogic()
+        parameterNode = logic.getParameterNode()
+        parameterNode.SetParameter("PoseArrayTopic", "/robot/path")
+        logic.setDefaultParameters(parameterNode)
+        self.assertEqual(parameterNode.GetParameter("PoseArrayTopic"), "/robot/path")  # set values are kept
+        self.assertEqual(parameterNode.GetParameter("SamplingRate"), "50.0")
+        logic.updateFromParameterNode(parameterNode)
+        self.assertEqual(logic.poseArrayTopic, "/robot/path")
+        self.assertEqual(logic.distanceThreshold, 5.0)
+
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic.setObservedLookup(lookup)
+
+        def moveLookupTo(x):
+            matrix = np.eye(4)
+            matrix[0, 3] = x
+            lookup.SetMatrixTransformToParent(slicer.util.vtkMatrixFromArray(matrix))
+
+        moveLookupTo(0.0)
+        self.assertTrue(logic.AddToTrajectory())
+        moveLookupTo(3.0)
+        self.assertFalse(logic.AddToTrajectory())
+        poseBuffer, capacity = logic.poseBuffer, logic.poseBuffer.capacity
+        parameterNode.SetParameter("DistanceThreshold", "2.0")
+        logic.updateFromParameterNode(parameterNode, ["DistanceThreshold"])
+        self.assertTrue(logic.AddToTrajectory())
+        self.assertIs(logic.poseBuffer, poseBuffer)
+        self.assertEqual(logic.poseBuffer.capacity, capacity)
+        self.assertEqual(len(logic.poseBuffer), 2)
+
+        # Invalid values from a hand-edited or older scene fall back to the defaults or are clamped
+        parameterNode.SetParameter("SamplingRate", "0")
+        self.assertEqual(logic.numericParameter(parameterNode, "SamplingRate", positive=True), 50.0)
+        parameterNode.SetParameter("SamplingRate", "fast")
+        self.assertEqual(logic.numericParameter(parameterNode, "SamplingRate", positive=True), 50.0)
+        parameterNode.SetParameter("TraceDuration", "-3")
+        self.assertEqual(logic.numericParameter(parameterNode, "TraceDuration"), 0.0)
+        parameterNode.SetParameter("DistanceThreshold", "")
+        parameterNode.SetParameter("ChunkSize", "0")
+        logic.updateFromParameterNode(parameterNode, ["DistanceThreshold", "ChunkSize"])
+        self.assertEqual(logic.distanceThreshold, 5.0)
+        self.assertEqual(logic.trajectoryStreamer.chunkSize, 50)
+
+        self.delayDisplay('Test passed')
+
+    def test_StreamingFailure(self):
+        """
+        A failure to publish a chunk turns streaming off, so that it is reported once and capture goes on.
+        """
+        self.delayDisplay("Starting the streaming failure test")
+
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.streamingEnabled = True
+        logic.trajectoryStreamer.chunkSize = 1
+
+        def failingSendChunk(poses, sequenceNumber, startIndex, complete):
+            raise RuntimeError("ROS 2 node 'ros2:node:slicer' not found, cannot publish the trajectory")
+
+        logic.trajectoryStreamer.sendChunk = failingSendChunk
+        logic.poseBuffer.append(np.eye(4), 0.0)
+        with self.assertRaises(RuntimeError):
+            logic.updateStreaming()
+        self.assertFalse(logic.streamingEnabled)
+        logic.poseBuffer.append(np.eye(4), 1.0)
+        logic.updateStreaming()  # does not raise again
 
         self.delayDisplay('Test passed')
@@ -0,0 +1,51 @@
+"""
+Trajectory processing used by the RobotTrajectoryGenerator module.
+Only NumPy is required, VTK is imported when a transform collection is built for publishing,
+so everything else can be used and tested outside of Slicer.
+"""
+
+from .capture import EventCoalescer
+from .decimation import decimatePoses
+from .geometry import (
+    quaternionAngles,
+    quaternionsToRotationMatrices,
+    rotationMatricesToQuaternions,
+    slerpQuaternions,
+)
+from .jobs import BackgroundJob, JobCancelled, JobRunner, postProcessTrajectory, snapshotPoses
+from .multiFrame import MultiFrameRecorder, TracedFrame
+from .poseBuffer import PoseBuffer
+from .profiling import Profiler
+from .publishing import (
+    LocalPoseArrayPublisher,
+    TransformCollectionPacker,
+    benchmarkSendPoseArray,
+    buildTransformCollection,
+)
+from .recording import (
+    POSE_STAMPED_DTYPE,
+    TrajectoryRecording,
+    TrajectoryRecordingWriter,
+    exportCsv,
+    importCsv,
+    posesFromPoseStamped,
+    posesToPoseStamped,
+    readRosbag,
+    writeRecording,
+    writeRosbag,
+)
+from .replay import ReplaySource, replayCapture, sweepReplayCapture
+from .resampling import resampleTrajectory, smoothPositions
+from .sampling import SamplingSchedule
+from .serialization import (
+    loadTrajectory,
+    posesFromPositionsAndQuaternions,
+    posesToPositionsAndQuaternions,
+    saveTrajectory,
+    trajectoryFromDict,
+    trajectoryToDict,
+)
+from .sources import helixTrajectory, randomWalkTrajectory, syntheticTrajectory
+from .spatialIndex import PositionIndex
+from .stats import trajectoryStatistics
+from .streaming import TrajectoryStreamer
@@ -0,0 +1,137 @@
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+from .decimation import decimatePoses
+from .multiFrame import MultiFrameRecorder
+from .resampling import resampleTrajectory
+from .sources import syntheticTrajectory
+
+
+def summarizeLatencies(latencies, peakMemory=None):
+    """
+    Summary of a list of durations (in seconds): count, mean, p50, p99 and max, in milliseconds.
+    """
+    latencies = 1000.0 * np.asarray(latencies, dtype=float)
+    summary = {
+        "count": int(len(latencies)),
+        "mean": float(latencies.mean()),
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "max": float(latencies.max()),
+    }
+    if peakMemory is not None:
+        summary["peakMemory"] = int(peakMemory)
+    return summary
+
+
+def timeCalls(function, repeats, setup=None):
+    """
+    Call function `repeats` times and return the duration of each call (in seconds) and the peak memory allocated by
+    Python during one more call (in bytes). Memory is traced in a separate call because tracing slows down allocations.
+    setup, if given, is called before each call and is not measured.
+    """
+    latencies = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        startTime = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - startTime)
+    if setup is not None:
+        setup()
+    return latencies, peakMemoryOf(function)
+
+
+def peakMemoryOf(function):
+    """
+    Peak memory (in bytes) allocated by Python while calling function.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmarkCapture(poses, timestamps, distanceThreshold=5.0, frameCount=1):
+    """
+    Per-tick latency of storing captured poses with the live distance threshold, through MultiFrameRecorder.append
+    like AddToTrajectory, with frameCount traced frames all following the poses.
+    """
+    framePoses = np.tile(np.eye(4), (frameCount, 1, 1))
+
+    def newRecorder():
+        recorder = MultiFrameRecorder()
+        for index in range(frameCount):
+            recorder.addFrame(f"frame{index}", distanceThreshold=distanceThreshold)
+        return recorder
+
+    def capture(recorder, latencies=None):
+        for index in range(len(poses)):
+            startTime = time.perf_counter()
+            framePoses[:] = poses[index]
+            recorder.append(framePoses, timestamps[index])
+            if latencies is not None:
+                latencies[index] = time.perf_counter() - startTime
+
+    latencies = np.zeros(len(poses))
+    capture(newRecorder(), latencies)
+    return summarizeLatencies(latencies, peakMemoryOf(lambda: capture(newRecorder())))
+
+
+def runCoreBenchmarks(source="helix", sizes=(1000, 10000, 50000), repeats=5):
+    """
+    Benchmarks of the Slicer-independent processing on a trajectory from syntheticTrajectory.
+    Returns a dictionary of latency summaries by benchmark name.
+    """
+    results = {}
+    poses, timestamps = syntheticTrajectory(source, max(sizes))
+    results["capture.tick"] = benchmarkCapture(poses, timestamps)
+    results["capture.tick.3frames"] = benchmarkCapture(poses, timestamps, frameCount=3)
+    for size in sizes:
+        for method in ("threshold", "rdp"):
+            results[f"decimation.{method}.{size}"] = summarizeLatencies(*timeCalls(
+                lambda: decimatePoses(poses[:size], timestamps[:size], 5.0, 5.0, method=method), repeats))
+        results[f"resampling.arclength.{size}"] = summarizeLatencies(*timeCalls(
+            lambda: resampleTrajectory(poses[:size], timestamps[:size], 1.0, smoothing="cubic"), repeats))
+    return results
+
+
+def findRegressions(results, baseline, maxRatio=1.5, metric="p50"):
+    """
+    Compare benchmark results with baseline results and return the benchmarks whose metric grew by more than maxRatio,
+    as a list of (name, baseline value, new value). Benchmarks missing from either side are ignored.
+    """
+    regressions = []
+    for name, summary in results.items():
+        reference = baseline.get(name)
+        if reference is None or metric not in summary or metric not in reference:
+            continue
+        if reference[metric] > 0 and summary[metric] / reference[metric] > maxRatio:
+            regressions.append((name, reference[metric], summary[metric]))
+    return regressions
+
+
+def saveResults(path, results, **metadata):
+    """
+    Save benchmark results to a JSON file, along with a description of the machine and any given metadata.
+    """
+    metadata.update({"time": time.time(), "python": platform.python_version(), "machine": platform.platform()})
+    with open(path, "w") as file:
+        json.dump({"metadata": metadata, "benchmarks": results}, file, indent=2)
+
+
+def loadResults(path):
+    with open(path) as file:
+        return json.load(file)["benchmarks"]
+
+
+def printResults(results):
+    for name, summary in results.items():
+        memory = f", peak {summary['peakMemory'] / 1024:.0f} kB" if "peakMemory" in summary else ""
+        print(f"{name}: p50 {summary['p50']:.3f} ms, p99 {summary['p99']:.3f} ms{memory}")
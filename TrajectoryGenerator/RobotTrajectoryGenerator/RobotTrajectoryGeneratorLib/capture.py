@@ -0,0 +1,50 @@
+class EventCoalescer:
+    """
+    Turns bursts of "pose changed" events into single samples.
+    The first event of a burst schedules a sample coalesceInterval seconds later, the events arriving until the sample is
+    taken are merged into it. With maxRate (Hz), two samples are also at least 1 / maxRate seconds apart.
+    """
+
+    def __init__(self, coalesceInterval=0.016, maxRate=None):
+        self.coalesceInterval = coalesceInterval
+        self.maxRate = maxRate
+        self.reset()
+
+    def reset(self):
+        self.eventCount = 0
+        self.sampleCount = 0
+        self._pending = False
+        self._lastSampleTime = None
+
+    @property
+    def isPending(self):
+        return self._pending
+
+    @property
+    def coalescedCount(self):
+        """
+        Number of events that did not result in a sample of their own.
+        """
+        return self.eventCount - self.sampleCount - (1 if self._pending else 0)
+
+    def onEvent(self, now):
+        """
+        Record an event. Returns the delay (in seconds) after which a sample should be taken,
+        or None if a sample is already scheduled.
+        """
+        self.eventCount += 1
+        if self._pending:
+            return None
+        self._pending = True
+        sampleTime = now + self.coalesceInterval
+        if self.maxRate and self._lastSampleTime is not None:
+            sampleTime = max(sampleTime, self._lastSampleTime + 1.0 / self.maxRate)
+        return sampleTime - now
+
+    def onSampled(self, now):
+        """
+        Record that the scheduled sample was taken.
+        """
+        self._pending = False
+        self._lastSampleTime = now
+        self.sampleCount += 1
@@ -0,0 +1,199 @@
+import numpy as np
+
+from .geometry import quaternionAngles, rotationMatricesToQuaternions, slerpQuaternions
+
+
+def decimatePoses(poses, timestamps=None, translationTolerance=5.0, rotationTolerance=None,
+                  minTimeGap=None, maxTimeGap=None, method="threshold", keepLast=False, progress=None):
+    """
+    Select the poses to keep from a densely captured trajectory and return their indices (sorted, int array).
+
+    poses: N x 4 x 4 array, timestamps: N array (in seconds, required for the time gaps).
+    translationTolerance: in mm, rotationTolerance: geodesic angle in degrees. None disables a criterion.
+    minTimeGap, maxTimeGap: in seconds, kept poses are at least minTimeGap apart and a pose is kept
+    at least every maxTimeGap even if the lookup did not move.
+
+    method "threshold": a pose is kept when it moved more than a tolerance away from the previously kept pose
+    (same rule as the live distance threshold, extended to orientation and time).
+    method "rdp": Ramer-Douglas-Peucker in SE(3), a pose is kept when the trajectory deviates by more than a tolerance
+    from the straight line and slerp between the surrounding kept poses. The first and last poses are always kept.
+
+    progress: optional function called with the fraction of the poses processed (0 to 1) every few thousand poses.
+    An exception it raises (to cancel a background job) stops the decimation.
+    """
+    poses = np.asarray(poses, dtype=float)
+    count = len(poses)
+    if count == 0:
+        return np.zeros(0, dtype=int)
+    if timestamps is None:
+        if minTimeGap or maxTimeGap:
+            raise ValueError("Timestamps are needed to decimate with a minimum or maximum time gap")
+    else:
+        timestamps = np.asarray(timestamps, dtype=float)
+        if len(timestamps) != count:
+            raise ValueError("There must be one timestamp per pose")
+
+    positions = poses[:, :3, 3]
+    quaternions = rotationMatricesToQuaternions(poses[:, :3, :3]) if rotationTolerance is not None else None
+
+    if method == "threshold":
+        indices = _decimateByThreshold(positions, quaternions, timestamps,
+                                       translationTolerance, rotationTolerance, minTimeGap, maxTimeGap, progress)
+        if keepLast and indices[-1] != count - 1:
+            indices = np.append(indices, count - 1)
+        return indices
+    elif method == "rdp":
+        indices = _decimateByRamerDouglasPeucker(positions, quaternions, timestamps,
+                                                 translationTolerance, rotationTolerance, maxTimeGap, progress)
+        if minTimeGap:
+            indices = _enforceMinimumTimeGap(indices, timestamps, minTimeGap)
+        return indices
+    raise ValueError(f"Unknown decimation method: {method}")
+
+
+# Number of poses processed between two progress reports
+_PROGRESS_INTERVAL = 4096
+
+
+def _decimateByThreshold(positions, quaternions, timestamps, translationTolerance, rotationTolerance,
+                         minTimeGap, maxTimeGap, progress=None, window=32):
+    count = len(positions)
+    if count < 2:
+        return np.zeros(count, dtype=int)
+    # Compare squared distances and quaternion dot products, cheaper than distances and angles
+    squaredTolerance = translationTolerance ** 2 if translationTolerance is not None else None
+    cosineTolerance = np.cos(np.radians(rotationTolerance) / 2.0) if rotationTolerance is not None else None
+
+    def keepMask(references, candidates):
+        # True where the candidate pose is far enough from the reference pose (broadcastable index arrays)
+        shape = np.broadcast(references, candidates).shape
+        if translationTolerance is None and rotationTolerance is None:
+            keep = np.ones(shape, dtype=bool)
+        else:
+            keep = np.zeros(shape, dtype=bool)
+        if translationTolerance is not None:
+            offsets = positions[candidates] - positions[references]
+            keep |= np.einsum("...i,...i->...", offsets, offsets) > squaredTolerance
+        if rotationTolerance is not None:
+            keep |= np.abs(np.einsum("...i,...i->...", quaternions[candidates], quaternions[references])) < cosineTolerance
+        if maxTimeGap:
+            keep |= timestamps[candidates] - timestamps[references] >= maxTimeGap
+        if minTimeGap:
+            keep &= timestamps[candidates] - timestamps[references] >= minTimeGap
+        return keep
+
+    # Typical number of samples between two kept poses, from the median motion per sample
+    gaps = [np.inf]
+    if translationTolerance is not None:
+        steps = np.diff(positions, axis=0)
+        gaps.append(translationTolerance / max(np.sqrt(np.median(np.einsum("ij,ij->i", steps, steps))), 1e-12))
+    if rotationTolerance is not None:
+        steps = np.degrees(2.0 * np.arccos(np.clip(np.abs(np.einsum("ij,ij->i", quaternions[1:], quaternions[:-1])), 0, 1)))
+        gaps.append(rotationTolerance / max(np.median(steps), 1e-12))
+    if maxTimeGap:
+        gaps.append(maxTimeGap / max(np.median(np.diff(timestamps)), 1e-12))
+    expectedGap = min(gaps)
+
+    # When kept poses are close to each other, find for every pose at once the pose that would be kept after it
+    # if it was kept, looking at most `window` poses ahead. Each step tests the poses whose next pose is not found yet
+    # against the pose `step` samples later.
+    nextIndices = np.full(count, -1)
+    if expectedGap > window / 2:
+        window = 0
+    pending = np.arange(count - 1)
+    for step in range(1, window + 1):
+        pending = pending[pending + step < count]
+        if pending.size == 0:
+            break
+        keep = keepMask(pending, pending + step)
+        nextIndices[pending[keep]] = pending[keep] + step
+        pending = pending[~keep]
+
+    # Follow the chain of kept poses from the first one. When the next pose is further than the window,
+    # search the following poses by growing blocks.
+    kept = [0]
+    last = 0
+    initialBlockSize = int(min(max(64, 2 * expectedGap), count))
+    nextReport = _PROGRESS_INTERVAL
+    while True:
+        if progress is not None and last >= nextReport:
+            progress(last / count)
+            nextReport = last + _PROGRESS_INTERVAL
+        nextIndex = nextIndices[last]
+        start = last + window + 1
+        blockSize = initialBlockSize
+        while nextIndex < 0 and start < count:
+            stop = min(count, start + blockSize)
+            hits = np.flatnonzero(keepMask(last, np.arange(start, stop)))
+            if hits.size:
+                nextIndex = start + hits[0]
+            start = stop
+            blockSize *= 2
+        if nextIndex < 0:
+            break
+        kept.append(nextIndex)
+        last = nextIndex
+    return np.array(kept, dtype=int)
+
+
+def _decimateByRamerDouglasPeucker(positions, quaternions, timestamps, translationTolerance, rotationTolerance,
+                                   maxTimeGap, progress=None):
+    count = len(positions)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, count - 1)]
+    # Poses in the segments found within tolerance (the progress) and poses compared so far (when to report it)
+    done = 0
+    compared = 0
+    nextReport = _PROGRESS_INTERVAL
+    while segments:
+        if progress is not None and compared >= nextReport:
+            progress(done / count)
+            nextReport = compared + _PROGRESS_INTERVAL
+        first, last = segments.pop()
+        compared += last - first
+        if last - first < 2:
+            done += last - first
+            continue
+        interior = slice(first + 1, last)
+
+        # Interpolation parameter of the interior poses along the segment (time if available, index otherwise)
+        if timestamps is not None and timestamps[last] > timestamps[first]:
+            fractions = (timestamps[interior] - timestamps[first]) / (timestamps[last] - timestamps[first])
+        else:
+            fractions = np.arange(1, last - first) / (last - first)
+
+        error = np.zeros(last - first - 1)
+        if translationTolerance is not None:
+            # Distance to the straight line segment between the two kept positions
+            direction = positions[last] - positions[first]
+            lengthSquared = np.dot(direction, direction)
+            offsets = positions[interior] - positions[first]
+            along = np.clip(offsets @ direction / lengthSquared, 0.0, 1.0) if lengthSquared > 0 else np.zeros(len(error))
+            distances = np.linalg.norm(offsets - along[:, None] * direction, axis=1)
+            error = np.maximum(error, distances / translationTolerance)
+        if rotationTolerance is not None:
+            interpolated = slerpQuaternions(quaternions[first], quaternions[last], fractions)
+            error = np.maximum(error, quaternionAngles(quaternions[interior], interpolated) / rotationTolerance)
+
+        worst = int(np.argmax(error))
+        if error[worst] > 1.0:
+            split = first + 1 + worst
+        elif maxTimeGap and timestamps[last] - timestamps[first] > maxTimeGap:
+            # Within tolerance but too long: split at the pose closest to the middle of the time interval
+            split = first + 1 + int(np.argmin(np.abs(fractions - 0.5)))
+        else:
+            done += last - first
+            continue
+        keep[split] = True
+        segments.append((first, split))
+        segments.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def _enforceMinimumTimeGap(indices, timestamps, minTimeGap):
+    kept = [indices[0]]
+    for index in indices[1:]:
+        if timestamps[index] - timestamps[kept[-1]] >= minTimeGap:
+            kept.append(index)
+    return np.array(kept, dtype=int)
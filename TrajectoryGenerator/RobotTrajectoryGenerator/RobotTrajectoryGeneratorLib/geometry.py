@@ -0,0 +1,70 @@
+import numpy as np
+
+
+def rotationMatricesToQuaternions(rotations):
+    """
+    Convert an array of rotation matrices (N x 3 x 3) to unit quaternions (N x 4, w x y z).
+    All the matrices are converted at once, each one using the numerically best of the four formulas (Shepperd's method).
+    """
+    rotations = np.asarray(rotations, dtype=float)
+    m00, m11, m22 = rotations[..., 0, 0], rotations[..., 1, 1], rotations[..., 2, 2]
+    # 4 * w^2, 4 * x^2, 4 * y^2, 4 * z^2
+    squares = np.stack([1.0 + m00 + m11 + m22, 1.0 + m00 - m11 - m22, 1.0 - m00 + m11 - m22, 1.0 - m00 - m11 + m22], axis=-1)
+    largest = np.argmax(squares, axis=-1)
+    scale = 2.0 * np.sqrt(np.maximum(np.take_along_axis(squares, largest[..., None], axis=-1)[..., 0], 1e-12))
+
+    zy = rotations[..., 2, 1] - rotations[..., 1, 2]
+    xz = rotations[..., 0, 2] - rotations[..., 2, 0]
+    yx = rotations[..., 1, 0] - rotations[..., 0, 1]
+    xy = rotations[..., 0, 1] + rotations[..., 1, 0]
+    xz2 = rotations[..., 0, 2] + rotations[..., 2, 0]
+    yz = rotations[..., 1, 2] + rotations[..., 2, 1]
+    candidates = np.stack([
+        np.stack([0.25 * scale, zy / scale, xz / scale, yx / scale], axis=-1),
+        np.stack([zy / scale, 0.25 * scale, xy / scale, xz2 / scale], axis=-1),
+        np.stack([xz / scale, xy / scale, 0.25 * scale, yz / scale], axis=-1),
+        np.stack([yx / scale, xz2 / scale, yz / scale, 0.25 * scale], axis=-1),
+    ], axis=-2)
+    quaternions = np.take_along_axis(candidates, largest[..., None, None], axis=-2)[..., 0, :]
+    # Use the w >= 0 hemisphere so that the same rotation always gives the same quaternion
+    quaternions *= np.where(quaternions[..., :1] < 0, -1.0, 1.0)
+    return quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+
+
+def quaternionAngles(quaternions, reference):
+    """
+    Geodesic angle (in degrees) between each quaternion and the reference quaternion(s).
+    """
+    dots = np.abs(np.sum(quaternions * reference, axis=-1))
+    return np.degrees(2.0 * np.arccos(np.clip(dots, 0.0, 1.0)))
+
+
+def slerpQuaternions(start, end, fractions):
+    """
+    Spherical linear interpolation between quaternions, for any broadcastable start, end (... x 4) and fractions (...).
+    """
+    fractions = np.asarray(fractions, dtype=float)[..., None]
+    dots = np.sum(start * end, axis=-1, keepdims=True)
+    # Go the short way around
+    end = np.where(dots < 0, -end, end)
+    dots = np.abs(dots)
+    angles = np.arccos(np.clip(dots, 0.0, 1.0))
+    sinAngles = np.sin(angles)
+    nearlyParallel = sinAngles < 1e-6
+    safeSin = np.where(nearlyParallel, 1.0, sinAngles)
+    startWeights = np.where(nearlyParallel, 1.0 - fractions, np.sin((1.0 - fractions) * angles) / safeSin)
+    endWeights = np.where(nearlyParallel, fractions, np.sin(fractions * angles) / safeSin)
+    quaternions = startWeights * start + endWeights * end
+    return quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+
+
+def quaternionsToRotationMatrices(quaternions):
+    """
+    Convert unit quaternions (N x 4, w x y z) to rotation matrices (N x 3 x 3).
+    """
+    w, x, y, z = np.moveaxis(np.asarray(quaternions, dtype=float), -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+        np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+        np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=-2)
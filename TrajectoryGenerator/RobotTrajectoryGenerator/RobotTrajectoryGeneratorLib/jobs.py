@@ -0,0 +1,212 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .decimation import decimatePoses
+from .resampling import resampleTrajectory
+
+
+class JobCancelled(Exception):
+    """
+    Raised by BackgroundJob.reportProgress in the worker thread when the job was cancelled.
+    """
+
+
+class BackgroundJob:
+    """
+    A function running in a worker thread of a JobRunner. The function is called with the job as first argument and
+    calls job.reportProgress regularly: this is where the progress is published and where the job stops if it was
+    cancelled. status is "pending", "running", "finished", "failed" or "cancelled"; result or error is set once done.
+    """
+
+    def __init__(self, name, function, args, kwargs, onProgress=None, onFinished=None):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.onProgress = onProgress
+        self.onFinished = onFinished
+        self.status = "pending"
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self._cancelRequested = threading.Event()
+        self._done = threading.Event()
+        self._runner = None
+        self._future = None
+
+    @property
+    def isDone(self):
+        return self._done.is_set()
+
+    @property
+    def isCancelRequested(self):
+        return self._cancelRequested.is_set()
+
+    def cancel(self):
+        """
+        Ask the job to stop. A pending job never runs, a running job stops at its next progress report.
+        """
+        self._cancelRequested.set()
+        if self._future is not None and self._future.cancel():
+            self._finish("cancelled")
+
+    def wait(self, timeout=None):
+        """
+        Wait for the job to be done (in the worker). Returns False on timeout.
+        """
+        return self._done.wait(timeout)
+
+    def reportProgress(self, progress, message=None):
+        """
+        Called from the job function: progress between 0 and 1 and an optional message describing the current step.
+        Raises JobCancelled if the job was cancelled.
+        """
+        if self._cancelRequested.is_set():
+            raise JobCancelled()
+        self.progress = progress
+        if message is not None:
+            self.message = message
+        self._runner._post(self, "progress")
+
+    def _run(self):
+        if self._cancelRequested.is_set():
+            self._finish("cancelled")
+            return
+        self.status = "running"
+        try:
+            self.result = self.function(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self._finish("cancelled")
+        except Exception as error:
+            self.error = error
+            self._finish("failed")
+        else:
+            self.progress = 1.0
+            self._finish("finished")
+
+    def _finish(self, status):
+        if self._done.is_set():
+            return
+        self.status = status
+        self._done.set()
+        self._runner._post(self, "finished")
+
+
+class JobRunner:
+    """
+    Runs BackgroundJobs in a thread pool and hands their progress and completion back to the thread that calls
+    processEvents (the Qt main thread in Slicer, from a timer): onProgress(job) and onFinished(job) are only ever
+    called from processEvents, so they can update the MRML scene and the GUI.
+    Jobs should work on copies of the data they process (see snapshotPoses), not on buffers the main thread modifies.
+    """
+
+    def __init__(self, maxWorkers=1):
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="RobotTrajectoryGenerator")
+        self._events = queue.SimpleQueue()
+        self._jobs = []
+
+    def submit(self, name, function, *args, onProgress=None, onFinished=None, **kwargs):
+        """
+        Run function(job, *args, **kwargs) in a worker thread. Returns the job.
+        """
+        job = BackgroundJob(name, function, args, kwargs, onProgress, onFinished)
+        job._runner = self
+        self._jobs.append(job)
+        job._future = self._executor.submit(job._run)
+        return job
+
+    def _post(self, job, event):
+        self._events.put((job, event))
+
+    @property
+    def activeJobs(self):
+        """
+        Jobs that were submitted and whose completion was not processed yet.
+        """
+        return list(self._jobs)
+
+    def processEvents(self):
+        """
+        Call the progress and finished callbacks of the jobs for what happened since the last call.
+        Only the last progress of each job is reported. Returns the jobs that finished.
+        """
+        progressed = []
+        finished = []
+        while True:
+            try:
+                job, event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event == "progress":
+                if job not in progressed:
+                    progressed.append(job)
+            elif job in self._jobs:
+                self._jobs.remove(job)
+                finished.append(job)
+        for job in progressed:
+            if job.onProgress is not None and job not in finished:
+                job.onProgress(job)
+        for job in finished:
+            if job.onFinished is not None:
+                job.onFinished(job)
+        return finished
+
+    def cancelAll(self):
+        for job in self._jobs:
+            job.cancel()
+
+    def shutdown(self, cancel=True):
+        """
+        Stop the worker threads, after cancelling the jobs if cancel is set. Waits for the running jobs.
+        """
+        if cancel:
+            self.cancelAll()
+        self._executor.shutdown(wait=True)
+        self.processEvents()
+
+
+def snapshotPoses(buffer):
+    """
+    Copy of the poses and timestamps of a pose buffer, for a job to process while capture goes on.
+    """
+    return buffer.poses().copy(), buffer.timestamps().copy()
+
+
+def postProcessTrajectory(job, poses, timestamps, decimation=None, resampling=None, frames=None):
+    """
+    Job function: decimate (keyword arguments of decimatePoses) and/or resample (keyword arguments of
+    resampleTrajectory) a snapshot of the captured poses. frames optionally maps the names of other traced frames to
+    (poses, timestamps, decimation settings) snapshots that are decimated in the same job.
+    Progress is reported (and cancellation checked) from inside each step, every few thousand poses.
+    Returns the processed poses and timestamps, the indices kept by the decimation (None without decimation) and a
+    dictionary from frame name to the indices kept for that frame.
+    """
+    frames = frames or {}
+    stepCount = (decimation is not None) + len(frames) + (resampling is not None)
+    done = 0
+
+    def stepProgress(message):
+        # Progress of the current step, scaled to its share of the job
+        job.reportProgress(done / stepCount, message)
+        return lambda fraction: job.reportProgress((done + fraction) / stepCount)
+
+    indices = None
+    if decimation is not None:
+        progress = stepProgress(f"Decimating {len(poses)} poses")
+        indices = decimatePoses(poses, timestamps, **decimation, progress=progress)
+        poses, timestamps = poses[indices], timestamps[indices]
+        done += 1
+    frameIndices = {}
+    for name, (framePoses, frameTimestamps, frameDecimation) in frames.items():
+        progress = stepProgress(f"Decimating {len(framePoses)} poses of {name}")
+        frameIndices[name] = decimatePoses(framePoses, frameTimestamps, **frameDecimation, progress=progress)
+        done += 1
+    if resampling is not None:
+        progress = stepProgress(f"Resampling {len(poses)} poses")
+        poses, timestamps = resampleTrajectory(poses, timestamps, **resampling, progress=progress)
+    job.reportProgress(1.0, f"{len(poses)} poses")
+    return np.ascontiguousarray(poses), np.ascontiguousarray(timestamps), indices, frameIndices
@@ -0,0 +1,155 @@
+import numpy as np
+
+from .decimation import decimatePoses
+from .poseBuffer import PoseBuffer
+
+
+class TracedFrame:
+    """
+    A frame traced by a MultiFrameRecorder: its own pose buffer, capture threshold and decimation settings.
+    decimation holds keyword arguments of decimatePoses (translationTolerance, rotationTolerance, method...).
+    """
+
+    def __init__(self, name, buffer=None, distanceThreshold=None, decimation=None):
+        self.name = name
+        self.buffer = buffer if buffer is not None else PoseBuffer()
+        self.distanceThreshold = distanceThreshold
+        self.decimation = dict(decimation or {})
+
+
+class MultiFrameRecorder:
+    """
+    Records the poses of several frames sampled together, one append per tick for all the frames.
+    Every tick adds a row to a timestamp column shared by the frames, and each frame keeps the poses that passed its own
+    distance threshold, stamped with the time of the tick they were read at. Poses of different frames that have the same
+    timestamp were read in the same pass, so the traces are time-aligned.
+    """
+
+    def __init__(self, capacity=1024):
+        self.frames = []
+        self._timestamps = np.zeros(capacity)
+        self._tickCount = 0
+        self._allocateFrameArrays(0)
+
+    def _allocateFrameArrays(self, frameCount):
+        # Per-frame state of append, reallocated only when frames are added or removed
+        self._stored = np.zeros(frameCount, dtype=bool)
+        self._lastPositions = [None] * frameCount  # last stored position of each frame, as (x, y, z) floats
+        self._lastPositionVersions = [None] * frameCount  # buffer version each last position was read at
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def tickCount(self):
+        return self._tickCount
+
+    def timestamps(self):
+        """
+        View (not a copy) of the shared timestamp column, one value per tick.
+        """
+        return self._timestamps[:self._tickCount]
+
+    def frameNames(self):
+        return [frame.name for frame in self.frames]
+
+    def frame(self, name):
+        for frame in self.frames:
+            if frame.name == name:
+                return frame
+        raise KeyError(f"No traced frame named {name!r}")
+
+    def addFrame(self, name, buffer=None, distanceThreshold=None, decimation=None):
+        """
+        Start tracing a new frame. Its poses are passed to append after the poses of the frames added before it.
+        """
+        if name in self.frameNames():
+            raise ValueError(f"A frame named {name!r} is already traced")
+        frame = TracedFrame(name, buffer, distanceThreshold, decimation)
+        self.frames.append(frame)
+        self._allocateFrameArrays(len(self.frames))
+        return frame
+
+    def removeFrame(self, name):
+        self.frames.remove(self.frame(name))
+        self._allocateFrameArrays(len(self.frames))
+
+    def append(self, poses, timestamp, firstFrame=0):
+        """
+        Add a tick: poses is a F x 4 x 4 array with one pose per frame (in the order the frames were added).
+        The frames before firstFrame were not sampled at this tick (their poses are ignored) and store nothing.
+        Returns a boolean array telling which frames stored their pose. The array is reused by the next append.
+        This runs at every sampling tick: no NumPy array is allocated in the common case, only the few Python floats of
+        the distance check of each frame.
+        """
+        frames = self.frames
+        frameCount = len(frames)
+        if len(poses) != frameCount:
+            raise ValueError(f"Expected {frameCount} poses, got {len(poses)}")
+        if self._tickCount == len(self._timestamps):
+            timestamps = np.zeros(2 * len(self._timestamps))
+            timestamps[:self._tickCount] = self._timestamps[:self._tickCount]
+            self._timestamps = timestamps
+        self._timestamps[self._tickCount] = timestamp
+        self._tickCount += 1
+
+        # With the few frames traced at once, scalar arithmetic per frame is cheaper than NumPy calls over all the frames.
+        # Frames without a stored pose or a threshold always store.
+        if len(self._stored) != frameCount:
+            self._allocateFrameArrays(frameCount)
+        stored = self._stored
+        stored[:firstFrame] = False
+        lastPositions = self._lastPositions
+        versions = self._lastPositionVersions
+        for index in range(firstFrame, frameCount):
+            frame = frames[index]
+            buffer = frame.buffer
+            threshold = frame.distanceThreshold
+            if threshold is not None and len(buffer) > 0:
+                # The last stored position is only read again when the buffer changed (a pose was stored, decimation...)
+                if versions[index] != buffer.version:
+                    lastPositions[index] = buffer.lastPose()[:3, 3].tolist()
+                    versions[index] = buffer.version
+                lastX, lastY, lastZ = lastPositions[index]
+                x, y, z = poses[index, :3, 3].tolist()
+                if (x - lastX) ** 2 + (y - lastY) ** 2 + (z - lastZ) ** 2 <= threshold * threshold:
+                    stored[index] = False
+                    continue
+            buffer.append(poses[index], timestamp)
+            stored[index] = True
+        return stored
+
+    def clear(self):
+        """
+        Remove all the ticks and the poses of all the frames. The frames and their settings are kept.
+        """
+        self._tickCount = 0
+        for frame in self.frames:
+            frame.buffer.clear()
+
+    def decimate(self, name, **settings):
+        """
+        Decimate the poses of a frame with its own decimation settings (overridden by settings).
+        Returns the indices of the kept poses.
+        """
+        frame = self.frame(name)
+        if len(frame.buffer) == 0:
+            return np.zeros(0, dtype=int)
+        indices = decimatePoses(frame.buffer.poses(), frame.buffer.timestamps(), **{**frame.decimation, **settings})
+        frame.buffer.keep(indices)
+        return indices
+
+    def alignedPoses(self):
+        """
+        Poses of all the frames at every tick: a T x F x 4 x 4 array holding, for each tick and frame,
+        the last pose the frame stored at or before the tick (NaN before its first pose).
+        """
+        timestamps = self.timestamps()
+        aligned = np.full((len(timestamps), len(self.frames), 4, 4), np.nan)
+        for index, frame in enumerate(self.frames):
+            if len(frame.buffer) == 0:
+                continue
+            positions = np.searchsorted(frame.buffer.timestamps(), timestamps, side="right") - 1
+            valid = positions >= 0
+            aligned[valid, index] = frame.buffer.poses()[positions[valid]]
+        return aligned
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class PoseBuffer:
+    """
+    Contiguous store of captured 4x4 poses (N x 4 x 4, float64) and their timestamps.
+    Storage is preallocated and grows by doubling, so appending a pose does not allocate in the common case.
+    """
+
+    def __init__(self, capacity=1024):
+        self._poses = np.zeros((capacity, 4, 4))
+        self._timestamps = np.zeros(capacity)
+        self._count = 0
+        self.version = 0  # incremented whenever the content changes, so that readers can cache what they derive from it
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def capacity(self):
+        return len(self._timestamps)
+
+    def poses(self):
+        """
+        View (not a copy) of the stored poses.
+        """
+        return self._poses[:self._count]
+
+    def timestamps(self):
+        """
+        View (not a copy) of the stored timestamps.
+        """
+        return self._timestamps[:self._count]
+
+    def lastPose(self):
+        return self._poses[self._count - 1] if self._count > 0 else None
+
+    def append(self, pose, timestamp):
+        if self._count == self.capacity:
+            self.reserve(2 * self.capacity)
+        self._poses[self._count] = pose
+        self._timestamps[self._count] = timestamp
+        self._count += 1
+        self.version += 1
+
+    def reserve(self, capacity):
+        """
+        Make sure at least `capacity` poses can be stored without reallocating.
+        """
+        if capacity <= self.capacity:
+            return
+        poses = np.zeros((capacity, 4, 4))
+        timestamps = np.zeros(capacity)
+        poses[:self._count] = self._poses[:self._count]
+        timestamps[:self._count] = self._timestamps[:self._count]
+        self._poses = poses
+        self._timestamps = timestamps
+
+    def clear(self):
+        """
+        Remove all poses. The storage is kept for the next trace.
+        """
+        self._count = 0
+        self.version += 1
+
+    def assign(self, poses, timestamps):
+        """
+        Replace the content of the buffer by the given poses and timestamps.
+        """
+        count = len(poses)
+        self.reserve(count)
+        self._poses[:count] = poses
+        self._timestamps[:count] = timestamps
+        self._count = count
+        self.version += 1
+
+    def keep(self, indices):
+        """
+        Keep only the poses at the given (sorted) indices, in place.
+        """
+        indices = np.asarray(indices, dtype=int)
+        count = len(indices)
+        self._poses[:count] = self._poses[indices]
+        self._timestamps[:count] = self._timestamps[indices]
+        self._count = count
+        self.version += 1
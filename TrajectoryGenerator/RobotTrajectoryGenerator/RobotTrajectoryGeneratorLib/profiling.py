@@ -0,0 +1,166 @@
+import contextlib
+import json
+import time
+
+import numpy as np
+
+# Returned by Profiler.span when profiling is disabled, so that a disabled span costs one attribute check
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+
+class StageTimings:
+    """
+    Rolling window of the last windowSize durations (in seconds) of a stage, with the total count.
+    The window is kept in plain lists, which are cheaper to write one value at a time than NumPy arrays.
+    """
+
+    def __init__(self, windowSize=1024):
+        self.durations = [0.0] * windowSize
+        self.endTimes = [0.0] * windowSize
+        self.count = 0
+
+    def add(self, start, end):
+        slot = self.count % len(self.durations)
+        self.durations[slot] = end - start
+        self.endTimes[slot] = end
+        self.count += 1
+
+    def window(self):
+        return np.array(self.durations[:min(self.count, len(self.durations))])
+
+    def rate(self):
+        """
+        Number of spans per second over the window.
+        """
+        size = min(self.count, len(self.durations))
+        if size < 2:
+            return 0.0
+        endTimes = self.endTimes[:size]
+        elapsed = max(endTimes) - min(endTimes)
+        return (size - 1) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        durations = self.window()
+        if len(durations) == 0:
+            return {"count": self.count}
+        p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+        return {
+            "count": self.count,
+            "rate": self.rate(),
+            "mean": float(durations.mean()),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": float(durations.max()),
+        }
+
+
+class Profiler:
+    """
+    Timing spans around the stages of the tracing pipeline. Each stage keeps a rolling window of its durations and
+    the last traceCapacity spans are kept as events that can be exported as a Chrome trace (chrome://tracing, Perfetto).
+
+        with profiler.span("capture.read"):
+            ...
+
+    Nothing is recorded while the profiler is disabled.
+    """
+
+    def __init__(self, enabled=False, windowSize=1024, traceCapacity=100000):
+        self.enabled = enabled
+        self.windowSize = windowSize
+        self.stages = {}
+        self._traceNames = [None] * traceCapacity
+        self._traceTimes = [None] * traceCapacity
+        self._traceCount = 0
+        self._originTime = time.perf_counter()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start, end):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageTimings(self.windowSize)
+        stage.add(start, end)
+        slot = self._traceCount % len(self._traceNames)
+        self._traceNames[slot] = name
+        self._traceTimes[slot] = (start, end)
+        self._traceCount += 1
+
+    def reset(self):
+        self.stages = {}
+        self._traceCount = 0
+        self._originTime = time.perf_counter()
+
+    def rate(self, name):
+        stage = self.stages.get(name)
+        return stage.rate() if stage else 0.0
+
+    def summary(self):
+        """
+        Dictionary of stage summaries (count, rate, mean, p50, p90, p99, max; durations in seconds) by stage name.
+        """
+        return {name: stage.summary() for name, stage in sorted(self.stages.items())}
+
+    def traceEvents(self):
+        """
+        Recorded spans in the Chrome trace event format (complete events, times in microseconds), oldest first.
+        """
+        capacity = len(self._traceNames)
+        count = min(self._traceCount, capacity)
+        first = self._traceCount - count
+        events = []
+        for index in range(first, self._traceCount):
+            slot = index % capacity
+            start, end = self._traceTimes[slot]
+            events.append({
+                "name": self._traceNames[slot],
+                "cat": self._traceNames[slot].split(".")[0],
+                "ph": "X",
+                "ts": (start - self._originTime) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 0,
+                "tid": 0,
+            })
+        return events
+
+    def save(self, path):
+        """
+        Save the stage summaries as JSON, or the recorded spans as a Chrome trace if path ends with .trace.json.
+        """
+        if path.lower().endswith(".trace.json"):
+            data = {"traceEvents": self.traceEvents(), "displayTimeUnit": "ms"}
+        else:
+            data = {"stages": self.summary()}
+        with open(path, "w") as file:
+            json.dump(data, file, indent=1)
+
+    def formatSummary(self):
+        """
+        Stage summaries as text lines, durations in milliseconds.
+        """
+        lines = [f"{'Stage':<24}{'count':>8}{'rate':>10}{'p50':>9}{'p99':>9}{'max':>9}"]
+        for name, summary in self.summary().items():
+            if "p50" not in summary:
+                continue
+            lines.append(f"{name:<24}{summary['count']:>8}{summary['rate']:>8.1f}/s"
+                         f"{summary['p50'] * 1000:>9.3f}{summary['p99'] * 1000:>9.3f}{summary['max'] * 1000:>9.3f}")
+        return "\n".join(lines)
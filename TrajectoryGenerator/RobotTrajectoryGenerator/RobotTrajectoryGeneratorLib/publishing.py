@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+
+
+class TransformCollectionPacker:
+    """
+    Fills a reusable vtkTransformCollection (the input of the ROS 2 PoseArray publisher) from an N x 4 x 4 array of poses.
+    The vtkTransform objects are kept from one call to the next, so packing a path does not allocate a VTK object per pose,
+    each pose is copied with a single SetMatrix call.
+    """
+
+    def __init__(self):
+        import vtk  # VTK is only needed once something is published
+        self._vtk = vtk
+        self.collection = vtk.vtkTransformCollection()
+        self._transforms = []
+
+    def pack(self, poses):
+        poses = np.ascontiguousarray(poses, dtype=float)
+        count = len(poses)
+        while len(self._transforms) < count:
+            self._transforms.append(self._vtk.vtkTransform())
+        if self.collection.GetNumberOfItems() != count:
+            self.collection.RemoveAllItems()
+            for transform in self._transforms[:count]:
+                self.collection.AddItem(transform)
+        for transform, elements in zip(self._transforms, poses.reshape(count, 16)):
+            transform.SetMatrix(elements)
+        return self.collection
+
+
+def buildTransformCollection(poses):
+    """
+    Build a new transform collection with a new vtkTransform per pose (the original publishing path, kept for comparison).
+    """
+    import vtk
+    trCollection = vtk.vtkTransformCollection()
+    for pose in poses:
+        matrix = vtk.vtkMatrix4x4()
+        matrix.DeepCopy(np.ravel(pose))
+        tr = vtk.vtkTransform()
+        tr.SetMatrix(matrix)
+        trCollection.AddItem(tr)
+    return trCollection
+
+
+class LocalPoseArrayPublisher:
+    """
+    Stand-in for vtkMRMLROS2PublisherPoseArrayNode that does not need ROS 2.
+    The conversion of the collection to a message happens in C++ in the real publisher and is the same for any
+    way of building the collection, so this only keeps the collection and counts the poses.
+    """
+
+    def __init__(self):
+        self.lastMessage = None
+        self.publishedPoseCount = 0
+
+    def Publish(self, transforms):
+        self.lastMessage = transforms
+        self.publishedPoseCount += transforms.GetNumberOfItems()
+
+
+def benchmarkSendPoseArray(sizes=(100, 1000, 10000), repeats=5):
+    """
+    Compare the time needed to publish paths of different lengths with the original path (a new transform collection per
+    send) and with TransformCollectionPacker, using a LocalPoseArrayPublisher.
+    Returns a list of dictionaries with the best time of each path, in seconds.
+    """
+    results = []
+    publisher = LocalPoseArrayPublisher()
+    for size in sizes:
+        poses = np.tile(np.eye(4), (size, 1, 1))
+        poses[:, :3, 3] = np.random.default_rng(size).uniform(-100, 100, (size, 3))
+
+        collectionTimes = []
+        for _ in range(repeats):
+            startTime = time.perf_counter()
+            publisher.Publish(buildTransformCollection(poses))
+            collectionTimes.append(time.perf_counter() - startTime)
+
+        packer = TransformCollectionPacker()
+        packer.pack(poses)  # the first call allocates the transforms, later sends reuse them
+        packerTimes = []
+        for _ in range(repeats):
+            startTime = time.perf_counter()
+            publisher.Publish(packer.pack(poses))
+            packerTimes.append(time.perf_counter() - startTime)
+
+        results.append({"poses": size, "collection": min(collectionTimes), "packed": min(packerTimes)})
+        print(f"{size} poses: transform collection {1000 * min(collectionTimes):.2f} ms, "
+              f"packed {1000 * min(packerTimes):.2f} ms")
+    return results
@@ -0,0 +1,269 @@
+import itertools
+import os
+import struct
+
+import numpy as np
+
+from .serialization import posesFromPositionsAndQuaternions, posesToPositionsAndQuaternions
+
+# A recording is a fixed size header followed by records of 17 little-endian float64 values:
+# the timestamp (in seconds) and the 16 values of the 4x4 pose (row-major, mm).
+# The number of records is not stored, it is given by the file size, so that records can be appended
+# while recording and a recording interrupted at any point can still be read.
+RECORDING_MAGIC = b"RTGPOSES"
+RECORDING_VERSION = 1
+RECORDING_HEADER_SIZE = 64
+RECORDING_VALUES_PER_RECORD = 17
+_HEADER_FORMAT = "<8sIII"
+
+CSV_COLUMNS = ["timestamp", "x", "y", "z", "qw", "qx", "qy", "qz"]
+
+# Layout of a geometry_msgs/msg/PoseStamped message (positions in meters, quaternion x y z w),
+# used to exchange trajectories with ROS bags
+POSE_STAMPED_DTYPE = np.dtype([
+    ("sec", np.int32),
+    ("nanosec", np.uint32),
+    ("position", np.float64, 3),
+    ("orientation", np.float64, 4),
+])
+
+
+def _recordingHeader():
+    header = struct.pack(_HEADER_FORMAT, RECORDING_MAGIC, RECORDING_VERSION, RECORDING_HEADER_SIZE,
+                         RECORDING_VALUES_PER_RECORD)
+    return header.ljust(RECORDING_HEADER_SIZE, b"\0")
+
+
+def _checkRecordingHeader(header, path):
+    if len(header) < RECORDING_HEADER_SIZE:
+        raise ValueError(f"Not a trajectory recording: {path}")
+    magic, version, headerSize, valuesPerRecord = struct.unpack_from(_HEADER_FORMAT, header)
+    if magic != RECORDING_MAGIC:
+        raise ValueError(f"Not a trajectory recording: {path}")
+    if version != RECORDING_VERSION or headerSize != RECORDING_HEADER_SIZE \
+            or valuesPerRecord != RECORDING_VALUES_PER_RECORD:
+        raise ValueError(f"Unsupported trajectory recording version {version}: {path}")
+
+
+class TrajectoryRecordingWriter:
+    """
+    Writes poses to a recording file as they are captured. Records are appended to the end of the file,
+    an existing recording is continued if append is set.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as file:
+                _checkRecordingHeader(file.read(RECORDING_HEADER_SIZE), path)
+            self._file = open(path, "r+b")
+            # Drop a record that was only partially written
+            self.count = (os.path.getsize(path) - RECORDING_HEADER_SIZE) // (8 * RECORDING_VALUES_PER_RECORD)
+            self._file.truncate(RECORDING_HEADER_SIZE + self.count * 8 * RECORDING_VALUES_PER_RECORD)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(_recordingHeader())
+            self.count = 0
+        self._record = np.zeros(RECORDING_VALUES_PER_RECORD, dtype="<f8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def isOpen(self):
+        return self._file is not None
+
+    def append(self, pose, timestamp):
+        self._record[0] = timestamp
+        self._record[1:] = np.ravel(pose)
+        self._file.write(self._record.tobytes())
+        self.count += 1
+
+    def appendMany(self, poses, timestamps):
+        poses = np.asarray(poses, dtype=float)
+        records = np.empty((len(poses), RECORDING_VALUES_PER_RECORD), dtype="<f8")
+        records[:, 0] = timestamps
+        records[:, 1:] = poses.reshape(len(poses), 16)
+        self._file.write(records.tobytes())
+        self.count += len(poses)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TrajectoryRecording:
+    """
+    Read-only access to a recording file through numpy.memmap: poses (N x 4 x 4) and timestamps (N) are views
+    into the file, only the parts that are used are read from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            _checkRecordingHeader(file.read(RECORDING_HEADER_SIZE), path)
+        recordSize = 8 * RECORDING_VALUES_PER_RECORD
+        count = (os.path.getsize(path) - RECORDING_HEADER_SIZE) // recordSize
+        if count > 0:
+            self._records = np.memmap(path, dtype="<f8", mode="r", offset=RECORDING_HEADER_SIZE,
+                                      shape=(count, RECORDING_VALUES_PER_RECORD))
+        else:
+            self._records = np.zeros((0, RECORDING_VALUES_PER_RECORD))
+        self.timestamps = self._records[:, 0]
+        self.poses = self._records[:, 1:].reshape(count, 4, 4)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def chunks(self, chunkSize=10000):
+        """
+        Iterate over the recording in (poses, timestamps) chunks of at most chunkSize poses.
+        """
+        for start in range(0, len(self), chunkSize):
+            yield self.poses[start:start + chunkSize], self.timestamps[start:start + chunkSize]
+
+    def close(self):
+        self._records = self.poses = self.timestamps = None
+
+
+def writeRecording(path, poses, timestamps):
+    """
+    Write a whole trajectory to a recording file.
+    """
+    with TrajectoryRecordingWriter(path) as writer:
+        writer.appendMany(poses, timestamps)
+
+
+def _chunksOf(poses, timestamps, chunkSize):
+    if isinstance(poses, TrajectoryRecording):
+        yield from poses.chunks(chunkSize)
+        return
+    for start in range(0, len(poses), chunkSize):
+        yield poses[start:start + chunkSize], timestamps[start:start + chunkSize]
+
+
+def exportCsv(path, poses, timestamps=None, chunkSize=10000):
+    """
+    Write a trajectory (poses and timestamps, or a TrajectoryRecording) to a CSV file with a header line and one
+    row per pose: timestamp, position (mm) and orientation quaternion (w x y z). Large recordings are written in chunks.
+    """
+    with open(path, "w") as file:
+        file.write(",".join(CSV_COLUMNS) + "\n")
+        for chunkPoses, chunkTimestamps in _chunksOf(poses, timestamps, chunkSize):
+            positions, quaternions = posesToPositionsAndQuaternions(chunkPoses)
+            np.savetxt(file, np.column_stack([chunkTimestamps, positions, quaternions]), delimiter=",", fmt="%.17g")
+
+
+def importCsv(path, recordingPath=None, chunkSize=10000):
+    """
+    Read a CSV file written by exportCsv. Returns the poses (N x 4 x 4) and timestamps (N),
+    or, if recordingPath is given, converts the file to a recording chunk by chunk and returns the recording.
+    """
+    writer = TrajectoryRecordingWriter(recordingPath) if recordingPath else None
+    posesChunks, timestampsChunks = [], []
+    with open(path) as file:
+        columns = file.readline().strip().split(",")
+        if columns != CSV_COLUMNS:
+            raise ValueError(f"Unexpected CSV columns {columns}, expected {CSV_COLUMNS}")
+        while True:
+            lines = list(itertools.islice(file, chunkSize))
+            if not lines:
+                break
+            values = np.loadtxt(lines, delimiter=",", ndmin=2)
+            poses = posesFromPositionsAndQuaternions(values[:, 1:4], values[:, 4:8])
+            if writer:
+                writer.appendMany(poses, values[:, 0])
+            else:
+                posesChunks.append(poses)
+                timestampsChunks.append(values[:, 0])
+    if writer:
+        writer.close()
+        return TrajectoryRecording(recordingPath)
+    if not posesChunks:
+        return np.zeros((0, 4, 4)), np.zeros(0)
+    return np.concatenate(posesChunks), np.concatenate(timestampsChunks)
+
+
+def posesToPoseStamped(poses, timestamps, scale=0.001):
+    """
+    Convert poses (mm) and timestamps (s) to an array of POSE_STAMPED_DTYPE records.
+    Positions are multiplied by scale (mm to m by default, as ROS uses meters).
+    """
+    positions, quaternions = posesToPositionsAndQuaternions(poses)
+    timestamps = np.asarray(timestamps, dtype=float)
+    messages = np.zeros(len(positions), dtype=POSE_STAMPED_DTYPE)
+    nanoseconds = np.round(timestamps * 1e9).astype(np.int64)
+    messages["sec"] = nanoseconds // 1000000000
+    messages["nanosec"] = nanoseconds % 1000000000
+    messages["position"] = positions * scale
+    messages["orientation"] = quaternions[:, [1, 2, 3, 0]]
+    return messages
+
+
+def posesFromPoseStamped(messages, scale=0.001):
+    """
+    Get the poses (mm) and timestamps (s) from an array of POSE_STAMPED_DTYPE records.
+    """
+    timestamps = messages["sec"] + messages["nanosec"] * 1e-9
+    poses = posesFromPositionsAndQuaternions(messages["position"] / scale, messages["orientation"][:, [3, 0, 1, 2]])
+    return poses, timestamps
+
+
+def writeRosbag(path, poses, timestamps=None, topic="/slicer_trajectory", frameId="world", chunkSize=10000):
+    """
+    Write a trajectory (poses and timestamps, or a TrajectoryRecording) to a ROS 2 bag as
+    geometry_msgs/msg/PoseStamped messages. Requires a sourced ROS 2 environment (rosbag2_py, rclpy).
+    """
+    import rosbag2_py
+    from geometry_msgs.msg import PoseStamped
+    from rclpy.serialization import serialize_message
+
+    writer = rosbag2_py.SequentialWriter()
+    writer.open(rosbag2_py.StorageOptions(uri=path, storage_id="sqlite3"),
+                rosbag2_py.ConverterOptions(input_serialization_format="cdr", output_serialization_format="cdr"))
+    writer.create_topic(rosbag2_py.TopicMetadata(name=topic, type="geometry_msgs/msg/PoseStamped",
+                                                 serialization_format="cdr"))
+    message = PoseStamped()
+    message.header.frame_id = frameId
+    for chunkPoses, chunkTimestamps in _chunksOf(poses, timestamps, chunkSize):
+        for record in posesToPoseStamped(chunkPoses, chunkTimestamps):
+            message.header.stamp.sec = int(record["sec"])
+            message.header.stamp.nanosec = int(record["nanosec"])
+            position, orientation = record["position"], record["orientation"]
+            message.pose.position.x, message.pose.position.y, message.pose.position.z = position.tolist()
+            (message.pose.orientation.x, message.pose.orientation.y,
+             message.pose.orientation.z, message.pose.orientation.w) = orientation.tolist()
+            writer.write(topic, serialize_message(message), int(record["sec"]) * 1000000000 + int(record["nanosec"]))
+    del writer  # the bag is closed when the writer is destroyed
+
+
+def readRosbag(path, topic="/slicer_trajectory"):
+    """
+    Read the geometry_msgs/msg/PoseStamped messages of a topic of a ROS 2 bag.
+    Returns the poses (N x 4 x 4, mm) and timestamps (N, s). Requires a sourced ROS 2 environment.
+    """
+    import rosbag2_py
+    from geometry_msgs.msg import PoseStamped
+    from rclpy.serialization import deserialize_message
+
+    reader = rosbag2_py.SequentialReader()
+    reader.open(rosbag2_py.StorageOptions(uri=path, storage_id="sqlite3"),
+                rosbag2_py.ConverterOptions(input_serialization_format="cdr", output_serialization_format="cdr"))
+    records = []
+    while reader.has_next():
+        topicName, data, _ = reader.read_next()
+        if topicName != topic:
+            continue
+        message = deserialize_message(data, PoseStamped)
+        position, orientation = message.pose.position, message.pose.orientation
+        records.append((message.header.stamp.sec, message.header.stamp.nanosec,
+                        (position.x, position.y, position.z), (orientation.x, orientation.y, orientation.z, orientation.w)))
+    return posesFromPoseStamped(np.array(records, dtype=POSE_STAMPED_DTYPE))
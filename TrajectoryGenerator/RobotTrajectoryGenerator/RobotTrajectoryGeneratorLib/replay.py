@@ -0,0 +1,157 @@
+import time
+
+import numpy as np
+
+from .decimation import decimatePoses
+from .multiFrame import MultiFrameRecorder
+from .poseBuffer import PoseBuffer
+from .serialization import loadTrajectory
+from .sources import syntheticTrajectory
+
+
+class ReplaySource:
+    """
+    Plays back a recorded or generated trajectory in place of a live lookup.
+    After start, the current pose follows the wall clock at `speed` times real time (looping over the trajectory if loop
+    is set). seek moves to a given recording time and stops following the clock, so that the trajectory can be stepped
+    through as fast as possible.
+    """
+
+    def __init__(self, poses, timestamps, speed=1.0, loop=False):
+        if len(poses) == 0:
+            raise ValueError("Cannot replay an empty trajectory")
+        if len(poses) != len(timestamps):
+            raise ValueError("There must be one timestamp per pose")
+        self.poses = poses
+        self.timestamps = timestamps
+        self.speed = speed
+        self.loop = loop
+        self.currentTime = float(timestamps[0])
+        self._startWallTime = None
+
+    @classmethod
+    def fromFile(cls, path, speed=1.0, loop=False):
+        """
+        Replay a trajectory file. Recordings (.rtg) are memory-mapped, not read in memory.
+        """
+        return cls(*loadTrajectory(path), speed=speed, loop=loop)
+
+    @classmethod
+    def fromGenerator(cls, source, count, speed=1.0, loop=False, **kwargs):
+        """
+        Replay a generated trajectory: source is a function returning (poses, timestamps) for a number of poses,
+        or a source name of syntheticTrajectory ("helix", "randomwalk").
+        """
+        generate = source if callable(source) else lambda count, **kwargs: syntheticTrajectory(source, count, **kwargs)
+        return cls(*generate(count, **kwargs), speed=speed, loop=loop)
+
+    @property
+    def startTime(self):
+        return float(self.timestamps[0])
+
+    @property
+    def endTime(self):
+        return float(self.timestamps[-1])
+
+    @property
+    def isFinished(self):
+        return not self.loop and self.currentTime >= self.endTime
+
+    def start(self, now=None):
+        """
+        Replay from the beginning, following the wall clock.
+        """
+        self._startWallTime = time.perf_counter() if now is None else now
+        self.currentTime = self.startTime
+
+    def update(self, now=None):
+        """
+        Advance the current time to match the wall clock. Does nothing unless the source was started.
+        """
+        if self._startWallTime is None:
+            return
+        elapsed = ((time.perf_counter() if now is None else now) - self._startWallTime) * self.speed
+        duration = self.endTime - self.startTime
+        if self.loop and duration > 0:
+            elapsed %= duration
+        self.currentTime = self.startTime + min(elapsed, duration)
+
+    def pause(self, now=None):
+        self.update(now)
+        self._startWallTime = None
+
+    def resume(self, now=None):
+        """
+        Follow the wall clock again, from the current time.
+        """
+        now = time.perf_counter() if now is None else now
+        self._startWallTime = now - (self.currentTime - self.startTime) / self.speed
+
+    def seek(self, recordingTime):
+        self._startWallTime = None
+        self.currentTime = recordingTime
+
+    def currentIndex(self):
+        index = np.searchsorted(self.timestamps, self.currentTime, side="right") - 1
+        return int(min(max(index, 0), len(self.timestamps) - 1))
+
+    def currentPose(self):
+        """
+        Last recorded pose at or before the current time.
+        """
+        return self.poses[self.currentIndex()]
+
+    def sampleTimes(self, rateHz=None):
+        """
+        Recording times at which a sampler running at rateHz would read the source (every recorded pose if None).
+        """
+        if rateHz is None:
+            return np.asarray(self.timestamps, dtype=float)
+        return self.startTime + np.arange(int(np.floor((self.endTime - self.startTime) * rateHz)) + 1) / rateHz
+
+
+def replayCapture(source, rateHz=None, distanceThreshold=None, decimation=None, buffer=None):
+    """
+    Feed a replay source through the capture pipeline as fast as possible: the source is sampled at rateHz (recording
+    time, every recorded pose if None), the samples go through the live distance threshold into a pose buffer (with
+    MultiFrameRecorder.append, the capture path of a live trace) and the buffer is then decimated with decimation
+    (keyword arguments of decimatePoses, no decimation if None).
+    Returns the pose buffer and the indices of the poses kept by the decimation (None without decimation).
+    """
+    if buffer is None:
+        buffer = PoseBuffer()
+    recorder = MultiFrameRecorder()
+    recorder.addFrame("replay", buffer=buffer, distanceThreshold=distanceThreshold)
+    framePoses = np.zeros((1, 4, 4))
+    for sampleTime in source.sampleTimes(rateHz):
+        source.seek(sampleTime)
+        framePoses[0] = source.currentPose()
+        recorder.append(framePoses, sampleTime)
+    indices = None
+    if decimation is not None and len(buffer) > 0:
+        indices = decimatePoses(buffer.poses(), buffer.timestamps(), **decimation)
+        buffer.keep(indices)
+    return buffer, indices
+
+
+def sweepReplayCapture(source, parameterSets):
+    """
+    Run replayCapture once per parameter set (dictionaries of replayCapture keyword arguments) on the same source.
+    Returns one row per parameter set with the parameters, the number of captured and kept poses and the run time.
+    """
+    rows = []
+    for parameters in parameterSets:
+        captureParameters = dict(parameters)
+        decimation = captureParameters.pop("decimation", None)
+        startTime = time.perf_counter()
+        buffer, _ = replayCapture(source, **captureParameters)
+        captured = len(buffer)
+        if decimation is not None and captured > 0:
+            buffer.keep(decimatePoses(buffer.poses(), buffer.timestamps(), **decimation))
+        rows.append({
+            "parameters": parameters,
+            "captured": captured,
+            "kept": len(buffer),
+            "seconds": time.perf_counter() - startTime,
+        })
+    return rows
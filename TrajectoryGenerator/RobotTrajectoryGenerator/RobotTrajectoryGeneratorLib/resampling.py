@@ -0,0 +1,133 @@
+import numpy as np
+
+from .geometry import quaternionsToRotationMatrices, rotationMatricesToQuaternions, slerpQuaternions
+
+# Number of waypoints interpolated at once between two progress reports
+_CHUNK_SIZE = 32768
+
+
+def smoothPositions(positions, iterations=1):
+    """
+    Approximate the positions by a uniform cubic B-spline that uses them as control points, evaluated at the knots
+    ((p[i-1] + 4 p[i] + p[i+1]) / 6). Each iteration smooths more. The first and last positions are not moved.
+    """
+    smoothed = np.array(positions, dtype=float)
+    for _ in range(iterations):
+        smoothed[1:-1] = (smoothed[:-2] + 4.0 * smoothed[1:-1] + smoothed[2:]) / 6.0
+    return smoothed
+
+
+def resampleTrajectory(poses, timestamps, spacing, mode="arclength", smoothing=None, smoothingIterations=1,
+                       maxVelocity=None, maxAcceleration=None, progress=None):
+    """
+    Resample a trajectory (N x 4 x 4 poses and N timestamps) to evenly spaced waypoints.
+    Returns the resampled poses (M x 4 x 4) and their timestamps (M). The waypoints are computed by large vectorized
+    chunks.
+
+    mode "arclength": a waypoint every `spacing` mm along the path, "time": a waypoint every `spacing` seconds.
+    A path that only rotates has no length: in "arclength" mode it is parameterized by time instead (by pose index if
+    the timestamps do not increase), with as many evenly spaced waypoints as there are poses.
+    The last pose is always included. Positions are interpolated linearly, or with a Catmull-Rom cubic if smoothing is
+    "cubic". With smoothing "bspline", the positions are first smoothed with smoothPositions. Rotations are interpolated
+    with slerp.
+    maxVelocity (mm/s), maxAcceleration (mm/s^2): if any is set, the timestamps are recomputed as the fastest
+    trapezoidal velocity profile along the resampled path that respects the limits, starting and ending at rest
+    (except for a path that only rotates, which the limits do not apply to).
+    progress: optional function called with the fraction of the waypoints computed (0 to 1) after each chunk.
+    An exception it raises (to cancel a background job) stops the resampling.
+    """
+    poses = np.asarray(poses, dtype=float)
+    timestamps = np.asarray(timestamps, dtype=float)
+    if len(poses) != len(timestamps):
+        raise ValueError("There must be one timestamp per pose")
+    if spacing <= 0:
+        raise ValueError("Spacing must be positive")
+    if len(poses) < 2:
+        return poses.copy(), timestamps.copy()
+
+    positions = poses[:, :3, 3]
+    if smoothing == "bspline":
+        positions = smoothPositions(positions, smoothingIterations)
+    elif smoothing not in (None, "cubic"):
+        raise ValueError(f"Unknown smoothing: {smoothing}")
+    quaternions = rotationMatricesToQuaternions(poses[:, :3, :3])
+    # Make consecutive quaternions lie in the same hemisphere so that slerp takes the short way
+    signs = np.cumprod(np.r_[1.0, np.where(np.sum(quaternions[1:] * quaternions[:-1], axis=1) < 0, -1.0, 1.0)])
+    quaternions *= signs[:, None]
+
+    # Parameter along the trajectory and the values where waypoints are needed
+    if mode == "arclength":
+        parameter = np.r_[0.0, np.cumsum(np.linalg.norm(np.diff(positions, axis=0), axis=1))]
+    elif mode == "time":
+        parameter = timestamps - timestamps[0]
+    else:
+        raise ValueError(f"Unknown resampling mode: {mode}")
+    total = parameter[-1]
+    translates = mode != "arclength" or total > 0
+    if not translates:
+        # Rotation only: the spacing in mm does not apply, keep the number of poses
+        parameter = timestamps - timestamps[0]
+        if parameter[-1] <= 0:
+            parameter = np.arange(len(poses), dtype=float)
+        total = parameter[-1]
+        spacing = total / (len(poses) - 1)
+    if total <= 0:
+        return poses[:1].copy(), timestamps[:1].copy()
+    samples = np.arange(0.0, total, spacing)
+    samples = np.r_[samples, total] if total - samples[-1] > 1e-9 * spacing else samples
+
+    # Segment of each waypoint and position within that segment
+    segments = np.clip(np.searchsorted(parameter, samples, side="right") - 1, 0, len(parameter) - 2)
+    segmentLengths = parameter[segments + 1] - parameter[segments]
+    fractions = np.divide(samples - parameter[segments], segmentLengths,
+                          out=np.zeros_like(samples), where=segmentLengths > 0)
+    fractions = np.clip(fractions, 0.0, 1.0)
+
+    resampled = np.tile(np.eye(4), (len(samples), 1, 1))
+    for chunkStart in range(0, len(samples), _CHUNK_SIZE):
+        chunk = slice(chunkStart, chunkStart + _CHUNK_SIZE)
+        chunkSegments, u = segments[chunk], fractions[chunk, None]
+        start, end = positions[chunkSegments], positions[chunkSegments + 1]
+        if smoothing == "cubic":
+            before = positions[np.maximum(chunkSegments - 1, 0)]
+            after = positions[np.minimum(chunkSegments + 2, len(positions) - 1)]
+            resampled[chunk, :3, 3] = 0.5 * ((2.0 * start) + (end - before) * u
+                                             + (2.0 * before - 5.0 * start + 4.0 * end - after) * u ** 2
+                                             + (3.0 * start - before - 3.0 * end + after) * u ** 3)
+        else:
+            resampled[chunk, :3, 3] = start + u * (end - start)
+        resampled[chunk, :3, :3] = quaternionsToRotationMatrices(
+            slerpQuaternions(quaternions[chunkSegments], quaternions[chunkSegments + 1], fractions[chunk]))
+        if progress is not None:
+            progress(min(chunkStart + _CHUNK_SIZE, len(samples)) / len(samples))
+
+    if (maxVelocity or maxAcceleration) and translates:
+        newTimestamps = timestamps[0] + _trapezoidalTiming(resampled[:, :3, 3], maxVelocity, maxAcceleration)
+    else:
+        newTimestamps = timestamps[segments] + fractions * (timestamps[segments + 1] - timestamps[segments])
+    return resampled, newTimestamps
+
+
+def _trapezoidalTiming(positions, maxVelocity, maxAcceleration):
+    """
+    Time of each waypoint along the path for the fastest motion that starts and ends at rest and respects the limits.
+    """
+    distances = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+    traveled = np.r_[0.0, np.cumsum(distances)]
+    velocities = np.full(len(positions), maxVelocity if maxVelocity else np.inf)
+    if maxAcceleration:
+        # Accelerate from the start and decelerate to the end of the path
+        velocities = np.minimum(velocities, np.sqrt(2.0 * maxAcceleration * traveled))
+        velocities = np.minimum(velocities, np.sqrt(2.0 * maxAcceleration * (traveled[-1] - traveled)))
+    # Constant acceleration between two waypoints: dt = 2 d / (v0 + v1)
+    segmentVelocities = velocities[:-1] + velocities[1:]
+    durations = np.divide(2.0 * distances, segmentVelocities, out=np.zeros_like(distances), where=segmentVelocities > 0)
+    # A segment starting and ending at rest (a path of a single segment) accelerates to its middle, up to the maximum
+    # velocity, and decelerates: d / peak + peak / a, which is 2 sqrt(d / a) without a velocity limit
+    atRest = (segmentVelocities == 0) & (distances > 0)
+    if np.any(atRest):
+        peaks = np.sqrt(maxAcceleration * distances[atRest])
+        if maxVelocity:
+            peaks = np.minimum(peaks, maxVelocity)
+        durations[atRest] = distances[atRest] / peaks + peaks / maxAcceleration
+    return np.r_[0.0, np.cumsum(durations)]
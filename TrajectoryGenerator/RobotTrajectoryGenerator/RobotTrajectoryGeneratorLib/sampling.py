@@ -0,0 +1,133 @@
+import math
+import time
+
+
+class SamplingSchedule:
+    """
+    Tick schedule of a fixed rate sampler, without the timer that fires the ticks (see TrajectorySampler in the module).
+    Ticks are due at absolute deadlines (start + k * period) so the schedule does not drift.
+    If a tick fires late, the deadlines that have already passed are dropped (and counted as missed)
+    instead of being queued up and fired back to back.
+    clock is the function giving the current time in seconds.
+    """
+
+    def __init__(self, rateHz=50.0, durationMs=5000, clock=time.perf_counter):
+        self.rateHz = rateHz
+        self.durationMs = durationMs  # 0 means sample until stopped
+        self.clock = clock
+        self._running = False
+        self._paused = False
+        self._startTime = 0.0
+        self._pauseTime = 0.0
+        self._stopTime = 0.0
+        self._nextTickIndex = 0
+        self.tickCount = 0
+        self.missedTicks = 0
+
+    @property
+    def isRunning(self):
+        return self._running
+
+    @property
+    def isPaused(self):
+        return self._paused
+
+    @property
+    def period(self):
+        return 1.0 / self.rateHz
+
+    def elapsedTime(self):
+        """
+        Time spent sampling since start, in seconds (paused time excluded).
+        """
+        if not self._running:
+            return self._stopTime - self._startTime
+        now = self._pauseTime if self._paused else self.clock()
+        return now - self._startTime
+
+    def achievedHz(self):
+        """
+        Number of samples actually taken per second since start.
+        """
+        elapsed = self.elapsedTime()
+        return self.tickCount / elapsed if elapsed > 0 else 0.0
+
+    def start(self, rateHz=None, durationMs=None):
+        """
+        Start (or restart) the schedule, the first tick is due immediately.
+        """
+        if rateHz is not None:
+            self.rateHz = rateHz
+        if durationMs is not None:
+            self.durationMs = durationMs
+        if self.rateHz <= 0:
+            raise ValueError("Sampling rate must be positive")
+        self._running = True
+        self._paused = False
+        self._startTime = self.clock()
+        self._nextTickIndex = 0
+        self.tickCount = 0
+        self.missedTicks = 0
+
+    def stop(self):
+        """
+        Stop the schedule. The counters are kept so they can be inspected after the trace.
+        Returns False if it was not running.
+        """
+        if not self._running:
+            return False
+        self._stopTime = self._pauseTime if self._paused else self.clock()
+        self._running = False
+        self._paused = False
+        return True
+
+    def pause(self):
+        if not self._running or self._paused:
+            return False
+        self._paused = True
+        self._pauseTime = self.clock()
+        return True
+
+    def resume(self):
+        if not self._running or not self._paused:
+            return False
+        # Shift the schedule by the paused time so that the duration and the tick indices continue where they were
+        self._startTime += self.clock() - self._pauseTime
+        self._paused = False
+        return True
+
+    def setRate(self, rateHz):
+        """
+        Change the sampling rate. While sampling, the next ticks follow the new period from the time already elapsed,
+        without restarting the capture window.
+        """
+        if rateHz <= 0:
+            raise ValueError("Sampling rate must be positive")
+        self.rateHz = rateHz
+        if self._running:
+            self._nextTickIndex = int(math.ceil(self.elapsedTime() / self.period))
+
+    def tick(self):
+        """
+        Called when the timer fires. Returns False if the capture window has elapsed (the sampler has to stop),
+        otherwise the tick is counted and a sample is due.
+        """
+        elapsed = self.clock() - self._startTime
+        if self.durationMs > 0 and elapsed * 1000.0 >= self.durationMs:
+            return False
+
+        # A timer that wakes up slightly early is treated as on time, a late one skips the deadlines it missed
+        tickIndex = max(self._nextTickIndex, int(elapsed / self.period))
+        self.missedTicks += tickIndex - self._nextTickIndex
+        self._nextTickIndex = tickIndex + 1
+        self.tickCount += 1
+        return True
+
+    def delayToNextTick(self):
+        """
+        Time until the next deadline in seconds (0 if it has passed), None while stopped or paused.
+        """
+        if not self._running or self._paused:
+            return None
+        deadline = self._startTime + self._nextTickIndex * self.period
+        return max(0.0, deadline - self.clock())
@@ -0,0 +1,90 @@
+import json
+import os
+
+import numpy as np
+
+from .geometry import quaternionsToRotationMatrices, rotationMatricesToQuaternions
+
+
+def posesToPositionsAndQuaternions(poses):
+    """
+    Split N x 4 x 4 poses into positions (N x 3) and unit quaternions (N x 4, w x y z).
+    """
+    poses = np.asarray(poses, dtype=float)
+    return poses[:, :3, 3].copy(), rotationMatricesToQuaternions(poses[:, :3, :3])
+
+
+def posesFromPositionsAndQuaternions(positions, quaternions):
+    """
+    Build N x 4 x 4 poses from positions (N x 3) and quaternions (N x 4, w x y z, normalized here).
+    """
+    quaternions = np.asarray(quaternions, dtype=float)
+    quaternions = quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    poses = np.tile(np.eye(4), (len(quaternions), 1, 1))
+    poses[:, :3, :3] = quaternionsToRotationMatrices(quaternions)
+    poses[:, :3, 3] = positions
+    return poses
+
+
+def trajectoryToDict(poses, timestamps):
+    """
+    Convert a trajectory to a dictionary that can be written as JSON (each pose is a row-major list of 16 values).
+    """
+    poses = np.asarray(poses, dtype=float)
+    return {
+        "timestamps": np.asarray(timestamps, dtype=float).tolist(),
+        "poses": poses.reshape(len(poses), 16).tolist(),
+    }
+
+
+def trajectoryFromDict(data):
+    """
+    Get the poses (N x 4 x 4) and timestamps (N) from a dictionary created by trajectoryToDict.
+    """
+    timestamps = np.asarray(data["timestamps"], dtype=float)
+    poses = np.asarray(data["poses"], dtype=float).reshape(-1, 4, 4)
+    if len(poses) != len(timestamps):
+        raise ValueError("There must be one timestamp per pose")
+    return poses, timestamps
+
+
+def saveTrajectory(path, poses, timestamps):
+    """
+    Save a trajectory to a .npz (binary), .rtg (recording), .json or .csv (text) file, depending on the file extension.
+    """
+    from .recording import exportCsv, writeRecording  # recording depends on this module
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".rtg":
+        writeRecording(path, poses, timestamps)
+    elif extension == ".csv":
+        exportCsv(path, poses, timestamps)
+    elif extension == ".npz":
+        np.savez(path, poses=np.asarray(poses, dtype=float), timestamps=np.asarray(timestamps, dtype=float))
+    elif extension == ".json":
+        with open(path, "w") as file:
+            json.dump(trajectoryToDict(poses, timestamps), file)
+    else:
+        raise ValueError(f"Unsupported trajectory file format: {path}")
+
+
+def loadTrajectory(path):
+    """
+    Load the poses (N x 4 x 4) and timestamps (N) of a trajectory saved by saveTrajectory.
+    Recordings (.rtg) are not read in memory, the returned arrays are memory-mapped views into the file.
+    """
+    from .recording import TrajectoryRecording, importCsv
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".rtg":
+        recording = TrajectoryRecording(path)
+        return recording.poses, recording.timestamps
+    elif extension == ".csv":
+        return importCsv(path)
+    elif extension == ".npz":
+        with np.load(path) as data:
+            return data["poses"], data["timestamps"]
+    elif extension == ".json":
+        with open(path) as file:
+            return trajectoryFromDict(json.load(file))
+    raise ValueError(f"Unsupported trajectory file format: {path}")
@@ -0,0 +1,57 @@
+import numpy as np
+
+from .serialization import loadTrajectory, posesFromPositionsAndQuaternions
+
+
+def helixTrajectory(count, rate=50.0, radius=50.0, pitch=20.0, turnsPerSecond=0.1):
+    """
+    Poses along a helix around z, the x axis of each pose pointing along the path. Returns poses (N x 4 x 4)
+    and timestamps (N, sampled at `rate` Hz).
+    """
+    timestamps = np.arange(count) / rate
+    angles = 2.0 * np.pi * turnsPerSecond * timestamps
+    poses = np.tile(np.eye(4), (count, 1, 1))
+    poses[:, 0, 3] = radius * np.cos(angles)
+    poses[:, 1, 3] = radius * np.sin(angles)
+    poses[:, 2, 3] = pitch * angles / (2.0 * np.pi)
+    # Rotation about z by the angle along the helix
+    poses[:, 0, 0] = poses[:, 1, 1] = -np.sin(angles)
+    poses[:, 1, 0] = np.cos(angles)
+    poses[:, 0, 1] = -np.cos(angles)
+    return poses, timestamps
+
+
+def randomWalkTrajectory(count, rate=50.0, step=1.0, angularStep=1.0, seed=0):
+    """
+    Random walk in position (normally distributed steps of `step` mm) and orientation (about `angularStep` degrees
+    per sample). The same seed always gives the same trajectory.
+    """
+    rng = np.random.default_rng(seed)
+    positions = np.cumsum(rng.normal(scale=step, size=(count, 3)), axis=0)
+    # Small random rotation vectors, accumulated as quaternions
+    halfAngles = np.radians(angularStep) / 2.0 * rng.normal(size=(count, 3))
+    quaternions = np.empty((count, 4))
+    quaternion = np.array([1.0, 0.0, 0.0, 0.0])
+    for index, (x, y, z) in enumerate(halfAngles):
+        w0, x0, y0, z0 = quaternion
+        quaternion = np.array([w0 - x0 * x - y0 * y - z0 * z, w0 * x + x0, w0 * y + y0, w0 * z + z0])
+        quaternion /= np.linalg.norm(quaternion)
+        quaternions[index] = quaternion
+    return posesFromPositionsAndQuaternions(positions, quaternions), np.arange(count) / rate
+
+
+def syntheticTrajectory(source, count, **kwargs):
+    """
+    Get a trajectory by source name: "helix", "randomwalk", or the path of a trajectory file to replay
+    (truncated or repeated to `count` poses).
+    """
+    if source == "helix":
+        return helixTrajectory(count, **kwargs)
+    if source == "randomwalk":
+        return randomWalkTrajectory(count, **kwargs)
+    poses, timestamps = loadTrajectory(source)
+    if len(poses) == 0:
+        raise ValueError(f"No poses in {source}")
+    indices = np.arange(count) % len(poses)
+    period = timestamps[-1] - timestamps[0] + (np.median(np.diff(timestamps)) if len(timestamps) > 1 else 1.0)
+    return poses[indices], timestamps[indices] + period * (np.arange(count) // len(poses))
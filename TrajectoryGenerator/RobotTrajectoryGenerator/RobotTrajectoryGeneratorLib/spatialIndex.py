@@ -0,0 +1,205 @@
+import itertools
+
+import numpy as np
+
+# Cell coordinates are packed in a single integer key, 21 bits per axis
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+
+
+def _packCells(cells):
+    cells = np.asarray(cells, dtype=np.int64) + _KEY_OFFSET
+    return (cells[..., 0] << (2 * _KEY_BITS)) | (cells[..., 1] << _KEY_BITS) | cells[..., 2]
+
+
+# Number of cells a nearest query visits in shells around the center before it selects the occupied cells by distance
+_MAX_SHELL_CELLS = 125
+
+
+class PositionIndex:
+    """
+    Voxel hash over 3D positions (mm) for nearest neighbor and radius queries.
+    Positions are only ever appended (or all cleared), each cubic cell of cellSize mm keeps the indices of the positions
+    inside it, so adding a position does not touch the others and a query only looks at the cells around it.
+    Queries far from the positions, where walking the cells around the center would visit many empty cells, select the
+    occupied cells with a vectorized bound on their distance to the center instead.
+    """
+
+    def __init__(self, cellSize=10.0, capacity=1024):
+        if cellSize <= 0:
+            raise ValueError("Cell size must be positive")
+        self.cellSize = float(cellSize)
+        self._positions = np.zeros((capacity, 3))
+        self._count = 0
+        self._cells = {}
+        self._cellLists = []  # index lists of the occupied cells, in the order of _cellCoordinates
+        self._cellCoordinates = np.zeros((64, 3), dtype=np.int64)
+        self._lowCell = self._highCell = None  # bounds of the occupied cells
+        self._shellOffsets = {}
+
+    def __len__(self):
+        return self._count
+
+    def positions(self):
+        """
+        View (not a copy) of the indexed positions.
+        """
+        return self._positions[:self._count]
+
+    def clear(self):
+        self._count = 0
+        self._cells = {}
+        self._cellLists = []
+        self._lowCell = self._highCell = None
+
+    def extend(self, positions):
+        """
+        Add positions (N x 3). They get the indices following the ones already in the index.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        count = len(positions)
+        if count == 0:
+            return
+        if self._count + count > len(self._positions):
+            storage = np.zeros((max(2 * len(self._positions), self._count + count), 3))
+            storage[:self._count] = self._positions[:self._count]
+            self._positions = storage
+        self._positions[self._count:self._count + count] = positions
+        cellCoordinates = np.floor(positions / self.cellSize).astype(np.int64)
+        if self._lowCell is None:
+            self._lowCell, self._highCell = cellCoordinates.min(axis=0), cellCoordinates.max(axis=0)
+        else:
+            self._lowCell = np.minimum(self._lowCell, cellCoordinates.min(axis=0))
+            self._highCell = np.maximum(self._highCell, cellCoordinates.max(axis=0))
+        keys = _packCells(cellCoordinates).tolist()
+        cells = self._cells
+        newCells = []
+        for index, key in enumerate(keys, self._count):
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = cell = [index]
+                self._cellLists.append(cell)
+                newCells.append(index - self._count)
+            else:
+                cell.append(index)
+        self._count += count
+        if newCells:
+            occupiedCount = len(self._cellLists)
+            if occupiedCount > len(self._cellCoordinates):
+                storage = np.zeros((max(2 * len(self._cellCoordinates), occupiedCount), 3), dtype=np.int64)
+                storage[:occupiedCount - len(newCells)] = self._cellCoordinates[:occupiedCount - len(newCells)]
+                self._cellCoordinates = storage
+            self._cellCoordinates[occupiedCount - len(newCells):occupiedCount] = cellCoordinates[newCells]
+
+    def append(self, position):
+        self.extend(position)
+
+    def _indicesInCells(self, keys):
+        cells = self._cells
+        return self._indicesInLists([cells[key] for key in keys.tolist() if key in cells])
+
+    @staticmethod
+    def _indicesInLists(found):
+        if not found:
+            return np.zeros(0, dtype=int)
+        return np.fromiter(itertools.chain.from_iterable(found), dtype=int, count=sum(map(len, found)))
+
+    def _candidatesInBox(self, low, high):
+        """
+        Indices of the positions in the cells overlapping the box.
+        """
+        lowCell = np.floor(low / self.cellSize).astype(np.int64)
+        highCell = np.floor(high / self.cellSize).astype(np.int64)
+        if np.prod(highCell - lowCell + 1) > len(self._cells):
+            # The box spans more cells than are occupied, select the occupied ones inside it
+            occupied = self._cellCoordinates[:len(self._cellLists)]
+            inside = np.flatnonzero(np.all((occupied >= lowCell) & (occupied <= highCell), axis=1))
+            cellLists = self._cellLists
+            return self._indicesInLists([cellLists[cell] for cell in inside.tolist()])
+        grid = np.stack(np.meshgrid(*[np.arange(lowCell[axis], highCell[axis] + 1) for axis in range(3)],
+                                    indexing="ij"), axis=-1).reshape(-1, 3)
+        return self._indicesInCells(_packCells(grid))
+
+    def radius(self, center, radius):
+        """
+        Indices and distances of the positions within radius of center, sorted by distance.
+        """
+        center = np.asarray(center, dtype=float)
+        candidates = self._candidatesInBox(center - radius, center + radius)
+        distances = np.linalg.norm(self._positions[candidates] - center, axis=1)
+        inside = distances <= radius
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return candidates[order], distances[order]
+
+    def _shell(self, size):
+        """
+        Offsets of the cells at Chebyshev distance `size` from a cell.
+        """
+        offsets = self._shellOffsets.get(size)
+        if offsets is None:
+            steps = np.arange(-size, size + 1)
+            grid = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+            offsets = grid[np.abs(grid).max(axis=1) == size]
+            self._shellOffsets[size] = offsets
+        return offsets
+
+    def _nearestCellCandidates(self, center, k):
+        """
+        Indices and distances of positions including the k nearest to center, selected from the occupied cells by their
+        distance to center, a lower bound of the distances of the positions inside them: the k-th nearest position of
+        the few nearest cells bounds the distance of the k nearest positions, only the cells within it are searched.
+        """
+        cellLists = self._cellLists
+        cellCount = len(cellLists)
+        corners = self._cellCoordinates[:cellCount] * self.cellSize
+        gaps = np.maximum(np.maximum(corners - center, center - corners - self.cellSize), 0.0)
+        cellDistances = np.sqrt(np.einsum("ij,ij->i", gaps, gaps))
+        bound = np.inf
+        taken = min(cellCount, 8)
+        if taken < cellCount:
+            cells = np.argpartition(cellDistances, taken)[:taken]
+            candidates = self._indicesInLists([cellLists[cell] for cell in cells.tolist()])
+            if len(candidates) >= k:
+                bound = np.partition(np.linalg.norm(self._positions[candidates] - center, axis=1), k - 1)[k - 1]
+        cells = np.flatnonzero(cellDistances <= bound)
+        candidates = self._indicesInLists([cellLists[cell] for cell in cells.tolist()])
+        return candidates, np.linalg.norm(self._positions[candidates] - center, axis=1)
+
+    def nearest(self, center, k=1):
+        """
+        Indices and distances of the k positions nearest to center, sorted by distance.
+        """
+        center = np.asarray(center, dtype=float)
+        k = min(k, self._count)
+        if k <= 0:
+            return np.zeros(0, dtype=int), np.zeros(0)
+
+        # Cells are visited in shells of growing size around the cell of the center. Positions in cells beyond shell s
+        # are at least s * cellSize away, so the search stops once k positions closer than that have been found.
+        centerCell = np.floor(center / self.cellSize).astype(np.int64)
+        candidates, distances = [], []
+        visitedCells = 0
+        # Shells that do not reach the occupied cells are skipped
+        size = int(max(0, np.max(self._lowCell - centerCell), np.max(centerCell - self._highCell)))
+        while True:
+            visitedCells += (2 * size + 1) ** 3 - (2 * size - 1) ** 3 if size > 0 else 1
+            if visitedCells > _MAX_SHELL_CELLS:
+                # The positions are sparse around the center, select the cells by their distance to it instead
+                candidates, distances = self._nearestCellCandidates(center, k)
+                break
+            indices = self._indicesInCells(_packCells(centerCell + self._shell(size)))
+            if len(indices):
+                candidates.append(indices)
+                distances.append(np.linalg.norm(self._positions[indices] - center, axis=1))
+            found = sum(len(indices) for indices in candidates)
+            if found >= k:
+                kthDistance = np.partition(np.concatenate(distances), k - 1)[k - 1]
+                if kthDistance <= size * self.cellSize:
+                    candidates, distances = np.concatenate(candidates), np.concatenate(distances)
+                    break
+            size += 1
+
+        nearest = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return candidates[nearest], distances[nearest]
@@ -0,0 +1,40 @@
+import numpy as np
+
+from .geometry import quaternionAngles, rotationMatricesToQuaternions
+
+
+def trajectoryStatistics(poses, timestamps):
+    """
+    Summary of a trajectory: number of poses, duration (s), path length (mm), total rotation (degrees),
+    mean and maximum speed (mm/s), mean sampling rate (Hz) and largest time gap between two poses (s).
+    """
+    poses = np.asarray(poses, dtype=float)
+    timestamps = np.asarray(timestamps, dtype=float)
+    count = len(poses)
+    statistics = {
+        "count": count,
+        "duration": 0.0,
+        "pathLength": 0.0,
+        "totalRotation": 0.0,
+        "meanSpeed": 0.0,
+        "maxSpeed": 0.0,
+        "samplingRate": 0.0,
+        "maxTimeGap": 0.0,
+    }
+    if count < 2:
+        return statistics
+
+    distances = np.linalg.norm(np.diff(poses[:, :3, 3], axis=0), axis=1)
+    quaternions = rotationMatricesToQuaternions(poses[:, :3, :3])
+    timeGaps = np.diff(timestamps)
+    duration = timestamps[-1] - timestamps[0]
+    speeds = np.divide(distances, timeGaps, out=np.zeros_like(distances), where=timeGaps > 0)
+
+    statistics["duration"] = float(duration)
+    statistics["pathLength"] = float(distances.sum())
+    statistics["totalRotation"] = float(quaternionAngles(quaternions[1:], quaternions[:-1]).sum())
+    statistics["meanSpeed"] = float(distances.sum() / duration) if duration > 0 else 0.0
+    statistics["maxSpeed"] = float(speeds.max())
+    statistics["samplingRate"] = float((count - 1) / duration) if duration > 0 else 0.0
+    statistics["maxTimeGap"] = float(timeGaps.max())
+    return statistics
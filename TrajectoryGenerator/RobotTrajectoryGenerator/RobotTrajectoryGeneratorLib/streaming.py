@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+
+
+class TrajectoryStreamer:
+    """
+    Publishes a trajectory in chunks while it is still being captured.
+    A chunk is sent as soon as chunkSize new poses are available, or when chunkInterval seconds have passed since
+    the last chunk and some poses are pending. Each chunk carries a sequence number and the index of its first pose,
+    the last one is flagged as complete. When poses that were already sent change (e.g. after decimation),
+    rewind finds the first changed pose so that only the tail from there is sent again.
+
+    sendChunk is called as sendChunk(poses, sequenceNumber, startIndex, complete).
+    """
+
+    def __init__(self, sendChunk, chunkSize=50, chunkInterval=0.5):
+        self.sendChunk = sendChunk
+        self.chunkSize = chunkSize
+        self.chunkInterval = chunkInterval
+        self._sentPoses = np.zeros((1024, 4, 4))  # copy of what was sent, to detect changed poses
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new trajectory: nothing is considered sent anymore.
+        """
+        self.sequenceNumber = 0
+        self.sentCount = 0
+        self._lastSendTime = None
+
+    def update(self, poses, now=None):
+        """
+        Send the pending poses if a chunk is full or the chunk interval has elapsed.
+        The poses that were already sent are assumed unchanged (call rewind if they may have changed).
+        """
+        if now is None:
+            now = time.time()
+        if self._lastSendTime is None:
+            self._lastSendTime = now
+        while len(poses) - self.sentCount >= self.chunkSize:
+            self._send(poses, self.sentCount + self.chunkSize, now)
+        if len(poses) > self.sentCount and now - self._lastSendTime >= self.chunkInterval:
+            self._send(poses, len(poses), now)
+
+    def finish(self, poses, now=None):
+        """
+        Send all the pending poses, the last chunk is flagged as complete (it is empty if nothing was pending).
+        """
+        if now is None:
+            now = time.time()
+        while len(poses) - self.sentCount > self.chunkSize:
+            self._send(poses, self.sentCount + self.chunkSize, now)
+        self._send(poses, len(poses), now, complete=True)
+
+    def rewind(self, poses):
+        """
+        Compare the poses with the ones that were sent and mark everything from the first difference as not sent.
+        Returns the index from which poses will be sent again.
+        """
+        count = min(len(poses), self.sentCount)
+        changed = np.flatnonzero(np.any(poses[:count] != self._sentPoses[:count], axis=(1, 2)))
+        self.sentCount = int(changed[0]) if changed.size else count
+        return self.sentCount
+
+    def _send(self, poses, stopIndex, now, complete=False):
+        startIndex = self.sentCount
+        if stopIndex > len(self._sentPoses):
+            sentPoses = np.zeros((max(stopIndex, 2 * len(self._sentPoses)), 4, 4))
+            sentPoses[:startIndex] = self._sentPoses[:startIndex]
+            self._sentPoses = sentPoses
+        self._sentPoses[startIndex:stopIndex] = poses[startIndex:stopIndex]
+        self.sendChunk(poses[startIndex:stopIndex], self.sequenceNumber, startIndex, complete)
+        self.sequenceNumber += 1
+        self.sentCount = stopIndex
+        self._lastSendTime = now
@@ -0,0 +1,134 @@
+"""
+Benchmarks of the RobotTrajectoryGenerator module.
+
+On a plain Python install only the Slicer-independent processing (capture, decimation, resampling) is measured:
+
+    python RobotTrajectoryGeneratorBenchmark.py --output results.json --baseline baseline.json
+
+In Slicer, AddToTrajectory, clearTrajectory and SendPoseArray are measured as well:
+
+    Slicer --no-main-window --python-script RobotTrajectoryGeneratorBenchmark.py --output results.json
+
+Neither the network nor a ROS 2 graph is needed: poses come from a synthetic or recorded trajectory and publishing
+goes to a local stand-in publisher. The exit code is 1 if a benchmark got slower than the baseline by more than
+--max-regression.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from RobotTrajectoryGeneratorLib import LocalPoseArrayPublisher, syntheticTrajectory
+from RobotTrajectoryGeneratorLib.benchmark import (
+    findRegressions,
+    loadResults,
+    printResults,
+    runCoreBenchmarks,
+    saveResults,
+    summarizeLatencies,
+    timeCalls,
+)
+
+
+def runSceneBenchmarks(source="helix", tickCount=2000, sceneSizes=(0, 1000, 10000), pathLengths=(100, 1000, 10000),
+                       repeats=5):
+    """
+    Benchmarks of the module logic in a Slicer scene, a linear transform node standing in for the ROS 2 lookup.
+    """
+    import slicer
+    import vtk
+    from RobotTrajectoryGenerator import RobotTrajectoryGeneratorLogic
+
+    results = {}
+    poses, timestamps = syntheticTrajectory(source, max(tickCount, max(pathLengths)))
+
+    def createLogic():
+        slicer.mrmlScene.Clear()
+        lookup = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode", "Lookup")
+        logic = RobotTrajectoryGeneratorLogic()
+        logic.setObservedLookup(lookup)
+        return logic, lookup
+
+    # Per-tick capture latency
+    logic, lookup = createLogic()
+    matrix = vtk.vtkMatrix4x4()
+    latencies = []
+    for index in range(tickCount):
+        slicer.util.updateVTKMatrixFromArray(matrix, poses[index])
+        lookup.SetMatrixTransformToParent(matrix)
+        startTime = time.perf_counter()
+        logic.AddToTrajectory(timestamps[index])
+        latencies.append(time.perf_counter() - startTime)
+    results["scene.addToTrajectory.tick"] = summarizeLatencies(latencies)
+
+    # Clearing a 1000 pose trajectory, with unrelated nodes in the scene
+    for sceneSize in sceneSizes:
+        logic, lookup = createLogic()
+        slicer.mrmlScene.StartState(slicer.vtkMRMLScene.BatchProcessState)
+        for _ in range(sceneSize):
+            slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
+        slicer.mrmlScene.EndState(slicer.vtkMRMLScene.BatchProcessState)
+
+        def fillTrajectory():
+            logic.poseBuffer.assign(poses[:1000], timestamps[:1000])
+            logic.updateVisualization()
+
+        results[f"scene.clearTrajectory.{sceneSize}"] = summarizeLatencies(
+            *timeCalls(logic.clearTrajectory, repeats, setup=fillTrajectory))
+
+    # Publishing paths of different lengths
+    logic, lookup = createLogic()
+    publisher = LocalPoseArrayPublisher()
+    for length in pathLengths:
+        results[f"scene.sendPoseArray.{length}"] = summarizeLatencies(
+            *timeCalls(lambda: logic.SendPoseArray(poses[:length], publisher), repeats))
+
+    slicer.mrmlScene.Clear()
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="helix",
+                        help="Pose source: helix, randomwalk or the path of a trajectory file (.npz, .json) to replay")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="Trajectory lengths for the decimation and resampling benchmarks")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results with this JSON file")
+    parser.add_argument("--max-regression", type=float, default=1.5,
+                        help="Fail if a benchmark is slower than the baseline by more than this ratio")
+    parser.add_argument("--metric", default="p50", choices=["mean", "p50", "p99", "max"],
+                        help="Latency used for the comparison with the baseline")
+    args = parser.parse_args(argv)
+
+    results = runCoreBenchmarks(args.source, args.sizes, args.repeats)
+    try:
+        import slicer  # noqa: F401
+        inSlicer = True
+    except ImportError:
+        inSlicer = False
+    if inSlicer:
+        results.update(runSceneBenchmarks(args.source, repeats=args.repeats))
+    printResults(results)
+
+    if args.output:
+        saveResults(args.output, results, source=args.source, sizes=args.sizes, slicer=inSlicer)
+    if args.baseline:
+        regressions = findRegressions(results, loadResults(args.baseline), args.max_regression, args.metric)
+        for name, reference, value in regressions:
+            print(f"Regression in {name}: {args.metric} {reference:.3f} ms -> {value:.3f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exitCode = main(sys.argv[1:])
+    if "slicer" in sys.modules:
+        sys.modules["slicer"].util.exit(exitCode)
+    else:
+        sys.exit(exitCode)
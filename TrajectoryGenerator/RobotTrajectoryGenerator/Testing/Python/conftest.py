@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make RobotTrajectoryGeneratorLib importable without Slicer
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
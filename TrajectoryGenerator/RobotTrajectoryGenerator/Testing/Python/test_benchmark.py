@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import helixTrajectory, randomWalkTrajectory, saveTrajectory, syntheticTrajectory
+from RobotTrajectoryGeneratorLib.benchmark import findRegressions, loadResults, runCoreBenchmarks, saveResults
+
+
+@pytest.mark.parametrize("source", [helixTrajectory, randomWalkTrajectory])
+def test_sourcesGiveRigidPoses(source):
+    poses, timestamps = source(100)
+    assert poses.shape == (100, 4, 4)
+    rotations = poses[:, :3, :3]
+    np.testing.assert_allclose(rotations @ np.transpose(rotations, (0, 2, 1)), np.tile(np.eye(3), (100, 1, 1)), atol=1e-9)
+    assert np.all(np.diff(timestamps) > 0)
+
+
+def test_replaySourceRepeatsRecording(tmp_path):
+    poses, timestamps = helixTrajectory(10)
+    path = str(tmp_path / "recording.npz")
+    saveTrajectory(path, poses, timestamps)
+    replayedPoses, replayedTimestamps = syntheticTrajectory(path, 25)
+    np.testing.assert_allclose(replayedPoses[20:], poses[:5])
+    assert np.all(np.diff(replayedTimestamps) > 0)
+
+
+def test_coreBenchmarks(tmp_path):
+    results = runCoreBenchmarks("randomwalk", sizes=(200,), repeats=2)
+    assert {"capture.tick", "capture.tick.3frames", "decimation.threshold.200", "decimation.rdp.200", "resampling.arclength.200"} <= set(results)
+    assert results["capture.tick"]["count"] == 200
+    assert results["capture.tick"]["p99"] >= results["capture.tick"]["p50"]
+
+    path = str(tmp_path / "results.json")
+    saveResults(path, results, source="randomwalk")
+    assert loadResults(path) == results
+
+
+def test_findRegressions():
+    baseline = {"a": {"p50": 1.0}, "b": {"p50": 2.0}, "removed": {"p50": 1.0}}
+    results = {"a": {"p50": 1.2}, "b": {"p50": 5.0}, "added": {"p50": 1.0}}
+    assert findRegressions(results, baseline, maxRatio=1.5) == [("b", 2.0, 5.0)]
@@ -0,0 +1,22 @@
+import pytest
+
+from RobotTrajectoryGeneratorLib import EventCoalescer
+
+
+def test_burstIsCoalesced():
+    coalescer = EventCoalescer(coalesceInterval=0.01)
+    assert coalescer.onEvent(0.0) == pytest.approx(0.01)
+    assert coalescer.onEvent(0.002) is None
+    assert coalescer.onEvent(0.004) is None
+    coalescer.onSampled(0.01)
+    assert (coalescer.eventCount, coalescer.sampleCount, coalescer.coalescedCount) == (3, 1, 2)
+
+
+def test_rateCap():
+    coalescer = EventCoalescer(coalesceInterval=0.0, maxRate=10.0)
+    assert coalescer.onEvent(0.0) == pytest.approx(0.0)
+    coalescer.onSampled(0.0)
+    # Next sample not before 0.1 s
+    assert coalescer.onEvent(0.03) == pytest.approx(0.07)
+    coalescer.onSampled(0.1)
+    assert coalescer.onEvent(0.5) == pytest.approx(0.0)
@@ -0,0 +1,75 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import decimatePoses
+
+
+def translationPoses(count):
+    # 1 mm steps along x
+    poses = np.tile(np.eye(4), (count, 1, 1))
+    poses[:, 0, 3] = np.arange(count)
+    return poses
+
+
+def rotationPoses(count):
+    # Rotation about x, 1 degree per pose
+    angles = np.radians(np.arange(count))
+    poses = np.tile(np.eye(4), (count, 1, 1))
+    poses[:, 1, 1] = poses[:, 2, 2] = np.cos(angles)
+    poses[:, 2, 1] = np.sin(angles)
+    poses[:, 1, 2] = -np.sin(angles)
+    return poses
+
+
+def test_translationThreshold():
+    timestamps = 0.01 * np.arange(31)
+    np.testing.assert_array_equal(decimatePoses(translationPoses(31), timestamps, 5.0), [0, 6, 12, 18, 24, 30])
+
+
+def test_ramerDouglasPeuckerKeepsEndsOfStraightLine():
+    np.testing.assert_array_equal(decimatePoses(translationPoses(31), None, 5.0, method="rdp"), [0, 30])
+
+
+def test_maxTimeGap():
+    timestamps = 0.01 * np.arange(31)
+    np.testing.assert_array_equal(decimatePoses(translationPoses(31), timestamps, 5.0, maxTimeGap=0.035),
+                                  [0, 4, 8, 12, 16, 20, 24, 28])
+
+
+def test_minTimeGap():
+    timestamps = 0.01 * np.arange(31)
+    np.testing.assert_array_equal(decimatePoses(translationPoses(31), timestamps, 1.5, minTimeGap=0.095),
+                                  [0, 10, 20, 30])
+
+
+def test_rotationThreshold():
+    timestamps = 0.01 * np.arange(31)
+    np.testing.assert_array_equal(decimatePoses(rotationPoses(31), timestamps, 5.0), [0])
+    np.testing.assert_array_equal(decimatePoses(rotationPoses(31), timestamps, 5.0, rotationTolerance=10.0), [0, 11, 22])
+
+
+def test_matchesSequentialThreshold():
+    rng = np.random.default_rng(0)
+    poses = np.tile(np.eye(4), (5000, 1, 1))
+    poses[:, :3, 3] = np.cumsum(rng.normal(size=(5000, 3)), axis=0)
+    expected = [0]
+    for index in range(1, len(poses)):
+        if np.linalg.norm(poses[index, :3, 3] - poses[expected[-1], :3, 3]) > 5.0:
+            expected.append(index)
+    np.testing.assert_array_equal(decimatePoses(poses, None, 5.0), expected)
+
+
+@pytest.mark.parametrize("method", ["threshold", "rdp"])
+def test_singlePose(method):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        np.testing.assert_array_equal(decimatePoses(translationPoses(1), [0.0], 5.0, 5.0, 0.1, 1.0, method), [0])
+
+
+def test_invalidArguments():
+    with pytest.raises(ValueError):
+        decimatePoses(translationPoses(5), None, 5.0, maxTimeGap=1.0)
+    with pytest.raises(ValueError):
+        decimatePoses(translationPoses(5), np.zeros(5), 5.0, method="unknown")
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import (
+    JobCancelled,
+    JobRunner,
+    PoseBuffer,
+    decimatePoses,
+    helixTrajectory,
+    postProcessTrajectory,
+    resampleTrajectory,
+    snapshotPoses,
+)
+
+
+def waitForJob(runner, job):
+    assert job.wait(10.0)
+    return runner.processEvents()
+
+
+def test_postProcessingMatchesMainThread():
+    poses, timestamps = helixTrajectory(5000)
+    buffer = PoseBuffer()
+    buffer.assign(poses, timestamps)
+    runner = JobRunner()
+    progress = []
+    finished = []
+    job = runner.submit("postprocess", postProcessTrajectory, *snapshotPoses(buffer),
+                        decimation={"translationTolerance": 2.0}, resampling={"spacing": 5.0},
+                        onProgress=lambda job: progress.append(job.progress), onFinished=finished.append)
+    assert waitForJob(runner, job) == [job]
+    assert finished == [job] and job.status == "finished" and job.progress == 1.0
+    assert all(0.0 <= value <= 1.0 for value in progress)
+    assert runner.activeJobs == []
+
+    indices = decimatePoses(poses, timestamps, translationTolerance=2.0)
+    expectedPoses, expectedTimestamps = resampleTrajectory(poses[indices], timestamps[indices], spacing=5.0)
+    resultPoses, resultTimestamps, resultIndices, frameIndices = job.result
+    assert frameIndices == {}
+    np.testing.assert_array_equal(resultIndices, indices)
+    np.testing.assert_allclose(resultPoses, expectedPoses)
+    np.testing.assert_allclose(resultTimestamps, expectedTimestamps)
+    runner.shutdown()
+
+
+def test_cancelAndFailure():
+    runner = JobRunner()
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking(job):
+        started.set()
+        release.wait(10.0)
+        job.reportProgress(0.5)
+        return "not reached"
+
+    running = runner.submit("blocking", blocking)
+    pending = runner.submit("pending", lambda job: "not run")
+    assert started.wait(10.0)
+    pending.cancel()
+    running.cancel()
+    release.set()
+    assert running.wait(10.0) and pending.wait(10.0)
+    finished = runner.processEvents()
+    assert {job.name: job.status for job in finished} == {"blocking": "cancelled", "pending": "cancelled"}
+    assert running.result is None and pending.result is None
+
+    def failing(job):
+        raise ValueError("bad settings")
+
+    job = runner.submit("failing", failing)
+    waitForJob(runner, job)
+    assert job.status == "failed" and isinstance(job.error, ValueError)
+    runner.shutdown()
+
+
+class RecordingJob:
+    """
+    Stands in for the BackgroundJob given to a job function: records the progress, cancels after cancelAfter reports.
+    """
+
+    def __init__(self, cancelAfter=None):
+        self.progress = []
+        self.cancelAfter = cancelAfter
+
+    def reportProgress(self, progress, message=None):
+        if self.cancelAfter is not None and len(self.progress) >= self.cancelAfter:
+            raise JobCancelled()
+        self.progress.append(progress)
+
+
+@pytest.mark.parametrize("method", ["threshold", "rdp"])
+def test_progressInsideSteps(method):
+    poses, timestamps = helixTrajectory(12000)
+    decimation = {"translationTolerance": 0.1, "method": method}
+    job = RecordingJob()
+    resultPoses, _, indices, frameIndices = postProcessTrajectory(
+        job, poses, timestamps, decimation=decimation, resampling={"spacing": 0.1},
+        frames={"wrist": (poses[::2], timestamps[::2], {"translationTolerance": 1.0})})
+    np.testing.assert_array_equal(indices, decimatePoses(poses, timestamps, **decimation))
+    np.testing.assert_array_equal(frameIndices["wrist"], decimatePoses(poses[::2], timestamps[::2], translationTolerance=1.0))
+    np.testing.assert_allclose(resultPoses, resampleTrajectory(poses[indices], timestamps[indices], spacing=0.1)[0])
+    # Progress goes up from 0 to 1 with reports within each of the three steps, not only between them
+    assert job.progress[0] == 0.0 and job.progress[-1] == 1.0
+    assert np.all(np.diff(job.progress) >= 0)
+    for step in range(3):
+        assert any(step / 3 < value < (step + 1) / 3 for value in job.progress)
+
+    # A cancelled job stops inside the decimation
+    job = RecordingJob(cancelAfter=3)
+    with pytest.raises(JobCancelled):
+        postProcessTrajectory(job, poses, timestamps, decimation=decimation)
+    assert job.progress[-1] < 1.0
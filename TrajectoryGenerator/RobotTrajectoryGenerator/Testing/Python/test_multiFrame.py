@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import MultiFrameRecorder, PoseBuffer
+
+
+def translations(*xs):
+    poses = np.tile(np.eye(4), (len(xs), 1, 1))
+    poses[:, 0, 3] = xs
+    return poses
+
+
+def test_perFrameThresholdsAndSharedTimestamps():
+    recorder = MultiFrameRecorder(capacity=2)
+    buffer = PoseBuffer()
+    recorder.addFrame("tip", buffer=buffer, distanceThreshold=2.5)
+    recorder.addFrame("wrist")
+    for tick in range(7):
+        stored = recorder.append(translations(tick, -tick), 0.1 * tick)
+        assert stored[1]
+    assert recorder.tickCount == 7
+    np.testing.assert_allclose(recorder.timestamps(), 0.1 * np.arange(7))
+    assert recorder.frame("tip").buffer is buffer
+    np.testing.assert_allclose(buffer.poses()[:, 0, 3], [0, 3, 6])
+    np.testing.assert_allclose(buffer.timestamps(), [0.0, 0.3, 0.6])
+    assert len(recorder.frame("wrist").buffer) == 7
+
+    with pytest.raises(ValueError):
+        recorder.append(translations(0), 1.0)
+    with pytest.raises(ValueError):
+        recorder.addFrame("tip")
+
+    recorder.clear()
+    assert recorder.tickCount == 0 and len(buffer) == 0 and len(recorder) == 2
+
+
+def test_thresholdFollowsBufferChanges():
+    recorder = MultiFrameRecorder()
+    recorder.addFrame("tip", distanceThreshold=2.5)
+    buffer = recorder.frame("tip").buffer
+    for tick in range(7):
+        recorder.append(translations(tick), float(tick))
+    np.testing.assert_allclose(buffer.poses()[:, 0, 3], [0, 3, 6])
+    # The threshold is checked against the last stored pose after the buffer is modified outside of append
+    buffer.keep([0])
+    assert not recorder.append(translations(2), 7.0)[0]
+    assert recorder.append(translations(3), 8.0)[0]
+    buffer.assign(translations(10), [9.0])
+    assert not recorder.append(translations(12), 10.0)[0]
+    # A frame added in place of a removed one does not use the positions of the removed frame
+    recorder.removeFrame("tip")
+    recorder.addFrame("wrist", distanceThreshold=2.5)
+    recorder.frame("wrist").buffer.append(translations(100)[0], 0.0)
+    assert recorder.append(translations(12), 11.0)[0]
+
+
+def test_framesNotSampled():
+    recorder = MultiFrameRecorder()
+    recorder.addFrame("tip")
+    recorder.addFrame("wrist")
+    # Only the wrist is sampled, the pose given for the tip is ignored
+    assert list(recorder.append(translations(5, 1), 0.0, firstFrame=1)) == [False, True]
+    assert list(recorder.append(translations(5, 2), 0.1)) == [True, True]
+    assert len(recorder.frame("tip").buffer) == 1 and len(recorder.frame("wrist").buffer) == 2
+    assert recorder.tickCount == 2
+
+
+def test_alignedPoses():
+    recorder = MultiFrameRecorder()
+    recorder.addFrame("a", distanceThreshold=1.5)
+    recorder.addFrame("b")
+    for tick in range(4):
+        recorder.append(translations(tick, 10 + tick), float(tick))
+    aligned = recorder.alignedPoses()
+    assert aligned.shape == (4, 2, 4, 4)
+    # Frame a stored ticks 0 and 2 only, its pose is held in between
+    np.testing.assert_allclose(aligned[:, 0, 0, 3], [0, 0, 2, 2])
+    np.testing.assert_allclose(aligned[:, 1, 0, 3], [10, 11, 12, 13])
+
+
+def test_perFrameDecimation():
+    recorder = MultiFrameRecorder()
+    recorder.addFrame("coarse", decimation={"translationTolerance": 4.0})
+    recorder.addFrame("fine", decimation={"translationTolerance": 1.0})
+    for tick in range(11):
+        recorder.append(translations(tick, tick), 0.01 * tick)
+    np.testing.assert_array_equal(recorder.decimate("coarse"), [0, 5, 10])
+    np.testing.assert_array_equal(recorder.decimate("fine"), [0, 2, 4, 6, 8, 10])
+    assert len(recorder.frame("coarse").buffer) == 3
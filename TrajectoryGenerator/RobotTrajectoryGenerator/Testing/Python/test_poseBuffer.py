@@ -0,0 +1,41 @@
+import numpy as np
+
+from RobotTrajectoryGeneratorLib import PoseBuffer
+
+
+def makePoses(positions):
+    poses = np.tile(np.eye(4), (len(positions), 1, 1))
+    poses[:, :3, 3] = positions
+    return poses
+
+
+def test_appendGrowsPastCapacity():
+    buffer = PoseBuffer(capacity=4)
+    for index in range(10):
+        buffer.append(makePoses([[index, 2 * index, 3 * index]])[0], 0.1 * index)
+
+    assert len(buffer) == 10
+    assert buffer.capacity >= 10
+    assert buffer.poses().shape == (10, 4, 4)
+    np.testing.assert_allclose(buffer.poses()[:, 0, 3], np.arange(10))
+    np.testing.assert_allclose(buffer.timestamps(), 0.1 * np.arange(10))
+    np.testing.assert_allclose(buffer.lastPose()[:3, 3], [9, 18, 27])
+
+
+def test_clearKeepsStorage():
+    buffer = PoseBuffer(capacity=4)
+    buffer.assign(makePoses(np.zeros((6, 3))), np.arange(6))
+    capacity = buffer.capacity
+
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.lastPose() is None
+    assert buffer.capacity == capacity
+
+
+def test_keepAndAssign():
+    buffer = PoseBuffer()
+    buffer.assign(makePoses(np.arange(30).reshape(10, 3)), np.arange(10.0))
+    buffer.keep([0, 3, 9])
+    np.testing.assert_allclose(buffer.timestamps(), [0, 3, 9])
+    np.testing.assert_allclose(buffer.poses()[:, 0, 3], [0, 9, 27])
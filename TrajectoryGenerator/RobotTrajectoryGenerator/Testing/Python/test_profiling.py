@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from RobotTrajectoryGeneratorLib import Profiler
+
+
+def test_disabledProfilerRecordsNothing():
+    profiler = Profiler()
+    with profiler.span("capture"):
+        pass
+    assert profiler.summary() == {}
+    assert profiler.traceEvents() == []
+
+
+def test_rollingWindowAndRate():
+    profiler = Profiler(enabled=True, windowSize=4, traceCapacity=3)
+    for index in range(10):
+        profiler.record("capture", 0.1 * index, 0.1 * index + 0.001 * (index + 1))
+    summary = profiler.summary()["capture"]
+    assert summary["count"] == 10
+    # Only the last 4 durations are in the window
+    assert summary["max"] == pytest.approx(0.010)
+    assert summary["p50"] == pytest.approx(0.0085)
+    assert summary["rate"] == pytest.approx(10.0, rel=0.05)
+    events = profiler.traceEvents()
+    assert len(events) == 3
+    assert events[-1]["dur"] == pytest.approx(10000.0)
+    assert "capture" in profiler.formatSummary()
+
+
+def test_spansAndExport(tmp_path):
+    profiler = Profiler(enabled=True)
+    with profiler.span("publish"):
+        with profiler.span("publish.pack"):
+            pass
+    assert set(profiler.summary()) == {"publish", "publish.pack"}
+
+    profiler.save(str(tmp_path / "stages.json"))
+    with open(tmp_path / "stages.json") as file:
+        assert set(json.load(file)["stages"]) == {"publish", "publish.pack"}
+    profiler.save(str(tmp_path / "spans.trace.json"))
+    with open(tmp_path / "spans.trace.json") as file:
+        events = json.load(file)["traceEvents"]
+    # The inner span ends first, the outer one contains it
+    assert [event["name"] for event in events] == ["publish.pack", "publish"]
+    assert events[1]["ts"] <= events[0]["ts"] and events[0]["ts"] + events[0]["dur"] <= events[1]["ts"] + events[1]["dur"]
+
+    profiler.reset()
+    assert profiler.summary() == {}
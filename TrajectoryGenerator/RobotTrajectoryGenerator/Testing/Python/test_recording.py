@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import (
+    TrajectoryRecording,
+    TrajectoryRecordingWriter,
+    exportCsv,
+    importCsv,
+    posesFromPositionsAndQuaternions,
+    posesFromPoseStamped,
+    posesToPoseStamped,
+)
+
+
+def randomPoses(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return posesFromPositionsAndQuaternions(rng.uniform(-100, 100, (count, 3)), rng.normal(size=(count, 4)))
+
+
+def test_appendWhileRecording(tmp_path):
+    path = str(tmp_path / "trace.rtg")
+    poses = randomPoses(30)
+    timestamps = np.arange(30) * 0.02
+    with TrajectoryRecordingWriter(path) as writer:
+        for pose, timestamp in zip(poses[:10], timestamps[:10]):
+            writer.append(pose, timestamp)
+        writer.flush()
+        # Readable while the recording is still going on
+        assert len(TrajectoryRecording(path)) == 10
+        writer.appendMany(poses[10:20], timestamps[10:20])
+
+    # A partially written record is dropped when the recording is continued
+    with open(path, "ab") as file:
+        file.write(b"\0" * 20)
+    assert len(TrajectoryRecording(path)) == 20
+    with TrajectoryRecordingWriter(path, append=True) as writer:
+        assert writer.count == 20
+        writer.appendMany(poses[20:], timestamps[20:])
+
+    recording = TrajectoryRecording(path)
+    assert isinstance(recording.poses.base, np.memmap) or isinstance(recording.poses, np.memmap)
+    np.testing.assert_array_equal(recording.poses, poses)
+    np.testing.assert_array_equal(recording.timestamps, timestamps)
+    chunks = list(recording.chunks(12))
+    assert [len(chunkTimestamps) for _, chunkTimestamps in chunks] == [12, 12, 6]
+
+
+def test_invalidRecording(tmp_path):
+    path = tmp_path / "invalid.rtg"
+    path.write_bytes(b"not a recording" * 10)
+    with pytest.raises(ValueError):
+        TrajectoryRecording(str(path))
+
+
+def test_csvToRecording(tmp_path):
+    poses = randomPoses(25)
+    timestamps = np.linspace(1.0, 2.0, 25)
+    csvPath = str(tmp_path / "trace.csv")
+    exportCsv(csvPath, poses, timestamps, chunkSize=10)
+    recording = importCsv(csvPath, str(tmp_path / "trace.rtg"), chunkSize=7)
+    np.testing.assert_allclose(recording.poses, poses, atol=1e-12)
+    np.testing.assert_allclose(recording.timestamps, timestamps)
+
+    # Export from a recording goes chunk by chunk too
+    exportCsv(str(tmp_path / "copy.csv"), recording, chunkSize=4)
+    copiedPoses, copiedTimestamps = importCsv(str(tmp_path / "copy.csv"))
+    np.testing.assert_allclose(copiedPoses, poses, atol=1e-12)
+    np.testing.assert_allclose(copiedTimestamps, timestamps)
+
+
+def test_poseStampedLayout():
+    poses = randomPoses(5)
+    timestamps = np.array([0.0, 0.5, 1.25, 1700000000.123456789, 2.0])
+    messages = posesToPoseStamped(poses, timestamps)
+    assert messages["sec"][3] == 1700000000
+    assert abs(int(messages["nanosec"][3]) - 123456789) < 1000
+    np.testing.assert_allclose(messages["position"], poses[:, :3, 3] / 1000.0)
+    np.testing.assert_allclose(np.linalg.norm(messages["orientation"], axis=1), 1.0)
+    convertedPoses, convertedTimestamps = posesFromPoseStamped(messages)
+    np.testing.assert_allclose(convertedPoses, poses, atol=1e-9)
+    np.testing.assert_allclose(convertedTimestamps, timestamps)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import ReplaySource, replayCapture, saveTrajectory, sweepReplayCapture
+
+
+def lineTrajectory(count, rate=10.0):
+    poses = np.tile(np.eye(4), (count, 1, 1))
+    poses[:, 0, 3] = np.arange(count)
+    return poses, np.arange(count) / rate
+
+
+def test_followsWallClockAtSpeed():
+    source = ReplaySource(*lineTrajectory(11), speed=2.0)
+    source.start(now=100.0)
+    source.update(now=100.25)
+    assert source.currentTime == pytest.approx(0.5)
+    assert source.currentPose()[0, 3] == 5
+    assert not source.isFinished
+    source.update(now=101.0)
+    assert source.isFinished
+    assert source.currentPose()[0, 3] == 10
+
+    source.start(now=0.0)
+    source.pause(now=0.1)
+    source.resume(now=10.0)
+    source.update(now=10.1)
+    assert source.currentTime == pytest.approx(0.4)
+
+    source.loop = True
+    source.start(now=0.0)
+    source.update(now=0.75)
+    assert source.currentTime == pytest.approx(0.5)
+
+    # Seeking switches to stepping, the wall clock is ignored
+    source.seek(0.3)
+    source.update(now=5.0)
+    assert source.currentPose()[0, 3] == 3
+
+
+def test_fromFileAndGenerator(tmp_path):
+    path = str(tmp_path / "line.rtg")
+    saveTrajectory(path, *lineTrajectory(5))
+    source = ReplaySource.fromFile(path)
+    np.testing.assert_array_equal(source.poses[:, 0, 3], np.arange(5))
+    assert ReplaySource.fromGenerator(lineTrajectory, 7).endTime == pytest.approx(0.6)
+    assert len(ReplaySource.fromGenerator("helix", 20, rate=100).poses) == 20
+    with pytest.raises(ValueError):
+        ReplaySource(np.zeros((0, 4, 4)), np.zeros(0))
+
+
+def test_replayCaptureAtRate():
+    source = ReplaySource(*lineTrajectory(101))  # 10 s at 10 Hz, 1 mm per pose
+    buffer, indices = replayCapture(source, rateHz=5.0, distanceThreshold=3.5)
+    # Sampled every 2 mm, kept every 4 mm
+    np.testing.assert_allclose(buffer.poses()[:, 0, 3], np.arange(0, 101, 4))
+    assert indices is None
+
+    buffer, indices = replayCapture(source, decimation={"translationTolerance": 24.5})
+    np.testing.assert_allclose(buffer.poses()[:, 0, 3], [0, 25, 50, 75, 100])
+
+    rows = sweepReplayCapture(source, [{"distanceThreshold": threshold} for threshold in (0.5, 9.5)]
+                              + [{"decimation": {"translationTolerance": 49.5}}])
+    assert [(row["captured"], row["kept"]) for row in rows] == [(101, 101), (11, 11), (101, 3)]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import resampleTrajectory
+
+
+def rotatingPoses():
+    # Irregular samples along x, rotating about z from 0 to 90 degrees
+    x = np.array([0.0, 1.0, 1.5, 7.0, 8.0, 20.0])
+    angles = np.radians(90.0 * x / 20.0)
+    poses = np.tile(np.eye(4), (len(x), 1, 1))
+    poses[:, 0, 3] = x
+    poses[:, 0, 0] = poses[:, 1, 1] = np.cos(angles)
+    poses[:, 1, 0] = np.sin(angles)
+    poses[:, 0, 1] = -np.sin(angles)
+    return poses, np.linspace(0.0, 1.0, len(x))
+
+
+def test_arcLengthSpacing():
+    poses, timestamps = rotatingPoses()
+    resampled, resampledTimestamps = resampleTrajectory(poses, timestamps, 2.0)
+    np.testing.assert_allclose(resampled[:, 0, 3], np.arange(0.0, 21.0, 2.0))
+    np.testing.assert_allclose(resampled[5, :3, :3] @ resampled[5, :3, :3].T, np.eye(3), atol=1e-12)
+    # Slerp between rotations about the same axis is linear in the angle
+    np.testing.assert_allclose(np.degrees(np.arctan2(resampled[:, 1, 0], resampled[:, 0, 0])),
+                               4.5 * resampled[:, 0, 3], atol=1e-9)
+    assert np.all(np.diff(resampledTimestamps) > 0)
+
+
+def test_timeSpacing():
+    poses, timestamps = rotatingPoses()
+    resampled, resampledTimestamps = resampleTrajectory(poses, timestamps, 0.1, mode="time")
+    np.testing.assert_allclose(resampledTimestamps, np.linspace(0.0, 1.0, 11), atol=1e-12)
+
+
+@pytest.mark.parametrize("smoothing", ["cubic", "bspline"])
+def test_smoothingKeepsEnds(smoothing):
+    poses, timestamps = rotatingPoses()
+    resampled, _ = resampleTrajectory(poses, timestamps, 1.0, smoothing=smoothing)
+    np.testing.assert_allclose(resampled[0], poses[0], atol=1e-12)
+    np.testing.assert_allclose(resampled[-1], poses[-1], atol=1e-12)
+
+
+def test_velocityAndAccelerationLimits():
+    poses, timestamps = rotatingPoses()
+    resampled, resampledTimestamps = resampleTrajectory(poses, timestamps, 1.0, maxVelocity=10.0, maxAcceleration=100.0)
+    velocities = np.diff(resampled[:, 0, 3]) / np.diff(resampledTimestamps)
+    assert velocities.max() <= 10.0 + 1e-9
+    # 20 mm at 10 mm/s plus 0.1 s lost accelerating and decelerating at 100 mm/s^2 is the continuous optimum,
+    # with 1 mm waypoints the first and last segments take a bit longer
+    assert 2.1 - 1e-9 <= resampledTimestamps[-1] <= 2.2 + 1e-9
+
+
+def test_singleSegmentStartsAndEndsAtRest():
+    poses = np.tile(np.eye(4), (4, 1, 1))
+    poses[:, 0, 3] = [0.0, 1.0, 2.0, 3.0]
+    resampled, resampledTimestamps = resampleTrajectory(poses, np.arange(4.0), 5.0, maxAcceleration=100.0)
+    np.testing.assert_allclose(resampled[:, 0, 3], [0.0, 3.0])
+    # Accelerating over half of the 3 mm and decelerating over the other half
+    np.testing.assert_allclose(resampledTimestamps, [0.0, 2.0 * np.sqrt(3.0 / 100.0)])
+    _, resampledTimestamps = resampleTrajectory(poses, np.arange(4.0), 5.0, maxVelocity=1.0, maxAcceleration=100.0)
+    np.testing.assert_allclose(resampledTimestamps, [0.0, 3.0 + 1.0 / 100.0])
+
+
+def test_rotationOnly():
+    poses, timestamps = rotatingPoses()
+    poses[:, :3, 3] = [5.0, 0.0, 0.0]
+    resampled, resampledTimestamps = resampleTrajectory(poses, timestamps, 2.0, maxVelocity=10.0)
+    # Parameterized by time, as many waypoints as poses
+    np.testing.assert_allclose(resampledTimestamps, timestamps)
+    np.testing.assert_allclose(resampled[[0, -1]], poses[[0, -1]], atol=1e-12)
+    angles = np.degrees(np.arctan2(resampled[:, 1, 0], resampled[:, 0, 0]))
+    assert np.all(np.diff(angles) > 0)
+    # By index when the timestamps do not increase
+    resampled, _ = resampleTrajectory(poses, np.zeros(len(poses)), 2.0)
+    assert len(resampled) == len(poses)
+    np.testing.assert_allclose(resampled[-1], poses[-1], atol=1e-12)
@@ -0,0 +1,74 @@
+import pytest
+
+from RobotTrajectoryGeneratorLib import SamplingSchedule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_deadlinesDoNotDrift():
+    clock = FakeClock()
+    schedule = SamplingSchedule(100.0, 0, clock)
+    schedule.start()
+    for index in range(1000):
+        assert schedule.tick()
+        # Every tick fires 0.3 ms late, the next deadline is still on the original grid
+        assert schedule.delayToNextTick() == pytest.approx((index + 1) * 0.01 - clock.now)
+        clock.now += schedule.delayToNextTick() + 0.0003
+    assert schedule.tickCount == 1000
+    assert schedule.missedTicks == 0
+    assert clock.now == pytest.approx(10.0003)
+
+
+def test_lateTickDropsMissedDeadlines():
+    clock = FakeClock()
+    schedule = SamplingSchedule(100.0, 0, clock)
+    schedule.start()
+    assert schedule.tick()
+    clock.now = 0.055
+    assert schedule.tick()
+    assert schedule.missedTicks == 4
+    assert schedule.delayToNextTick() == pytest.approx(0.005)
+    # A timer waking up a little early is on time
+    clock.now = 0.0596
+    assert schedule.tick()
+    assert schedule.missedTicks == 4
+    assert schedule.delayToNextTick() == pytest.approx(0.0104)
+    assert schedule.tickCount == 3
+
+
+def test_durationPauseAndRate():
+    clock = FakeClock()
+    schedule = SamplingSchedule(100.0, 50, clock)
+    schedule.start()
+    for tickTime in (0.0, 0.01, 0.02):
+        clock.now = tickTime
+        assert schedule.tick()
+    clock.now = 0.025
+    assert schedule.pause()
+    assert schedule.delayToNextTick() is None
+    clock.now = 1.025
+    assert schedule.resume()
+    assert schedule.elapsedTime() == pytest.approx(0.025)
+    assert schedule.delayToNextTick() == pytest.approx(0.005)
+
+    # Half the rate: the next deadline is the next multiple of the new period
+    schedule.setRate(50.0)
+    assert schedule.delayToNextTick() == pytest.approx(0.015)
+    clock.now = 1.04
+    assert schedule.tick()
+    assert schedule.missedTicks == 0
+
+    clock.now = 1.075
+    assert not schedule.tick()  # the 50 ms capture window has elapsed
+    assert schedule.stop()
+    assert not schedule.stop()
+    assert schedule.elapsedTime() == pytest.approx(0.075)
+    assert schedule.achievedHz() == pytest.approx(4 / 0.075)
+    with pytest.raises(ValueError):
+        schedule.start(rateHz=0.0)
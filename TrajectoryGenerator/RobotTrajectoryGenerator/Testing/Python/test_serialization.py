@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import (
+    loadTrajectory,
+    posesFromPositionsAndQuaternions,
+    posesToPositionsAndQuaternions,
+    saveTrajectory,
+)
+
+
+def randomPoses(count, seed=0):
+    rng = np.random.default_rng(seed)
+    quaternions = rng.normal(size=(count, 4))
+    return posesFromPositionsAndQuaternions(rng.uniform(-100, 100, (count, 3)), quaternions)
+
+
+def test_positionsAndQuaternionsRoundTrip():
+    poses = randomPoses(100)
+    np.testing.assert_allclose(posesFromPositionsAndQuaternions(*posesToPositionsAndQuaternions(poses)), poses, atol=1e-12)
+
+
+@pytest.mark.parametrize("extension", [".npz", ".json", ".rtg", ".csv"])
+def test_saveAndLoad(tmp_path, extension):
+    poses = randomPoses(20)
+    timestamps = np.linspace(0.0, 2.0, 20)
+    path = str(tmp_path / f"trajectory{extension}")
+    saveTrajectory(path, poses, timestamps)
+    loadedPoses, loadedTimestamps = loadTrajectory(path)
+    np.testing.assert_allclose(loadedPoses, poses)
+    np.testing.assert_allclose(loadedTimestamps, timestamps)
+
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import PositionIndex, helixTrajectory
+
+
+def bruteForce(positions, center):
+    distances = np.linalg.norm(positions - center, axis=1)
+    order = np.argsort(distances, kind="stable")
+    return order, distances[order]
+
+
+@pytest.mark.parametrize("cellSize", [1.0, 10.0, 1000.0])
+def test_queriesMatchLinearScan(cellSize):
+    rng = np.random.default_rng(1)
+    positions = helixTrajectory(3000)[0][:, :3, 3] + rng.normal(scale=2.0, size=(3000, 3))
+    index = PositionIndex(cellSize, capacity=16)
+    index.extend(positions[:1000])
+    for position in positions[1000:1010]:
+        index.append(position)
+    index.extend(positions[1010:])
+    assert len(index) == 3000
+    np.testing.assert_array_equal(index.positions(), positions)
+
+    for center in list(positions[rng.integers(0, 3000, 5)] + 3.0) + [np.array([500.0, -500.0, 0.0])]:
+        expectedIndices, expectedDistances = bruteForce(positions, center)
+        indices, distances = index.nearest(center, k=7)
+        np.testing.assert_allclose(distances, expectedDistances[:7])
+        np.testing.assert_array_equal(np.sort(indices), np.sort(expectedIndices[:7]))
+
+        indices, distances = index.radius(center, 15.0)
+        inside = expectedDistances <= 15.0
+        np.testing.assert_array_equal(np.sort(indices), np.sort(expectedIndices[inside]))
+        assert np.all(np.diff(distances) >= 0)
+
+
+def test_clearAndEmpty():
+    index = PositionIndex()
+    assert len(index.nearest([0, 0, 0], k=3)[0]) == 0
+    index.extend([[0, 0, 0], [100, 0, 0]])
+    indices, distances = index.nearest([90, 0, 0], k=5)
+    np.testing.assert_array_equal(indices, [1, 0])
+    np.testing.assert_allclose(distances, [10, 90])
+    index.clear()
+    assert len(index) == 0
+    assert len(index.radius([0, 0, 0], 1000.0)[0]) == 0
+    index.append([5, 5, 5])
+    np.testing.assert_array_equal(index.nearest([0, 0, 0])[0], [0])
+
+
+def test_offPathQueries():
+    # Scattered positions, one per cell, queried from far away: the occupied cells are selected by distance
+    rng = np.random.default_rng(2)
+    positions = rng.uniform(-1000.0, 1000.0, size=(500, 3))
+    index = PositionIndex(cellSize=5.0)
+    for chunk in np.array_split(positions, 7):
+        index.extend(chunk)
+    for center in [[3000.0, 0.0, 0.0], [0.0, 0.0, 0.0], [-1500.0, 1500.0, 900.0]]:
+        expectedIndices, expectedDistances = bruteForce(positions, center)
+        for k in [1, 20]:
+            indices, distances = index.nearest(center, k=k)
+            np.testing.assert_allclose(distances, expectedDistances[:k])
+            np.testing.assert_array_equal(np.sort(indices), np.sort(expectedIndices[:k]))
+        indices, _ = index.radius(center, 800.0)
+        np.testing.assert_array_equal(np.sort(indices), np.sort(expectedIndices[expectedDistances <= 800.0]))
+    index.clear()
+    index.extend(positions[:3])
+    np.testing.assert_allclose(index.nearest([3000.0, 0.0, 0.0], k=5)[1], bruteForce(positions[:3], [3000, 0, 0])[1])
@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+
+from RobotTrajectoryGeneratorLib import trajectoryStatistics
+
+
+def test_statistics():
+    poses = np.tile(np.eye(4), (11, 1, 1))
+    poses[:, 0, 3] = np.arange(11) * 2.0
+    statistics = trajectoryStatistics(poses, np.linspace(0.0, 1.0, 11))
+    assert statistics["count"] == 11
+    assert statistics["pathLength"] == pytest.approx(20.0)
+    assert statistics["meanSpeed"] == pytest.approx(20.0)
+    assert statistics["samplingRate"] == pytest.approx(10.0)
+    assert statistics["totalRotation"] == pytest.approx(0.0)
@@ -0,0 +1,23 @@
+import numpy as np
+
+from RobotTrajectoryGeneratorLib import TrajectoryStreamer
+
+
+def test_chunksBySizeTimeAndChangedTail():
+    chunks = []
+    streamer = TrajectoryStreamer(lambda poses, sequence, start, complete: chunks.append(
+        (sequence, start, len(poses), complete)), chunkSize=10, chunkInterval=0.5)
+    poses = np.tile(np.eye(4), (25, 1, 1))
+    poses[:, 0, 3] = np.arange(25)
+
+    streamer.update(poses[:9], now=0.0)
+    assert chunks == []
+    streamer.update(poses[:23], now=0.1)
+    assert chunks == [(0, 0, 10, False), (1, 10, 10, False)]
+    streamer.update(poses[:23], now=0.7)
+    assert chunks[-1] == (2, 20, 3, False)
+
+    poses[21, 0, 3] = -1
+    assert streamer.rewind(poses) == 21
+    streamer.finish(poses)
+    assert chunks[-1] == (3, 21, 4, True)